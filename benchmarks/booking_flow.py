@@ -0,0 +1,459 @@
+"""Нагрузочный тест сценария записи: N клиентов одновременно записываются к мастерам.
+
+Запуск: python benchmarks/booking_flow.py --users 50 [--bookings 2] [--seed-data] [--fake-redis]
+
+Бот собирается через create_bot из bot/main.py: настоящие обработчики,
+middleware, CRUD и хранилище FSM. Вместо Telegram работает локальная
+заглушка Bot API на aiohttp, Postgres берется из config (локальный
+сервер), Redis - из config или fakeredis (--fake-redis). Внешняя сеть
+не нужна.
+
+Каждый пользователь проходит /start -> book_appointment -> мастер ->
+услуга -> дата -> время -> confirm_booking, выбирая кнопки из последней
+клавиатуры, которую ему прислал бот. Отчет: задержка p50/p95/p99 по
+обработчикам, апдейтов в секунду, запросов к БД, обращений к Redis и
+вызовов Bot API на апдейт. С --json результаты сохраняются для
+сравнения между релизами.
+
+--seed-data заполняет базу из config синтетическими данными
+(database/seed.py) и ЗАМЕНЯЕТ все ее данные: запускайте только на
+локальной базе.
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from datetime import date
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+from aiohttp import web
+
+import bot.main as bot_main
+from bot.utils import callbacks as cb
+from bot.utils.callbacks import CallbackDataError, callbacks, unpack
+from bot.utils.metrics import InstrumentedRedis
+from database.seed import SeedOptions, seed
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_TOKEN = "42:BENCHMARK"
+
+# telegram_id виртуальных клиентов: вне диапазонов мастеров и администраторов
+USER_ID_BASE = 7_000_000_000
+
+# Предохранитель от зацикливания сценария одного пользователя
+MAX_STEPS_PER_BOOKING = 30
+
+# Шаг сценария, к которому относятся текущие запросы к БД и Redis
+current_step: ContextVar[Optional[str]] = ContextVar("benchmark_step", default=None)
+
+
+class BotAPIStub:
+    """Локальная заглушка Bot API: отвечает как Telegram и запоминает,
+    какое сообщение с какой клавиатурой последним видел каждый чат"""
+
+    def __init__(self, metrics: "Metrics"):
+        self.metrics = metrics
+        self.messages: Dict[int, dict] = {}
+        self.message_ids = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def _message(self, chat_id: int, message_id: int, params) -> dict:
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+        markup = params.get("reply_markup")
+        self.messages[chat_id] = {
+            "message": message,
+            "keyboard": json.loads(markup) if markup else None,
+        }
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await request.post()
+        self.metrics.count_api_method(method)
+
+        if method == "getMe":
+            result = {"id": 42, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method == "sendMessage":
+            self.message_ids += 1
+            result = self._message(int(params["chat_id"]), self.message_ids, params)
+        elif method == "editMessageText":
+            result = self._message(int(params["chat_id"]), int(params["message_id"]), params)
+        else:
+            result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Metrics:
+    """Задержки и счетчики обращений по шагам сценария"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.queries: Counter = Counter()
+        self.redis_calls: Counter = Counter()
+        self.api_calls: Counter = Counter()
+        self.api_methods: Counter = Counter()
+        self.bookings = 0
+        self.slot_conflicts = 0
+        self.abandoned = 0
+
+    def on_query(self, record):
+        # Логгер запросов asyncpg вызывается через call_soon в контексте
+        # задачи апдейта, поэтому шаг берется из него же
+        step = current_step.get()
+        if step is not None:
+            self.queries[step] += 1
+
+    def count_redis_call(self):
+        step = current_step.get()
+        if step is not None:
+            self.redis_calls[step] += 1
+
+    def count_api_method(self, method: str):
+        self.api_methods[method] += 1
+
+    async def count_api_call(self, make_request, bot, method):
+        # Middleware сессии бота: выполняется в задаче апдейта, в отличие от заглушки
+        step = current_step.get()
+        if step is not None:
+            self.api_calls[step] += 1
+        return await make_request(bot, method)
+
+    def report(self, elapsed: float) -> dict:
+        steps = {}
+        for step, values in self.latencies.items():
+            updates = len(values)
+            steps[step] = {
+                "updates": updates,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "db_queries_per_update": self.queries[step] / updates,
+                "redis_calls_per_update": self.redis_calls[step] / updates,
+                "api_calls_per_update": self.api_calls[step] / updates,
+            }
+
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "updates": total,
+            "elapsed_s": elapsed,
+            "updates_per_s": total / elapsed if elapsed else 0.0,
+            "db_queries_per_update": sum(self.queries.values()) / total if total else 0.0,
+            "redis_calls_per_update": sum(self.redis_calls.values()) / total if total else 0.0,
+            "bookings": self.bookings,
+            "slot_conflicts": self.slot_conflicts,
+            "abandoned": self.abandoned,
+            "api_methods": dict(self.api_methods),
+            "steps": steps,
+        }
+
+
+def instrument_redis(redis, metrics: Metrics):
+    """Считать обращения к Redis: команда или pipeline - один сетевой обмен"""
+    execute_command = redis.execute_command
+    pipeline = redis.pipeline
+
+    async def counted_execute_command(*args, **kwargs):
+        metrics.count_redis_call()
+        return await execute_command(*args, **kwargs)
+
+    def counted_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def counted_execute(*exec_args, **exec_kwargs):
+            metrics.count_redis_call()
+            return await execute(*exec_args, **exec_kwargs)
+
+        pipe.execute = counted_execute
+        return pipe
+
+    redis.execute_command = counted_execute_command
+    redis.pipeline = counted_pipeline
+
+
+async def instrument_pool(pool, metrics: Metrics):
+    """Повесить логгер запросов на все соединения пула"""
+    connections = [await pool.acquire() for _ in range(pool.get_max_size())]
+    try:
+        for conn in connections:
+            conn.add_query_logger(metrics.on_query)
+    finally:
+        for conn in connections:
+            await pool.release(conn)
+
+
+def step_name(data: str) -> str:
+    """Имя обработчика, который отвечает на кнопку"""
+    try:
+        action, _ = unpack(data)
+    except CallbackDataError:
+        return "stale_button"
+    handler = callbacks.handlers.get(action.code)
+    return handler.callback.__name__ if handler else action.code
+
+
+class SimulatedUser:
+    """Клиент, который проходит запись, нажимая кнопки из последнего сообщения бота"""
+
+    def __init__(self, user_id: int, dp, bot, stub: BotAPIStub, metrics: Metrics, rnd: random.Random):
+        self.user_id = user_id
+        self.dp = dp
+        self.bot = bot
+        self.stub = stub
+        self.metrics = metrics
+        self.rnd = rnd
+        self.update_id = user_id * 1000
+
+    @property
+    def user(self) -> dict:
+        return {"id": self.user_id, "is_bot": False, "first_name": f"User{self.user_id % 100000}"}
+
+    async def _feed(self, step: str, update: dict):
+        self.update_id += 1
+        update["update_id"] = self.update_id
+        token = current_step.set(step)
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        finally:
+            self.metrics.latencies[step].append(time.perf_counter() - started)
+            current_step.reset(token)
+
+    async def send_start(self):
+        await self._feed("cmd_start", {
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": self.user_id, "type": "private"},
+                "from": self.user,
+                "text": "/start",
+            }
+        })
+
+    async def press(self, data: str):
+        last = self.stub.messages[self.user_id]
+        await self._feed(step_name(data), {
+            "callback_query": {
+                "id": str(self.update_id),
+                "from": self.user,
+                "chat_instance": str(self.user_id),
+                "message": last["message"],
+                "data": data,
+            }
+        })
+
+    def buttons(self) -> Dict[str, List[str]]:
+        """Кнопки последней клавиатуры по кодам действий"""
+        last = self.stub.messages.get(self.user_id)
+        found = defaultdict(list)
+        if not last or not last["keyboard"]:
+            return found
+        for row in last["keyboard"].get("inline_keyboard", []):
+            for button in row:
+                data = button.get("callback_data")
+                if not data:
+                    continue
+                try:
+                    action, _ = unpack(data)
+                except CallbackDataError:
+                    continue
+                found[action.code].append(data)
+        return found
+
+    def next_button(self, buttons: Dict[str, List[str]]) -> Optional[str]:
+        """Следующий шаг записи: ближе к цели - выше приоритет"""
+        for action in (cb.CONFIRM_BOOKING, cb.CHOOSE_TIME, cb.CHOOSE_DATE,
+                       cb.CHOOSE_SERVICE, cb.CHOOSE_MASTER):
+            if buttons.get(action.code):
+                return self.rnd.choice(buttons[action.code])
+        if buttons.get(cb.BACK_TO_DATES.code):
+            return buttons[cb.BACK_TO_DATES.code][0]
+        if buttons.get(cb.CHOOSE_MONTH.code):
+            # Свободных дней нет - листаем календарь вперед
+            return max(buttons[cb.CHOOSE_MONTH.code], key=lambda data: tuple(unpack(data)[1].values()))
+        return None
+
+    async def book(self) -> bool:
+        buttons = self.buttons()
+        if not buttons.get(cb.BOOK_APPOINTMENT.code):
+            await self.send_start()
+            buttons = self.buttons()
+        await self.press(buttons[cb.BOOK_APPOINTMENT.code][0])
+
+        for _ in range(MAX_STEPS_PER_BOOKING):
+            data = self.next_button(self.buttons())
+            if data is None:
+                return False
+            await self.press(data)
+
+            if data == cb.CONFIRM_BOOKING.pack():
+                after = self.buttons()
+                if after.get(cb.MY_APPOINTMENTS.code):
+                    return True
+                # Слот заняли между выбором и подтверждением
+                self.metrics.slot_conflicts += 1
+        return False
+
+    async def run(self, bookings: int):
+        await self.send_start()
+        for _ in range(bookings):
+            if await self.book():
+                self.metrics.bookings += 1
+            else:
+                self.metrics.abandoned += 1
+
+
+def print_report(report: dict):
+    print()
+    print(f"{'обработчик':<24} | {'апдейтов':>8} | {'p50, мс':>8} | {'p95, мс':>8} | {'p99, мс':>8} "
+          f"| {'БД/апд':>6} | {'Redis/апд':>9} | {'API/апд':>7}")
+    print("-" * 100)
+    for step, row in sorted(report["steps"].items(), key=lambda item: -item[1]["updates"]):
+        print(f"{step:<24} | {row['updates']:>8} | {row['p50_ms']:>8.1f} | {row['p95_ms']:>8.1f} "
+              f"| {row['p99_ms']:>8.1f} | {row['db_queries_per_update']:>6.2f} "
+              f"| {row['redis_calls_per_update']:>9.2f} | {row['api_calls_per_update']:>7.2f}")
+    print("-" * 100)
+    print(f"Апдейтов: {report['updates']} за {report['elapsed_s']:.2f} с "
+          f"({report['updates_per_s']:.1f} апд/с)")
+    print(f"На апдейт: {report['db_queries_per_update']:.2f} запросов к БД, "
+          f"{report['redis_calls_per_update']:.2f} обращений к Redis")
+    print(f"Записей: {report['bookings']}, конфликтов слотов: {report['slot_conflicts']}, "
+          f"незавершенных сценариев: {report['abandoned']}")
+
+
+async def run_benchmark(args) -> dict:
+    from config import Config
+
+    metrics = Metrics()
+    stub = BotAPIStub(metrics)
+    await stub.start()
+
+    config = Config()
+    config.BOT_TOKEN = BENCHMARK_TOKEN
+    config.TELEGRAM_API_URL = stub.url
+    if args.redis_url:
+        config.REDIS_URL = args.redis_url
+
+    if args.fake_redis:
+        try:
+            from fakeredis import FakeAsyncRedis
+        except ImportError:
+            raise SystemExit("Для --fake-redis установите пакет fakeredis")
+        redis_patch = patch.object(InstrumentedRedis, "from_url", lambda url, **kwargs: FakeAsyncRedis())
+    else:
+        redis_patch = nullcontext()
+
+    with redis_patch:
+        bot, dp = await bot_main.create_bot(config, enable_reminders=False)
+
+    db = dp["crud"].db
+    if args.seed_data:
+        await seed(db.pool, SeedOptions(
+            masters=args.masters,
+            services_per_master=3,
+            clients=1000,
+            days=60,
+            start=date.today(),
+            seed=args.seed,
+            occupancy=args.occupancy,
+        ), truncate=True)
+        await dp["catalog"].invalidate()
+
+    for pool in (db.pool, db.replica_pool):
+        if pool is not None:
+            await instrument_pool(pool, metrics)
+    bot.session.middleware(metrics.count_api_call)
+    redis = getattr(dp.fsm.storage, "redis", None)
+    if redis is not None:
+        instrument_redis(redis, metrics)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    try:
+        rnd = random.Random(args.seed)
+        users = [
+            SimulatedUser(USER_ID_BASE + i, dp, bot, stub, metrics, random.Random(rnd.random()))
+            for i in range(args.users)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(user.run(args.bookings) for user in users))
+        elapsed = time.perf_counter() - started
+        # Логгер запросов asyncpg срабатывает через call_soon
+        await asyncio.sleep(0.1)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await bot.session.close()
+        await dp.fsm.storage.close()
+        await db.close()
+        await stub.stop()
+
+    return metrics.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сценария записи")
+    parser.add_argument("--users", type=int, default=50, help="Одновременных клиентов")
+    parser.add_argument("--bookings", type=int, default=1, help="Записей на клиента")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-data", action="store_true",
+                        help="Заменить данные базы синтетическими (только локальная база!)")
+    parser.add_argument("--masters", type=int, default=20, help="Мастеров при --seed-data")
+    parser.add_argument("--occupancy", type=float, default=0.3, help="Занятость расписания при --seed-data")
+    parser.add_argument("--redis-url", default=None, help="Redis вместо REDIS_URL из config")
+    parser.add_argument("--fake-redis", action="store_true", help="Redis в памяти (пакет fakeredis)")
+    parser.add_argument("--json", default=None, help="Сохранить результаты в файл")
+    parser.add_argument("--verbose", action="store_true", help="Логи бота")
+    args = parser.parse_args()
+
+    # Логи обработчиков на каждом апдейте искажают замер
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Сравнение маршрутизации кнопок: цепочка фильтров F.data против таблицы действий.
+
+Запуск: python benchmarks/callback_dispatch.py [--updates 20000]
+
+Оба варианта прогоняются через настоящий Dispatcher.feed_update, обработчики
+пустые, сеть не используется. Кроме набора кнопок бота проверяются роутеры
+побольше, чтобы было видно, как время растет с числом обработчиков.
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import random
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+from bot.utils.callbacks import CallbackAction, CallbackDispatcher
+
+# Фильтры в порядке регистрации до перехода на таблицу действий:
+# (роутер, тип фильтра, значение)
+LEGACY_FILTERS = [
+    ("client", "eq", "book_appointment"),
+    ("client", "prefix", "master_"),
+    ("client", "prefix", "service_"),
+    ("client", "prefix", "month_"),
+    ("client", "prefix", "date_"),
+    ("client", "eq", "back_to_dates"),
+    ("client", "prefix", "time_"),
+    ("client", "eq", "back_to_times"),
+    ("client", "eq", "confirm_booking"),
+    ("client", "eq", "main_menu"),
+    ("client", "eq", "my_appointments"),
+    ("client", "prefix", "cancel_appointment_"),
+    ("client", "eq", "about_studio"),
+    ("client", "eq", "contacts"),
+    ("client", "eq", "cancel"),
+    ("admin", "eq", "admin_stats"),
+    ("admin", "in", {"admin_finance", "admin_bookings"}),
+    ("master", "eq", "master_appointments"),
+    ("master", "eq", "master_pending"),
+    ("master", "prefix", "confirm_"),
+    ("master", "prefix", "reject_"),
+    ("master", "eq", "back_to_master"),
+]
+
+# Типичный поток нажатий: в основном шаги записи клиента
+LEGACY_TRAFFIC = [
+    "book_appointment", "master_3", "service_12", "date_18.10.2026", "time_14:30",
+    "confirm_booking", "my_appointments", "main_menu", "back_to_dates", "cancel",
+    "master_pending", "confirm_41", "admin_stats",
+]
+
+
+async def noop(callback):
+    return None
+
+
+def make_update(update_id: int, data: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": 1000 + update_id % 50, "is_bot": False, "first_name": "Test"},
+            "chat_instance": "bench",
+            "data": data,
+        }
+    })
+
+
+def legacy_dispatcher(extra: int) -> Dispatcher:
+    dp = Dispatcher(storage=MemoryStorage())
+    routers = {name: Router(name=name) for name in ("client", "admin", "master")}
+    for name, kind, value in LEGACY_FILTERS:
+        if kind == "eq":
+            flt = F.data == value
+        elif kind == "prefix":
+            flt = F.data.startswith(value)
+        else:
+            flt = F.data.in_(value)
+        routers[name].callback_query.register(noop, flt)
+    # Дополнительные разделы регистрируются перед роутером мастера
+    for i in range(extra):
+        routers["admin"].callback_query.register(noop, F.data.startswith(f"extra{i}_"))
+    for router in routers.values():
+        dp.include_router(router)
+    return dp
+
+
+def table_dispatcher(extra: int, actions: dict) -> Dispatcher:
+    dp = Dispatcher(storage=MemoryStorage())
+    table = CallbackDispatcher(name="bench")
+    for action in actions.values():
+        table(action)(noop)
+    for i in range(extra):
+        table(CallbackAction(f"bx{extra}_{i}", (("item_id", int),)))(noop)
+    dp.include_router(table.router)
+    return dp
+
+
+def table_traffic(actions: dict):
+    return [
+        actions["book"].pack(), actions["master"].pack(3), actions["service"].pack(12),
+        actions["date"].pack(18102026), actions["time"].pack(1430), actions["confirm_booking"].pack(),
+        actions["my"].pack(), actions["menu"].pack(), actions["back_dates"].pack(),
+        actions["cancel"].pack(), actions["pending"].pack(), actions["confirm"].pack(41),
+        actions["stats"].pack(),
+    ]
+
+
+async def measure(dp: Dispatcher, bot: Bot, traffic, updates: int) -> float:
+    rnd = random.Random(42)
+    batch = [make_update(i, rnd.choice(traffic)) for i in range(updates)]
+    # Прогрев
+    for update in batch[:500]:
+        await dp.feed_update(bot, update)
+    started = time.perf_counter()
+    for update in batch:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / updates * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+
+    bot = Bot(token="42:BENCHMARK")
+    # Отдельные коды, чтобы не пересекаться с действиями бота
+    actions = {
+        "book": CallbackAction("bbk"), "master": CallbackAction("bms", (("master_id", int),)),
+        "service": CallbackAction("bsv", (("service_id", int),)),
+        "date": CallbackAction("bdt", (("day", int),)), "time": CallbackAction("btm", (("slot", int),)),
+        "back_dates": CallbackAction("bbd"), "back_times": CallbackAction("bbt"),
+        "confirm_booking": CallbackAction("bcb"), "menu": CallbackAction("bmm"),
+        "my": CallbackAction("bmy"), "cancel_appointment": CallbackAction("bca", (("appointment_id", int),)),
+        "about": CallbackAction("bin"), "contacts": CallbackAction("bct"), "cancel": CallbackAction("bcn"),
+        "stats": CallbackAction("bas"), "export": CallbackAction("bab"),
+        "appointments": CallbackAction("bma"), "pending": CallbackAction("bmp"),
+        "confirm": CallbackAction("bac", (("appointment_id", int),)),
+        "reject": CallbackAction("bar", (("appointment_id", int),)), "back_master": CallbackAction("bbm"),
+        "month": CallbackAction("bmo", (("year", int), ("month", int))),
+    }
+
+    print(f"{'обработчиков':>13} | {'F.data, мкс':>12} | {'таблица, мкс':>13} | {'ускорение':>9}")
+    for extra in (0, 50, 200):
+        legacy = await measure(legacy_dispatcher(extra), bot, LEGACY_TRAFFIC, args.updates)
+        table = await measure(table_dispatcher(extra, actions), bot, table_traffic(actions), args.updates)
+        total = len(LEGACY_FILTERS) + extra
+        print(f"{total:>13} | {legacy:>12.1f} | {table:>13.1f} | {legacy / table:>8.2f}x")
+
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
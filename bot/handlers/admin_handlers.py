@@ -1,11 +1,18 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.filters import Command
 from aiogram.filters import CommandObject
 from aiogram.fsm.context import FSMContext
+from datetime import date, datetime
+from html import escape
+import asyncio
 
 from bot.utils.states import AdminStates
-from bot.keyboards.inline import admin_menu_keyboard, yes_no_keyboard
+from bot.utils import callbacks as cb
+from bot.utils.callbacks import callbacks
+from bot.utils.export import export_appointments_csv, SpooledInputFile
+from bot.utils.profiler import is_profiling, profile
+from bot.keyboards.inline import admin_menu_keyboard, admin_cancel_keyboard, yes_no_keyboard
 from config import Config
 
 import logging
@@ -14,6 +21,20 @@ router = Router()
 logger = logging.getLogger(__name__)
 config = Config()
 
+# Вывод /slow_queries и /query_plan
+SLOW_QUERIES_DEFAULT_LIMIT = 5
+SLOW_QUERIES_MAX_LIMIT = 10
+SLOW_QUERY_TEXT_LIMIT = 150
+SLOW_QUERY_PLAN_LIMIT = 3500
+
+# Длительность /profile по умолчанию и предел (секунды)
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+
+# Профиль снимается в фоне, чтобы не держать очередь апдейтов админа;
+# ссылки на задачи не дают сборщику мусора остановить их
+_profile_tasks = set()
+
 # Фильтр для проверки администратора
 def is_admin(user_id: int) -> bool:
     return user_id in config.ADMIN_IDS
@@ -31,8 +52,8 @@ async def cmd_admin(message: Message):
         reply_markup=admin_menu_keyboard()
     )
 
-@router.callback_query(F.data == "admin_stats")
-async def show_admin_stats(callback: CallbackQuery):
+@callbacks(cb.ADMIN_STATS)
+async def show_admin_stats(callback: CallbackQuery, crud):
     """Показать статистику"""
     
     if not is_admin(callback.from_user.id):
@@ -41,26 +62,236 @@ async def show_admin_stats(callback: CallbackQuery):
     
     await callback.answer()
     
-    # TODO: Получить статистику из БД
-    stats_text = """
-📊 Статистика за сегодня (15.01.2024):
+    # Одна строка дневного агрегата вместо подсчета по всем записям
+    today = date.today()
+    stats = await crud.get_daily_stats(today)
+    
+    average_check = stats['revenue'] // stats['paid_bookings'] if stats['paid_bookings'] else 0
+    
+    if stats['top_master_name']:
+        top_master = f"{stats['top_master_name']} ({stats['top_master_bookings']} записей)"
+    else:
+        top_master = "нет записей"
+    top_service = stats['top_service_name'] or "нет записей"
+    
+    stats_text = f"""
+📊 Статистика за сегодня ({today.strftime('%d.%m.%Y')}):
 
 👥 Клиенты:
-• Новые клиенты: 5
-• Всего клиентов: 127
+• Новые клиенты: {stats['new_clients']}
+• Всего клиентов: {stats['clients_total'] or 0}
 
 📅 Записи:
-• Записей сегодня: 12
-• Подтверждено: 10
-• Ожидают подтверждения: 2
+• Записей сегодня: {stats['bookings_total']}
+• Подтверждено: {stats['bookings_confirmed']}
+• Ожидают подтверждения: {stats['bookings_pending']}
+• Отменено: {stats['bookings_cancelled']}
 
 💰 Финансы:
-• Выручка за день: 25,000 руб.
-• Средний чек: 2,083 руб.
+• Выручка за день: {stats['revenue']:,} руб.
+• Средний чек: {average_check:,} руб.
 
 👩‍🔧 Мастера:
-• Самый популярный мастер: Анна (6 записей)
-• Самая популярная услуга: Наращивание ресниц
+• Самый популярный мастер: {top_master}
+• Самая популярная услуга: {top_service}
     """
     
-    await callback.message.edit_text(stats_text, reply_markup=admin_menu_keyboard())
\ No newline at end of file
+    await callback.message.edit_text(stats_text, reply_markup=admin_menu_keyboard())
+
+# Отдельного раздела финансов нет: выручка за период входит в выгрузку
+# записей, поэтому обе кнопки ведут к ней
+@callbacks(cb.ADMIN_FINANCE)
+@callbacks(cb.ADMIN_BOOKINGS)
+async def ask_export_period(callback: CallbackQuery, state: FSMContext):
+    """Запросить период для выгрузки записей и выручки"""
+    
+    if not is_admin(callback.from_user.id):
+        await callback.answer("⛔ Нет доступа")
+        return
+    
+    await callback.answer()
+    
+    today = date.today()
+    await callback.message.edit_text(
+        "📤 Выгрузка записей и выручки в CSV\n\n"
+        "Введите период в формате ДД.ММ.ГГГГ-ДД.ММ.ГГГГ, например:\n"
+        f"{today.replace(day=1).strftime('%d.%m.%Y')}-{today.strftime('%d.%m.%Y')}\n\n"
+        "Для отмены - /cancel",
+        reply_markup=admin_cancel_keyboard()
+    )
+    await state.set_state(AdminStates.entering_export_period)
+
+@callbacks(cb.ADMIN_CANCEL)
+async def cancel_admin_action(callback: CallbackQuery, state: FSMContext):
+    """Отменить ввод и вернуться в панель администратора"""
+    
+    await callback.answer("Действие отменено")
+    await state.clear()
+    await callback.message.edit_text("👨‍💼 Панель администратора", reply_markup=admin_menu_keyboard())
+
+@router.message(Command("cancel"), AdminStates.entering_export_period)
+async def cmd_cancel_export(message: Message, state: FSMContext):
+    """Отменить ввод периода командой /cancel"""
+    
+    await state.clear()
+    await message.answer("👨‍💼 Панель администратора", reply_markup=admin_menu_keyboard())
+
+@router.message(AdminStates.entering_export_period)
+async def export_period(message: Message, state: FSMContext, crud):
+    """Выгрузить записи за период в CSV-документ"""
+    
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
+    
+    try:
+        start_text, end_text = message.text.replace(" ", "").split("-")
+        date_from = datetime.strptime(start_text, "%d.%m.%Y").date()
+        date_to = datetime.strptime(end_text, "%d.%m.%Y").date()
+    except (AttributeError, ValueError):
+        await message.answer(
+            "❌ Не удалось разобрать период. Пример: 01.01.2024-31.01.2024",
+            reply_markup=admin_cancel_keyboard()
+        )
+        return
+    
+    if date_from > date_to:
+        date_from, date_to = date_to, date_from
+    
+    await state.clear()
+    await message.answer("⏳ Формируем выгрузку...")
+    
+    # Записи читаются курсором и пишутся в файл пачками
+    spool, rows_count, revenue = await export_appointments_csv(crud, date_from, date_to)
+    try:
+        filename = f"bookings_{date_from:%Y%m%d}_{date_to:%Y%m%d}.csv"
+        await message.answer_document(
+            SpooledInputFile(spool, filename),
+            caption=(
+                f"📤 Записи с {date_from:%d.%m.%Y} по {date_to:%d.%m.%Y}\n"
+                f"• Записей: {rows_count}\n"
+                f"• Выручка: {revenue:,} руб."
+            ),
+            reply_markup=admin_menu_keyboard()
+        )
+    finally:
+        spool.close()
+    
+    logger.info(f"📤 Админ {message.from_user.id} выгрузил {rows_count} записей")
+
+@router.message(Command("reload_catalog"))
+async def cmd_reload_catalog(message: Message, catalog):
+    """Сбросить кэш каталога после изменения мастеров или услуг"""
+    
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
+    
+    await catalog.invalidate()
+    await message.answer("🔄 Каталог мастеров и услуг будет перечитан из базы")
+
+@router.message(Command("slow_queries"))
+async def cmd_slow_queries(message: Message, command: CommandObject, query_tracer):
+    """Самые тяжелые запросы к БД: /slow_queries [N], /slow_queries reset"""
+    
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
+    
+    argument = (command.args or "").strip()
+    if argument == "reset":
+        query_tracer.reset()
+        await message.answer("🧹 Статистика запросов сброшена")
+        return
+    
+    limit = int(argument) if argument.isdigit() else SLOW_QUERIES_DEFAULT_LIMIT
+    top = query_tracer.top(min(limit, SLOW_QUERIES_MAX_LIMIT))
+    if not top:
+        await message.answer("📭 Запросов пока не было")
+        return
+    
+    lines = [
+        f"🐢 Запросы по суммарному времени с {query_tracer.started_at:%d.%m %H:%M} "
+        f"(медленные - от {query_tracer.slow_threshold * 1000:.0f} мс):\n"
+    ]
+    for stats in top:
+        handler, _ = stats.handlers.most_common(1)[0]
+        lines.append(
+            f"<b>{stats.statement_id}</b> • {stats.calls} выз. • всего {stats.total_time * 1000:.0f} мс • "
+            f"сред. {stats.mean_time * 1000:.1f} мс • макс. {stats.max_time * 1000:.0f} мс • "
+            f"медл. {stats.slow_calls} • планов {len(stats.plans)}\n"
+            f"👤 {escape(handler)}\n"
+            f"<code>{escape(stats.query[:SLOW_QUERY_TEXT_LIMIT])}</code>\n"
+        )
+    lines.append("План: /query_plan &lt;id&gt;")
+    
+    await message.answer("\n".join(lines))
+
+@router.message(Command("query_plan"))
+async def cmd_query_plan(message: Message, command: CommandObject, query_tracer):
+    """Последний снятый план медленного запроса: /query_plan <id>"""
+    
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
+    
+    stats = query_tracer.find((command.args or "").strip())
+    if stats is None:
+        await message.answer("❌ Запрос не найден. Список: /slow_queries")
+        return
+    if not stats.plans:
+        await message.answer(f"📭 Для {stats.statement_id} планов еще нет: запрос не был медленным")
+        return
+    
+    plan = stats.plans[-1]
+    header = (
+        f"📋 {stats.statement_id}: {plan.elapsed * 1000:.0f} мс, "
+        f"{plan.captured_at:%d.%m %H:%M:%S}, {escape(plan.handler)}\n\n"
+    )
+    # Сообщение Telegram ограничено 4096 символами
+    await message.answer(header + f"<pre>{escape(plan.plan[:SLOW_QUERY_PLAN_LIMIT])}</pre>")
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """Выборочный профиль процесса: /profile [секунды]"""
+    
+    if not is_admin(message.from_user.id):
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
+    
+    argument = (command.args or "").strip()
+    seconds = int(argument) if argument.isdigit() else PROFILE_DEFAULT_SECONDS
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    
+    if is_profiling():
+        await message.answer("⏳ Профиль уже снимается, дождитесь результата")
+        return
+    
+    await message.answer(f"🔬 Снимаем профиль {seconds} с, пришлем файл по готовности")
+    task = asyncio.create_task(send_profile(message, seconds))
+    _profile_tasks.add(task)
+    task.add_done_callback(_profile_tasks.discard)
+
+async def send_profile(message: Message, seconds: int):
+    """Снять профиль и отправить его админу документом"""
+    
+    try:
+        result = await profile(seconds)
+        if result is None:
+            await message.answer("⏳ Профиль уже снимается, дождитесь результата")
+            return
+        
+        filename = f"profile_{datetime.now():%Y%m%d_%H%M%S}.folded"
+        await message.answer_document(
+            BufferedInputFile(result.folded().encode("utf-8"), filename),
+            caption=result.summary() + "\n\n📄 Формат folded: speedscope.app или flamegraph.pl"
+        )
+        logger.info(f"🔬 Админ {message.from_user.id} снял профиль за {seconds} с")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Ошибка профилирования: {e}", exc_info=True)
+        try:
+            await message.answer("❌ Не удалось снять профиль, подробности в логе")
+        except Exception:
+            pass
@@ -4,22 +4,57 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
-from datetime import datetime, timedelta
+from datetime import date, datetime, time, timedelta
+import heapq
 import logging
 
 from bot.utils.states import ClientStates
+from bot.utils import callbacks as cb
+from bot.utils.callbacks import callbacks
+from bot.utils.catalog import format_duration
+from database.crud import SlotTakenError, PAGE_NEXT
+from bot.utils.availability import (
+    free_slots_by_day,
+    get_month_free_days,
+    invalidate_master_calendar
+)
+from bot.utils.dashboard import invalidate_master_dashboard
 from bot.keyboards.inline import (
     main_menu_keyboard, 
     cancel_keyboard, 
     masters_list_keyboard,
+    page_navigation_buttons,
     yes_no_keyboard
 )
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-# Временное хранилище записей (позже заменим на БД)
-user_appointments = {}
+# Сколько месяцев вперед можно листать календарь записи
+CALENDAR_MONTHS_AHEAD = 2
+
+# Сколько альтернативных слотов предлагать, если выбранное время заняли
+ALTERNATIVE_SLOTS_COUNT = 6
+
+# Записей клиента на одной странице
+CLIENT_PAGE_SIZE = 5
+
+# Без этих данных в состоянии (очищено или истекло) запись продолжить нельзя
+BOOKING_STATE_KEYS = ('master_id', 'service_id', 'service_duration_minutes')
+
+def has_booking_data(data: dict, *extra_keys: str) -> bool:
+    """Есть ли в состоянии все данные, нужные для следующего шага записи"""
+    return all(data.get(key) is not None for key in BOOKING_STATE_KEYS + extra_keys)
+
+async def restart_booking(callback: CallbackQuery, state: FSMContext):
+    """Состояние записи потеряно (старая кнопка): начать запись заново"""
+    
+    logger.info(f"⌛ Пользователь {callback.from_user.id} нажал кнопку записи без состояния")
+    await state.clear()
+    await callback.message.edit_text(
+        "⌛ Данные записи устарели. Начните запись заново:",
+        reply_markup=main_menu_keyboard()
+    )
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
@@ -46,49 +81,39 @@ async def cmd_start(message: Message):
     
     await message.answer(welcome_text, reply_markup=main_menu_keyboard())
 
-@router.callback_query(F.data == "book_appointment")
-async def start_booking(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.BOOK_APPOINTMENT)
+async def start_booking(callback: CallbackQuery, state: FSMContext, catalog):
     """Начало процесса записи"""
     
     await callback.answer()
     await callback.message.edit_text(
         "Выберите мастера:",
-        reply_markup=masters_list_keyboard([
-            {"id": 1, "full_name": "Анна", "experience": "5 лет"},
-            {"id": 2, "full_name": "Мария", "experience": "3 года"},
-            {"id": 3, "full_name": "Елена", "experience": "7 лет"}
-        ])
+        reply_markup=masters_list_keyboard(await catalog.get_masters())
     )
     
     await state.set_state(ClientStates.choosing_master)
 
-@router.callback_query(F.data.startswith("master_"))
-async def choose_master(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.CHOOSE_MASTER)
+async def choose_master(callback: CallbackQuery, state: FSMContext, catalog, master_id: int):
     """Выбор мастера"""
     
     await callback.answer()
-    master_id = callback.data.split("_")[1]
     
     # Сохраняем выбранного мастера в состоянии
     await state.update_data(master_id=master_id)
     
-    # TODO: Получить услуги мастера из БД
-    services = [
-        {"id": 1, "name": "Наращивание ресниц", "price": 2500, "duration": "2 часа"},
-        {"id": 2, "name": "Ламинирование ресниц", "price": 2000, "duration": "1.5 часа"},
-        {"id": 3, "name": "Коррекция бровей", "price": 1500, "duration": "1 час"},
-        {"id": 4, "name": "Оформление бровей", "price": 1200, "duration": "45 минут"},
-    ]
+    # Услуги мастера берем из кэша каталога
+    services = await catalog.get_services(master_id)
     
     # Создаем клавиатуру с услугами
     builder = InlineKeyboardBuilder()
     for service in services:
         builder.add(InlineKeyboardButton(
             text=f"{service['name']} - {service['price']} руб.",
-            callback_data=f"service_{service['id']}"
+            callback_data=cb.CHOOSE_SERVICE.pack(service['id'])
         ))
     
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.CANCEL.pack()))
     builder.adjust(1)
     
     await callback.message.edit_text(
@@ -98,24 +123,17 @@ async def choose_master(callback: CallbackQuery, state: FSMContext):
     
     await state.set_state(ClientStates.choosing_service)
 
-@router.callback_query(F.data.startswith("service_"))
-async def choose_service(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.CHOOSE_SERVICE)
+async def choose_service(callback: CallbackQuery, state: FSMContext, crud, catalog, service_id: int):
     """Выбор услуги"""
     
     await callback.answer()
-    service_id = callback.data.split("_")[1]
-    
-    # TODO: Получить информацию об услуге из БД
-    services_info = {
-        "1": {"name": "Наращивание ресниц", "price": 2500, "duration": "2 часа"},
-        "2": {"name": "Ламинирование ресниц", "price": 2000, "duration": "1.5 часа"},
-        "3": {"name": "Коррекция бровей", "price": 1500, "duration": "1 час"},
-        "4": {"name": "Оформление бровей", "price": 1200, "duration": "45 минут"},
-    }
     
-    service_info = services_info.get(service_id)
+    data = await state.get_data()
+    service_info = await catalog.get_service(service_id)
     
-    if not service_info:
+    # Услуга должна принадлежать выбранному мастеру
+    if not service_info or str(service_info["master_id"]) != str(data.get('master_id')):
         await callback.answer("❌ Услуга не найдена")
         return
     
@@ -124,63 +142,135 @@ async def choose_service(callback: CallbackQuery, state: FSMContext):
         service_id=service_id,
         service_name=service_info["name"],
         service_price=service_info["price"],
-        service_duration=service_info["duration"]
+        service_duration=format_duration(service_info["duration_minutes"]),
+        service_duration_minutes=service_info["duration_minutes"]
     )
     
-    # Генерируем даты на ближайшие 7 дней
-    dates = []
     today = datetime.now()
-    for i in range(1, 8):
-        date = today + timedelta(days=i)
-        if date.weekday() < 5:  # Только будние дни (0-4 = пн-пт)
-            dates.append(date.strftime("%d.%m.%Y"))
+    await show_calendar(callback, state, crud, today.year, today.month)
+
+async def show_calendar(callback: CallbackQuery, state: FSMContext, crud, year: int, month: int):
+    """Показать дни месяца, на которые есть свободное время"""
+    
+    data = await state.get_data()
+    if not has_booking_data(data):
+        await restart_booking(callback, state)
+        return
+    
+    # Свободная емкость по всему месяцу - один запрос (или кэш)
+    free_days = await get_month_free_days(
+        crud,
+        int(data.get('master_id')),
+        data.get('service_id'),
+        data.get('service_duration_minutes'),
+        year,
+        month
+    )
     
     # Создаем клавиатуру с датами
     builder = InlineKeyboardBuilder()
-    for date in dates:
+    for day, free_count in free_days.items():
         builder.add(InlineKeyboardButton(
-            text=date,
-            callback_data=f"date_{date}"
+            text=f"{day.strftime('%d.%m')} ({free_count})",
+            callback_data=cb.CHOOSE_DATE.pack(day)
         ))
     
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
-    builder.adjust(2)
+    # Навигация по месяцам: не раньше текущего и не дальше CALENDAR_MONTHS_AHEAD
+    today = datetime.now()
+    month_index = (year - today.year) * 12 + (month - today.month)
+    navigation = []
+    if month_index > 0:
+        prev_year, prev_month = divmod(year * 12 + month - 2, 12)
+        navigation.append(InlineKeyboardButton(
+            text="◀️ Пред. месяц",
+            callback_data=cb.CHOOSE_MONTH.pack(prev_year, prev_month + 1)
+        ))
+    if month_index < CALENDAR_MONTHS_AHEAD:
+        next_year, next_month = divmod(year * 12 + month, 12)
+        navigation.append(InlineKeyboardButton(
+            text="След. месяц ▶️",
+            callback_data=cb.CHOOSE_MONTH.pack(next_year, next_month + 1)
+        ))
     
-    await callback.message.edit_text(
-        f"✅ Вы выбрали: {service_info['name']}\n\n"
-        "Выберите дату:",
-        reply_markup=builder.as_markup()
-    )
+    builder.adjust(3)
+    if navigation:
+        builder.row(*navigation)
+    builder.row(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.CANCEL.pack()))
+    
+    if free_days:
+        text = (
+            f"✅ Вы выбрали: {data.get('service_name')}\n\n"
+            f"📅 {month:02d}.{year} - выберите дату (в скобках свободные окна):"
+        )
+    else:
+        text = (
+            f"✅ Вы выбрали: {data.get('service_name')}\n\n"
+            f"😔 В {month:02d}.{year} нет свободных дней. Посмотрите другой месяц."
+        )
+    
+    await callback.message.edit_text(text, reply_markup=builder.as_markup())
     
     await state.set_state(ClientStates.choosing_date)
 
-@router.callback_query(F.data.startswith("date_"))
-async def choose_date(callback: CallbackQuery, state: FSMContext):
-    """Выбор даты"""
+@callbacks(cb.CHOOSE_MONTH)
+async def choose_month(callback: CallbackQuery, state: FSMContext, crud, year: int, month: int):
+    """Переключение месяца в календаре"""
     
     await callback.answer()
-    date = callback.data.split("_")[1]
+    await show_calendar(callback, state, crud, year, month)
+
+@callbacks(cb.CHOOSE_DATE)
+async def choose_date(callback: CallbackQuery, state: FSMContext, crud, day: date = None):
+    """Выбор даты"""
     
-    # Сохраняем дату в состоянии
-    await state.update_data(date=date)
+    await callback.answer()
+    data = await state.get_data()
+    if not has_booking_data(data) or (day is None and not data.get('date')):
+        await restart_booking(callback, state)
+        return
     
-    # TODO: Получить доступное время для мастера на эту дату из БД
-    # Пока используем тестовые временные слоты
-    time_slots = [
-        "09:00", "10:30", "12:00", "13:30", 
-        "15:00", "16:30", "18:00", "19:30"
-    ]
+    if day is not None:
+        date = day.strftime("%d.%m.%Y")
+        # Сохраняем дату в состоянии
+        await state.update_data(date=date)
+    else:
+        # Возврат к выбору времени: дата уже сохранена в состоянии
+        date = data.get('date')
+        day = datetime.strptime(date, "%d.%m.%Y").date()
+    
+    # Свободное время считаем по расписанию мастера, его записям
+    # и длительности выбранной услуги
+    schedule, busy = await crud.get_master_availability_data(int(data.get('master_id')), day, day)
+    slots = free_slots_by_day(
+        schedule,
+        busy,
+        data.get('service_duration_minutes'),
+        not_before=datetime.now()
+    ).get(day, [])
+    
+    if not slots:
+        builder = InlineKeyboardBuilder()
+        builder.add(InlineKeyboardButton(text="◀️ Назад к датам", callback_data=cb.BACK_TO_DATES.pack()))
+        builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.CANCEL.pack()))
+        builder.adjust(1)
+        
+        await callback.message.edit_text(
+            f"😔 На {date} нет свободного времени.\n\n"
+            "Выберите другую дату:",
+            reply_markup=builder.as_markup()
+        )
+        return
     
     # Создаем клавиатуру со временем
     builder = InlineKeyboardBuilder()
-    for time in time_slots:
+    for slot in slots:
         builder.add(InlineKeyboardButton(
-            text=time,
-            callback_data=f"time_{time}"
+            text=slot.strftime("%H:%M"),
+            callback_data=cb.CHOOSE_TIME.pack(slot)
         ))
     
-    builder.add(InlineKeyboardButton(text="◀️ Назад к датам", callback_data="back_to_dates"))
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
+    builder.add(InlineKeyboardButton(text="◀️ Назад к датам", callback_data=cb.BACK_TO_DATES.pack()))
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.CANCEL.pack()))
     builder.adjust(2)
     
     await callback.message.edit_text(
@@ -191,22 +281,32 @@ async def choose_date(callback: CallbackQuery, state: FSMContext):
     
     await state.set_state(ClientStates.choosing_time)
 
-@router.callback_query(F.data == "back_to_dates")
-async def back_to_dates(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.BACK_TO_DATES)
+async def back_to_dates(callback: CallbackQuery, state: FSMContext, crud):
     """Вернуться к выбору даты"""
     
     await callback.answer()
-    await choose_service(callback, state)
+    
+    # Открываем календарь на месяце ранее выбранной даты
+    data = await state.get_data()
+    if data.get('date'):
+        selected = datetime.strptime(data['date'], "%d.%m.%Y")
+    else:
+        selected = datetime.now()
+    await show_calendar(callback, state, crud, selected.year, selected.month)
 
-@router.callback_query(F.data.startswith("time_"))
-async def choose_time(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.CHOOSE_TIME)
+async def choose_time(callback: CallbackQuery, state: FSMContext, catalog, slot: time):
     """Выбор времени"""
     
     await callback.answer()
-    time = callback.data.split("_")[1]
+    
+    if not has_booking_data(await state.get_data(), 'date'):
+        await restart_booking(callback, state)
+        return
     
     # Сохраняем время в состоянии
-    await state.update_data(time=time)
+    await state.update_data(time=slot.strftime("%H:%M"))
     
     # Получаем все данные из состояния
     data = await state.get_data()
@@ -214,7 +314,7 @@ async def choose_time(callback: CallbackQuery, state: FSMContext):
     confirmation_text = f"""
 ✅ Подтвердите запись:
 
-👩‍🔧 Мастер: {get_master_name(data.get('master_id'))}
+👩‍🔧 Мастер: {await catalog.get_master_name(data.get('master_id'))}
 💆 Услуга: {data.get('service_name')}
 💰 Стоимость: {data.get('service_price')} руб.
 ⏱️ Длительность: {data.get('service_duration')}
@@ -228,9 +328,9 @@ async def choose_time(callback: CallbackQuery, state: FSMContext):
     # Создаем клавиатуру для подтверждения
     builder = InlineKeyboardBuilder()
     builder.add(
-        InlineKeyboardButton(text="✅ Подтвердить запись", callback_data="confirm_booking"),
-        InlineKeyboardButton(text="◀️ Назад ко времени", callback_data="back_to_times"),
-        InlineKeyboardButton(text="❌ Отменить", callback_data="cancel")
+        InlineKeyboardButton(text="✅ Подтвердить запись", callback_data=cb.CONFIRM_BOOKING.pack()),
+        InlineKeyboardButton(text="◀️ Назад ко времени", callback_data=cb.BACK_TO_TIMES.pack()),
+        InlineKeyboardButton(text="❌ Отменить", callback_data=cb.CANCEL.pack())
     )
     builder.adjust(1)
     
@@ -241,58 +341,77 @@ async def choose_time(callback: CallbackQuery, state: FSMContext):
     
     await state.set_state(ClientStates.confirming_booking)
 
-@router.callback_query(F.data == "back_to_times")
-async def back_to_times(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.BACK_TO_TIMES)
+async def back_to_times(callback: CallbackQuery, state: FSMContext, crud):
     """Вернуться к выбору времени"""
     
     await callback.answer()
-    data = await state.get_data()
-    date = data.get('date')
     
     # Пересоздаем сообщение с выбором времени
-    await choose_date(callback, state)
+    await choose_date(callback, state, crud)
 
-@router.callback_query(F.data == "confirm_booking")
-async def confirm_booking(callback: CallbackQuery, state: FSMContext):
+@callbacks(cb.CONFIRM_BOOKING)
+async def confirm_booking(callback: CallbackQuery, state: FSMContext, crud, catalog):
     """Подтверждение записи"""
     
     await callback.answer()
     
     # Получаем данные из состояния
     data = await state.get_data()
-    user_id = callback.from_user.id
-    
-    # TODO: Сохранить запись в БД
-    # Временно сохраняем в памяти
-    if user_id not in user_appointments:
-        user_appointments[user_id] = []
-    
-    appointment_id = len(user_appointments[user_id]) + 1
-    appointment = {
-        "id": appointment_id,
-        "master_id": data.get('master_id'),
-        "master_name": get_master_name(data.get('master_id')),
-        "service_name": data.get('service_name'),
-        "service_price": data.get('service_price'),
-        "date": data.get('date'),
-        "time": data.get('time'),
-        "status": "pending",  # Ожидает подтверждения мастера
-        "created_at": datetime.now().strftime("%d.%m.%Y %H:%M")
-    }
+    if not has_booking_data(data, 'date', 'time'):
+        await restart_booking(callback, state)
+        return
+    master_id = int(data.get('master_id'))
+    start_time = datetime.strptime(f"{data.get('date')} {data.get('time')}", "%d.%m.%Y %H:%M")
+    
+    # Ограничение в БД отсекает только пересечения с другими записями.
+    # Рабочее время мастера проверяем здесь: кнопка могла устареть
+    # (мастер сменил расписание) или быть подделана
+    day = start_time.date()
+    schedule, busy = await crud.get_master_availability_data(master_id, day, day)
+    slots = free_slots_by_day(
+        schedule,
+        busy,
+        data.get('service_duration_minutes'),
+        not_before=datetime.now()
+    ).get(day, [])
+    if start_time.time() not in slots:
+        logger.info(f"⚡ Слот {start_time} мастера {master_id} недоступен")
+        await offer_alternative_slots(callback, state, crud, master_id, start_time)
+        return
     
-    user_appointments[user_id].append(appointment)
+    # Сохраняем запись в БД. Пересечение с записью, сделанной за это
+    # время, отсекает ограничение в БД
+    try:
+        appointment_id = await crud.create_appointment(
+            client_telegram_id=callback.from_user.id,
+            client_name=callback.from_user.full_name,
+            master_id=master_id,
+            service_id=int(data.get('service_id')),
+            start_time=start_time,
+            duration_minutes=data.get('service_duration_minutes'),
+            price=data.get('service_price')
+        )
+    except SlotTakenError:
+        logger.info(f"⚡ Слот {start_time} мастера {master_id} уже занят")
+        await offer_alternative_slots(callback, state, crud, master_id, start_time)
+        return
     
-    # TODO: Отправить уведомление мастеру
+    # Свободная емкость мастера изменилась - сбрасываем кэш календаря.
+    # Уведомление мастеру, статистику и кэши других процессов
+    # обработает OutboxConsumer по событию, записанному вместе с записью
+    invalidate_master_calendar(master_id)
+    invalidate_master_dashboard(master_id)
     
     booking_details = f"""
 🎉 Запись #{appointment_id} подтверждена!
 
 Детали записи:
-• Мастер: {appointment['master_name']}
-• Услуга: {appointment['service_name']}
-• Дата: {appointment['date']}
-• Время: {appointment['time']}
-• Стоимость: {appointment['service_price']} руб.
+• Мастер: {await catalog.get_master_name(data.get('master_id'))}
+• Услуга: {data.get('service_name')}
+• Дата: {data.get('date')}
+• Время: {data.get('time')}
+• Стоимость: {data.get('service_price')} руб.
 • Статус: Ожидает подтверждения мастера
 
 📱 Вы получите напоминание за 24 часа до визита.
@@ -303,9 +422,9 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext):
     # Клавиатура с действиями после записи
     builder = InlineKeyboardBuilder()
     builder.add(
-        InlineKeyboardButton(text="📋 Мои записи", callback_data="my_appointments"),
-        InlineKeyboardButton(text="📅 Новая запись", callback_data="book_appointment"),
-        InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")
+        InlineKeyboardButton(text="📋 Мои записи", callback_data=cb.MY_APPOINTMENTS.pack()),
+        InlineKeyboardButton(text="📅 Новая запись", callback_data=cb.BOOK_APPOINTMENT.pack()),
+        InlineKeyboardButton(text="🏠 В главное меню", callback_data=cb.MAIN_MENU.pack())
     )
     builder.adjust(1)
     
@@ -317,21 +436,96 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext):
     # Очищаем состояние
     await state.clear()
 
-@router.callback_query(F.data == "main_menu")
+async def offer_alternative_slots(
+    callback: CallbackQuery,
+    state: FSMContext,
+    crud,
+    master_id: int,
+    start_time: datetime
+):
+    """Слот заняли или он вне расписания: предложить ближайшее свободное время"""
+    
+    data = await state.get_data()
+    invalidate_master_calendar(master_id)
+    
+    day = start_time.date()
+    schedule, busy = await crud.get_master_availability_data(master_id, day, day)
+    slots = free_slots_by_day(
+        schedule,
+        busy,
+        data.get('service_duration_minutes'),
+        not_before=datetime.now()
+    ).get(day, [])
+    
+    # Ближайшие к желаемому времени слоты, по порядку
+    requested = start_time.hour * 60 + start_time.minute
+    nearest = sorted(heapq.nsmallest(
+        ALTERNATIVE_SLOTS_COUNT,
+        slots,
+        key=lambda slot: abs(slot.hour * 60 + slot.minute - requested)
+    ))
+    
+    builder = InlineKeyboardBuilder()
+    for slot in nearest:
+        builder.add(InlineKeyboardButton(text=slot.strftime("%H:%M"), callback_data=cb.CHOOSE_TIME.pack(slot)))
+    builder.adjust(3)
+    builder.row(InlineKeyboardButton(text="◀️ Другая дата", callback_data=cb.BACK_TO_DATES.pack()))
+    builder.row(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.CANCEL.pack()))
+    
+    if nearest:
+        text = (
+            f"⚡ Время {data.get('time')} уже недоступно.\n\n"
+            f"Свободное время {data.get('date')} рядом с выбранным:"
+        )
+    else:
+        text = (
+            f"⚡ Время {data.get('time')} уже недоступно, "
+            f"а других окон {data.get('date')} не осталось.\n\n"
+            "Выберите другую дату:"
+        )
+    
+    await callback.message.edit_text(text, reply_markup=builder.as_markup())
+    await state.set_state(ClientStates.choosing_time)
+
+@callbacks(cb.MAIN_MENU)
 async def go_to_main_menu(callback: CallbackQuery):
     """Вернуться в главное меню"""
     
     await callback.answer()
     await cmd_start(callback.message)
 
-@router.callback_query(F.data == "my_appointments")
-async def show_my_appointments(callback: CallbackQuery):
+@callbacks(cb.MY_APPOINTMENTS)
+async def show_my_appointments(callback: CallbackQuery, crud):
     """Показать мои записи"""
     
     await callback.answer()
+    await show_appointments_page(callback, crud)
+
+@callbacks(cb.MY_APPOINTMENTS_PAGE)
+async def my_appointments_page(
+    callback: CallbackQuery,
+    crud,
+    direction: str,
+    start_time: datetime,
+    appointment_id: int
+):
+    """Листание моих записей"""
+    
+    await callback.answer()
+    await show_appointments_page(callback, crud, (start_time, appointment_id), direction)
+
+async def show_appointments_page(callback: CallbackQuery, crud, cursor=None, direction: str = PAGE_NEXT):
+    """Страница записей клиента: читается только она сама"""
+    
     user_id = callback.from_user.id
     
-    appointments = user_appointments.get(user_id, [])
+    page = await crud.get_client_appointments_page(user_id, cursor, direction, CLIENT_PAGE_SIZE)
+    appointments = page.rows
+    
+    if not appointments and cursor is not None:
+        # Записи на странице исчезли (например, отменены) - начинаем сначала
+        await show_appointments_page(callback, crud)
+        return
     
     if appointments:
         appointments_text = ""
@@ -339,10 +533,10 @@ async def show_my_appointments(callback: CallbackQuery):
             status_icon = "⏳" if appointment['status'] == 'pending' else "✅"
             appointments_text += f"""
 {status_icon} Запись #{appointment['id']}
-📅 {appointment['date']} {appointment['time']}
+📅 {appointment['start_time'].strftime('%d.%m.%Y %H:%M')}
 👩‍🔧 {appointment['master_name']}
 💆 {appointment['service_name']}
-💰 {appointment['service_price']} руб.
+💰 {appointment['price']} руб.
 🔄 Статус: {appointment['status']}
             """
         
@@ -354,12 +548,15 @@ async def show_my_appointments(callback: CallbackQuery):
             if appointment['status'] == 'pending':  # Можно отменять только ожидающие записи
                 builder.add(InlineKeyboardButton(
                     text=f"❌ Отменить запись #{appointment['id']}",
-                    callback_data=f"cancel_appointment_{appointment['id']}"
+                    callback_data=cb.CANCEL_APPOINTMENT.pack(appointment['id'])
                 ))
-        
-        builder.add(InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu"))
         builder.adjust(1)
         
+        navigation = page_navigation_buttons(cb.MY_APPOINTMENTS_PAGE, page)
+        if navigation:
+            builder.row(*navigation)
+        builder.row(InlineKeyboardButton(text="🏠 В главное меню", callback_data=cb.MAIN_MENU.pack()))
+        
         await callback.message.edit_text(
             text,
             reply_markup=builder.as_markup()
@@ -369,8 +566,8 @@ async def show_my_appointments(callback: CallbackQuery):
         
         builder = InlineKeyboardBuilder()
         builder.add(
-            InlineKeyboardButton(text="📅 Записаться", callback_data="book_appointment"),
-            InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")
+            InlineKeyboardButton(text="📅 Записаться", callback_data=cb.BOOK_APPOINTMENT.pack()),
+            InlineKeyboardButton(text="🏠 В главное меню", callback_data=cb.MAIN_MENU.pack())
         )
         builder.adjust(1)
         
@@ -379,48 +576,46 @@ async def show_my_appointments(callback: CallbackQuery):
             reply_markup=builder.as_markup()
         )
 
-@router.callback_query(F.data.startswith("cancel_appointment_"))
-async def cancel_appointment(callback: CallbackQuery):
+@callbacks(cb.CANCEL_APPOINTMENT)
+async def cancel_appointment(callback: CallbackQuery, crud, appointment_id: int):
     """Отмена записи"""
     
     await callback.answer()
     
     user_id = callback.from_user.id
-    appointment_id = int(callback.data.split("_")[2])
-    
-    # Находим запись для отмене
-    if user_id in user_appointments:
-        for i, appointment in enumerate(user_appointments[user_id]):
-            if appointment['id'] == appointment_id:
-                # Удаляем запись
-                deleted_appointment = user_appointments[user_id].pop(i)
-                
-                # TODO: Отправить уведомление мастеру об отмене
-                # TODO: Вернуть предоплату если была
-                
-                # Показываем подтверждение отмены
-                builder = InlineKeyboardBuilder()
-                builder.add(
-                    InlineKeyboardButton(text="📋 Мои записи", callback_data="my_appointments"),
-                    InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")
-                )
-                builder.adjust(1)
-                
-                await callback.message.edit_text(
-                    f"❌ Запись #{appointment_id} отменена:\n\n"
-                    f"• Мастер: {deleted_appointment['master_name']}\n"
-                    f"• Дата: {deleted_appointment['date']}\n"
-                    f"• Время: {deleted_appointment['time']}\n"
-                    f"• Услуга: {deleted_appointment['service_name']}\n\n"
-                    f"Если была внесена предоплата, она будет возвращена в течение 24 часов.",
-                    reply_markup=builder.as_markup()
-                )
-                return
-    
-    # Если запись не найдена
-    await callback.answer("❌ Запись не найдена")
-
-@router.callback_query(F.data == "about_studio")
+    
+    # Отменяем запись одним запросом (только свою и только ожидающую)
+    cancelled = await crud.cancel_client_appointment(appointment_id, user_id)
+    
+    if not cancelled:
+        # Если запись не найдена
+        await callback.answer("❌ Запись не найдена")
+        return
+    
+    # Уведомление мастеру отправит OutboxConsumer
+    # TODO: Вернуть предоплату если была (оплата пока не подключена)
+    invalidate_master_calendar(cancelled['master_id'])
+    invalidate_master_dashboard(cancelled['master_id'])
+    
+    # Показываем подтверждение отмены
+    builder = InlineKeyboardBuilder()
+    builder.add(
+        InlineKeyboardButton(text="📋 Мои записи", callback_data=cb.MY_APPOINTMENTS.pack()),
+        InlineKeyboardButton(text="🏠 В главное меню", callback_data=cb.MAIN_MENU.pack())
+    )
+    builder.adjust(1)
+    
+    await callback.message.edit_text(
+        f"❌ Запись #{appointment_id} отменена:\n\n"
+        f"• Мастер: {cancelled['master_name']}\n"
+        f"• Дата: {cancelled['start_time'].strftime('%d.%m.%Y')}\n"
+        f"• Время: {cancelled['start_time'].strftime('%H:%M')}\n"
+        f"• Услуга: {cancelled['service_name']}\n\n"
+        f"Если была внесена предоплата, она будет возвращена в течение 24 часов.",
+        reply_markup=builder.as_markup()
+    )
+
+@callbacks(cb.ABOUT_STUDIO)
 async def about_studio(callback: CallbackQuery):
     """Информация о студии"""
     
@@ -445,8 +640,8 @@ async def about_studio(callback: CallbackQuery):
     
     builder = InlineKeyboardBuilder()
     builder.add(
-        InlineKeyboardButton(text="📅 Записаться", callback_data="book_appointment"),
-        InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")
+        InlineKeyboardButton(text="📅 Записаться", callback_data=cb.BOOK_APPOINTMENT.pack()),
+        InlineKeyboardButton(text="🏠 В главное меню", callback_data=cb.MAIN_MENU.pack())
     )
     builder.adjust(1)
     
@@ -455,7 +650,7 @@ async def about_studio(callback: CallbackQuery):
         reply_markup=builder.as_markup()
     )
 
-@router.callback_query(F.data == "contacts")
+@callbacks(cb.CONTACTS)
 async def show_contacts(callback: CallbackQuery):
     """Показать контакты"""
     
@@ -482,8 +677,8 @@ VK: vk.com/beauty_studio
     
     builder = InlineKeyboardBuilder()
     builder.add(
-        InlineKeyboardButton(text="📅 Записаться", callback_data="book_appointment"),
-        InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu")
+        InlineKeyboardButton(text="📅 Записаться", callback_data=cb.BOOK_APPOINTMENT.pack()),
+        InlineKeyboardButton(text="🏠 В главное меню", callback_data=cb.MAIN_MENU.pack())
     )
     builder.adjust(1)
     
@@ -492,20 +687,11 @@ VK: vk.com/beauty_studio
         reply_markup=builder.as_markup()
     )
 
-@router.callback_query(F.data == "cancel")
+@callbacks(cb.CANCEL)
 async def cancel_action(callback: CallbackQuery, state: FSMContext):
     """Отмена действия"""
     
     await callback.answer("Действие отменено")
     await state.clear()
     
-    await go_to_main_menu(callback)
-
-def get_master_name(master_id):
-    """Получить имя мастера по ID"""
-    masters = {
-        "1": "Анна",
-        "2": "Мария", 
-        "3": "Елена"
-    }
-    return masters.get(str(master_id), "Неизвестный мастер")
\ No newline at end of file
+    await go_to_main_menu(callback)
\ No newline at end of file
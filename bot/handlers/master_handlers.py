@@ -8,71 +8,95 @@ from datetime import datetime, timedelta
 import logging
 
 from bot.utils.states import MasterStates
-from bot.keyboards.inline import cancel_keyboard
+from bot.utils import callbacks as cb
+from bot.utils.callbacks import callbacks
+from bot.keyboards.inline import cancel_keyboard, page_navigation_buttons
+from database.crud import PAGE_NEXT
+from bot.utils.availability import invalidate_master_calendar
+from bot.utils.dashboard import get_master_dashboard, invalidate_master_dashboard
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-def is_master(user_id: int, crud) -> bool:
-    """Проверка что пользователь является мастером"""
-    master = crud.get_master_by_telegram_id(user_id)
-    return master is not None
+# Размер страниц в панели мастера
+MASTER_PAGE_SIZE = 10
+PENDING_PAGE_SIZE = 5
 
 @router.message(Command("master"))
-async def cmd_master(message: Message, crud):
+async def cmd_master(message: Message, crud, master):
     """Панель мастера"""
     
-    if not is_master(message.from_user.id, crud):
+    # Запись мастера уже найдена RoleMiddleware (None - не мастер)
+    if not master:
         await message.answer("⛔ У вас нет доступа к этой команде")
         return
     
-    # Получаем информацию о мастере
-    master = await crud.get_master_by_telegram_id(message.from_user.id)
-    
-    # Получаем статистику мастера
-    appointments = await crud.get_master_appointments(master['id'])
-    
-    pending_count = sum(1 for a in appointments if a['status'] == 'pending')
-    today_count = sum(1 for a in appointments if a['start_time'].date() == datetime.now().date())
+    # Счетчики панели считает БД одним запросом (с коротким кэшем)
+    counters = await get_master_dashboard(crud, master['id'])
     
     stats_text = f"""
 👩‍🔧 Панель мастера: {master['full_name']}
 
 📊 Статистика:
-• Всего записей: {len(appointments)}
-• Ожидают подтверждения: {pending_count}
-• Записей сегодня: {today_count}
+• Всего записей: {counters['total']}
+• Ожидают подтверждения: {counters['pending']}
+• Записей сегодня: {counters['today']}
 
 Выберите действие:
     """
     
     builder = InlineKeyboardBuilder()
     builder.add(
-        InlineKeyboardButton(text="📋 Мои записи", callback_data="master_appointments"),
-        InlineKeyboardButton(text="⏳ Ожидают подтверждения", callback_data="master_pending"),
-        InlineKeyboardButton(text="📅 Расписание", callback_data="master_schedule"),
-        InlineKeyboardButton(text="⚙️  Настройки", callback_data="master_settings")
+        InlineKeyboardButton(text="📋 Мои записи", callback_data=cb.MASTER_APPOINTMENTS.pack()),
+        InlineKeyboardButton(text="⏳ Ожидают подтверждения", callback_data=cb.MASTER_PENDING.pack()),
+        InlineKeyboardButton(text="📅 Расписание", callback_data=cb.MASTER_SCHEDULE.pack()),
+        InlineKeyboardButton(text="⚙️  Настройки", callback_data=cb.MASTER_SETTINGS.pack())
     )
     builder.adjust(2)
     
     await message.answer(stats_text, reply_markup=builder.as_markup())
 
-@router.callback_query(F.data == "master_appointments")
-async def show_master_appointments(callback: CallbackQuery, crud):
+@callbacks(cb.MASTER_APPOINTMENTS)
+async def show_master_appointments(callback: CallbackQuery, crud, master):
     """Показать записи мастера"""
     
     await callback.answer()
     
-    master = await crud.get_master_by_telegram_id(callback.from_user.id)
     if not master:
         await callback.answer("❌ Вы не являетесь мастером")
         return
     
-    appointments = await crud.get_master_appointments(master['id'])
+    await show_master_appointments_page(callback, crud, master)
+
+@callbacks(cb.MASTER_APPOINTMENTS_PAGE)
+async def master_appointments_page(
+    callback: CallbackQuery,
+    crud,
+    master,
+    direction: str,
+    start_time: datetime,
+    appointment_id: int
+):
+    """Листание записей мастера"""
+    
+    await callback.answer()
+    await show_master_appointments_page(callback, crud, master, (start_time, appointment_id), direction)
+
+async def show_master_appointments_page(callback: CallbackQuery, crud, master, cursor=None, direction: str = PAGE_NEXT):
+    """Страница записей мастера, от новых к старым"""
+    
+    page = await crud.get_master_appointments_page(
+        master['id'], cursor=cursor, direction=direction, page_size=MASTER_PAGE_SIZE
+    )
+    appointments = page.rows
+    
+    if not appointments and cursor is not None:
+        await show_master_appointments_page(callback, crud, master)
+        return
     
     if appointments:
         appointments_text = ""
-        for app in appointments[:10]:  # Показываем последние 10 записей
+        for app in appointments:
             status_icons = {
                 'pending': '⏳',
                 'confirmed': '✅',
@@ -91,9 +115,12 @@ async def show_master_appointments(callback: CallbackQuery, crud):
         text = f"📋 Ваши записи:\n{appointments_text}"
         
         builder = InlineKeyboardBuilder()
-        builder.add(
-            InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_master"),
-            InlineKeyboardButton(text="⏳ Ожидают", callback_data="master_pending")
+        navigation = page_navigation_buttons(cb.MASTER_APPOINTMENTS_PAGE, page)
+        if navigation:
+            builder.row(*navigation)
+        builder.row(
+            InlineKeyboardButton(text="◀️ Назад", callback_data=cb.BACK_TO_MASTER.pack()),
+            InlineKeyboardButton(text="⏳ Ожидают", callback_data=cb.MASTER_PENDING.pack())
         )
         
         await callback.message.edit_text(text, reply_markup=builder.as_markup())
@@ -101,28 +128,54 @@ async def show_master_appointments(callback: CallbackQuery, crud):
         text = "📭 У вас пока нет записей"
         
         builder = InlineKeyboardBuilder()
-        builder.add(InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_master"))
+        builder.add(InlineKeyboardButton(text="◀️ Назад", callback_data=cb.BACK_TO_MASTER.pack()))
         
         await callback.message.edit_text(text, reply_markup=builder.as_markup())
 
-@router.callback_query(F.data == "master_pending")
-async def show_pending_appointments(callback: CallbackQuery, crud):
+@callbacks(cb.MASTER_PENDING)
+async def show_pending_appointments(callback: CallbackQuery, crud, master):
     """Показать записи ожидающие подтверждения"""
     
     await callback.answer()
     
-    master = await crud.get_master_by_telegram_id(callback.from_user.id)
     if not master:
         await callback.answer("❌ Вы не являетесь мастером")
         return
     
-    appointments = await crud.get_master_appointments(master['id'], status='pending')
+    await show_pending_page(callback, crud, master)
+
+@callbacks(cb.MASTER_PENDING_PAGE)
+async def pending_appointments_page(
+    callback: CallbackQuery,
+    crud,
+    master,
+    direction: str,
+    start_time: datetime,
+    appointment_id: int
+):
+    """Листание записей, ожидающих подтверждения"""
+    
+    await callback.answer()
+    await show_pending_page(callback, crud, master, (start_time, appointment_id), direction)
+
+async def show_pending_page(callback: CallbackQuery, crud, master, cursor=None, direction: str = PAGE_NEXT):
+    """Страница записей, ожидающих подтверждения, по времени визита"""
+    
+    page = await crud.get_master_appointments_page(
+        master['id'], status='pending', cursor=cursor, direction=direction, page_size=PENDING_PAGE_SIZE
+    )
+    appointments = page.rows
+    
+    if not appointments and cursor is not None:
+        # Все записи страницы уже подтверждены или отклонены
+        await show_pending_page(callback, crud, master)
+        return
     
     if appointments:
         appointments_text = ""
         builder = InlineKeyboardBuilder()
         
-        for app in appointments[:5]:  # Показываем до 5 записей
+        for app in appointments:
             appointments_text += f"""
 ⏳ Запись #{app['id']}
 👤 {app['client_name'] or 'Клиент'}
@@ -134,16 +187,19 @@ async def show_pending_appointments(callback: CallbackQuery, crud):
             builder.add(
                 InlineKeyboardButton(
                     text=f"✅ Подтвердить #{app['id']}",
-                    callback_data=f"confirm_{app['id']}"
+                    callback_data=cb.CONFIRM_APPOINTMENT.pack(app['id'])
                 ),
                 InlineKeyboardButton(
                     text=f"❌ Отклонить #{app['id']}",
-                    callback_data=f"reject_{app['id']}"
+                    callback_data=cb.REJECT_APPOINTMENT.pack(app['id'])
                 )
             )
         
-        builder.add(InlineKeyboardButton(text="◀️ Назад", callback_data="master_appointments"))
         builder.adjust(1)
+        navigation = page_navigation_buttons(cb.MASTER_PENDING_PAGE, page)
+        if navigation:
+            builder.row(*navigation)
+        builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data=cb.MASTER_APPOINTMENTS.pack()))
         
         text = f"⏳ Записи ожидающие подтверждения:\n{appointments_text}"
         await callback.message.edit_text(text, reply_markup=builder.as_markup())
@@ -151,35 +207,32 @@ async def show_pending_appointments(callback: CallbackQuery, crud):
         text = "✅ Нет записей ожидающих подтверждения"
         
         builder = InlineKeyboardBuilder()
-        builder.add(InlineKeyboardButton(text="◀️ Назад", callback_data="master_appointments"))
+        builder.add(InlineKeyboardButton(text="◀️ Назад", callback_data=cb.MASTER_APPOINTMENTS.pack()))
         
         await callback.message.edit_text(text, reply_markup=builder.as_markup())
 
-@router.callback_query(F.data.startswith("confirm_"))
-async def confirm_appointment(callback: CallbackQuery, crud):
+@callbacks(cb.CONFIRM_APPOINTMENT)
+async def confirm_appointment(callback: CallbackQuery, crud, master, appointment_id: int):
     """Подтвердить запись"""
     
     await callback.answer()
     
-    appointment_id = int(callback.data.split("_")[1])
-    master = await crud.get_master_by_telegram_id(callback.from_user.id)
-    
     if not master:
         await callback.answer("❌ Вы не являетесь мастером")
         return
     
-    success = await crud.update_appointment_status(appointment_id, master['id'], 'confirmed')
+    # Статус, событие outbox и детали записи - один запрос. Уведомление
+    # клиенту и статистику обработает OutboxConsumer (bot/utils/outbox.py)
+    appointment = await crud.update_appointment_status(appointment_id, master['id'], 'confirmed')
     
-    if success:
-        # Получаем детали записи для уведомления клиента
-        appointment = await crud.get_appointment_details(appointment_id)
-        
-        # TODO: Отправить уведомление клиенту
+    if appointment:
+        # Свой кэш сбрасываем сразу, остальные процессы - через outbox
+        invalidate_master_dashboard(master['id'])
         
         await callback.answer("✅ Запись подтверждена")
         
         builder = InlineKeyboardBuilder()
-        builder.add(InlineKeyboardButton(text="◀️ Назад к записям", callback_data="master_pending"))
+        builder.add(InlineKeyboardButton(text="◀️ Назад к записям", callback_data=cb.MASTER_PENDING.pack()))
         
         await callback.message.edit_text(
             f"✅ Запись #{appointment_id} подтверждена!\n\n"
@@ -191,26 +244,27 @@ async def confirm_appointment(callback: CallbackQuery, crud):
     else:
         await callback.answer("❌ Ошибка подтверждения")
 
-@router.callback_query(F.data.startswith("reject_"))
-async def reject_appointment(callback: CallbackQuery, crud):
+@callbacks(cb.REJECT_APPOINTMENT)
+async def reject_appointment(callback: CallbackQuery, crud, master, appointment_id: int):
     """Отклонить запись"""
     
     await callback.answer()
     
-    appointment_id = int(callback.data.split("_")[1])
-    master = await crud.get_master_by_telegram_id(callback.from_user.id)
-    
     if not master:
         await callback.answer("❌ Вы не являетесь мастером")
         return
     
-    success = await crud.update_appointment_status(appointment_id, master['id'], 'cancelled')
+    appointment = await crud.update_appointment_status(appointment_id, master['id'], 'cancelled')
     
-    if success:
+    if appointment:
+        # Слот освободился - календарь мастера нужно пересчитать
+        invalidate_master_calendar(master['id'])
+        invalidate_master_dashboard(master['id'])
+        
         await callback.answer("❌ Запись отклонена")
         
         builder = InlineKeyboardBuilder()
-        builder.add(InlineKeyboardButton(text="◀️ Назад к записям", callback_data="master_pending"))
+        builder.add(InlineKeyboardButton(text="◀️ Назад к записям", callback_data=cb.MASTER_PENDING.pack()))
         
         await callback.message.edit_text(
             f"❌ Запись #{appointment_id} отклонена",
@@ -219,9 +273,9 @@ async def reject_appointment(callback: CallbackQuery, crud):
     else:
         await callback.answer("❌ Ошибка отклонения")
 
-@router.callback_query(F.data == "back_to_master")
-async def back_to_master_panel(callback: CallbackQuery):
+@callbacks(cb.BACK_TO_MASTER)
+async def back_to_master_panel(callback: CallbackQuery, crud, master):
     """Вернуться в панель мастера"""
     
     await callback.answer()
-    await cmd_master(callback.message, callback.bot['crud'])
\ No newline at end of file
+    await cmd_master(callback.message, crud, master)
\ No newline at end of file
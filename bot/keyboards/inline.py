@@ -1,15 +1,18 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from bot.utils import callbacks as cb
+from database.crud import PAGE_NEXT, PAGE_PREV
+
 def main_menu_keyboard():
     """Главное меню для клиентов"""
     builder = InlineKeyboardBuilder()
     
     builder.add(
-        InlineKeyboardButton(text="📅 Записаться", callback_data="book_appointment"),
-        InlineKeyboardButton(text="📋 Мои записи", callback_data="my_appointments"),
-        InlineKeyboardButton(text="ℹ️  О студии", callback_data="about_studio"),
-        InlineKeyboardButton(text="📞 Контакты", callback_data="contacts")
+        InlineKeyboardButton(text="📅 Записаться", callback_data=cb.BOOK_APPOINTMENT.pack()),
+        InlineKeyboardButton(text="📋 Мои записи", callback_data=cb.MY_APPOINTMENTS.pack()),
+        InlineKeyboardButton(text="ℹ️  О студии", callback_data=cb.ABOUT_STUDIO.pack()),
+        InlineKeyboardButton(text="📞 Контакты", callback_data=cb.CONTACTS.pack())
     )
     
     builder.adjust(2, 1, 1)
@@ -18,7 +21,7 @@ def main_menu_keyboard():
 def cancel_keyboard():
     """Клавиатура для отмены действия"""
     builder = InlineKeyboardBuilder()
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.CANCEL.pack()))
     return builder.as_markup()
 
 def masters_list_keyboard(masters):
@@ -28,10 +31,10 @@ def masters_list_keyboard(masters):
     for master in masters:
         builder.add(InlineKeyboardButton(
             text=f"{master['full_name']} ({master['experience']})",
-            callback_data=f"master_{master['id']}"
+            callback_data=cb.CHOOSE_MASTER.pack(master['id'])
         ))
     
-    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data="cancel"))
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.CANCEL.pack()))
     builder.adjust(1)
     return builder.as_markup()
 
@@ -39,8 +42,8 @@ def yes_no_keyboard():
     """Клавиатура Да/Нет"""
     builder = InlineKeyboardBuilder()
     builder.add(
-        InlineKeyboardButton(text="✅ Да", callback_data="yes"),
-        InlineKeyboardButton(text="❌ Нет", callback_data="no")
+        InlineKeyboardButton(text="✅ Да", callback_data=cb.YES.pack()),
+        InlineKeyboardButton(text="❌ Нет", callback_data=cb.NO.pack())
     )
     return builder.as_markup()
 
@@ -49,17 +52,38 @@ def admin_menu_keyboard():
     builder = InlineKeyboardBuilder()
     
     builder.add(
-        InlineKeyboardButton(text="👥 Мастера", callback_data="admin_masters"),
-        InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"),
-        InlineKeyboardButton(text="📅 Все записи", callback_data="admin_bookings"),
-        InlineKeyboardButton(text="💰 Финансы", callback_data="admin_finance")
+        InlineKeyboardButton(text="👥 Мастера", callback_data=cb.ADMIN_MASTERS.pack()),
+        InlineKeyboardButton(text="📊 Статистика", callback_data=cb.ADMIN_STATS.pack()),
+        InlineKeyboardButton(text="📅 Все записи", callback_data=cb.ADMIN_BOOKINGS.pack()),
+        InlineKeyboardButton(text="💰 Финансы", callback_data=cb.ADMIN_FINANCE.pack())
     )
     
     builder.adjust(2, 2)
     return builder.as_markup()
 
+def admin_cancel_keyboard():
+    """Отмена ввода администратора с возвратом в его меню"""
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(text="❌ Отмена", callback_data=cb.ADMIN_CANCEL.pack()))
+    return builder.as_markup()
+
 def back_to_main_keyboard():
     """Клавиатура для возврата в главное меню"""
     builder = InlineKeyboardBuilder()
-    builder.add(InlineKeyboardButton(text="🏠 В главное меню", callback_data="main_menu"))
-    return builder.as_markup()
\ No newline at end of file
+    builder.add(InlineKeyboardButton(text="🏠 В главное меню", callback_data=cb.MAIN_MENU.pack()))
+    return builder.as_markup()
+
+def page_navigation_buttons(action, page):
+    """Кнопки листания страницы: курсор - ключ крайней записи страницы"""
+    buttons = []
+    if page.has_prev:
+        buttons.append(InlineKeyboardButton(
+            text="◀️ Пред.",
+            callback_data=action.pack(PAGE_PREV, *page.first_key)
+        ))
+    if page.has_next:
+        buttons.append(InlineKeyboardButton(
+            text="След. ▶️",
+            callback_data=action.pack(PAGE_NEXT, *page.last_key)
+        ))
+    return buttons
\ No newline at end of file
@@ -8,12 +8,30 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import asyncio
 import logging
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from config import Config
 from database.models import Database
+from database.crud import CRUD
+from bot.utils.catalog import Catalog
+from bot.middlewares import (
+    RoleMiddleware, CRUDMiddleware, FSMBufferMiddleware, UpdateMetricsMiddleware, HandlerMetricsMiddleware
+)
+from bot.utils.fsm_storage import CoalescingRedisStorage
+from bot.utils.notifications import NotificationDispatcher
+from bot.utils.reminders import ReminderScheduler
+from bot.utils.outbox import MasterCacheSync, OutboxConsumer
+from bot.utils.callbacks import callbacks
+from bot.utils.query_tracer import DEFAULT_EXPLAIN_SAMPLE_RATE, DEFAULT_SLOW_QUERY_MS, QueryTracer
+from bot.utils.metrics import (
+    DEFAULT_METRICS_HOST, InstrumentedPool, InstrumentedRedis, MetricsServer, telegram_api_metrics
+)
 
 # Импорты handlers
 from bot.handlers import client_handlers, admin_handlers, master_handlers
@@ -22,6 +40,219 @@ from bot.handlers import client_handlers, admin_handlers, master_handlers
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Настройки webhook по умолчанию: сервер слушает локальный порт за reverse proxy
+DEFAULT_WEBHOOK_PATH = "/webhook"
+DEFAULT_WEBHOOK_HOST = "127.0.0.1"
+DEFAULT_WEBHOOK_PORT = 8080
+
+async def on_startup(
+    dispatcher: Dispatcher,
+    catalog,
+    notifier,
+    master_caches,
+    reminders=None,
+    outbox=None,
+    metrics_server=None
+):
+    """Запуск фоновых сервисов вместе с диспетчером"""
+    
+    if metrics_server is not None:
+        await metrics_server.start()
+    await notifier.start()
+    if reminders is not None:
+        reminders.start()
+    if outbox is not None:
+        outbox.start()
+    dispatcher["catalog_listener"] = asyncio.create_task(catalog.listen_invalidations())
+    dispatcher["master_caches_listener"] = asyncio.create_task(master_caches.listen())
+
+async def on_shutdown(dispatcher: Dispatcher, notifier, reminders=None, outbox=None, metrics_server=None):
+    """Остановка фоновых сервисов"""
+    
+    dispatcher["catalog_listener"].cancel()
+    dispatcher["master_caches_listener"].cancel()
+    if reminders is not None:
+        reminders.shutdown()
+    # Outbox останавливается до уведомлений: события, которые он не успел
+    # отметить обработанными, вернутся в очередь после аренды
+    if outbox is not None:
+        await outbox.stop()
+    await notifier.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+
+async def create_bot(config, enable_reminders: bool = True, worker_index: int = 0):
+    """Создать бота и диспетчер со всеми сервисами.
+    
+    Используется и обычным запуском, и воркерами супервизора (bot/supervisor.py).
+    """
+    
+    # Инициализация базы данных
+    logger.info("📀 Подключаемся к базе данных...")
+    db = Database()
+    await db.connect(config)
+    # Ожидание соединения и заполненность пулов попадают в метрики,
+    # время запросов и планы медленных - в трассировщик (/slow_queries).
+    # Планы снимаются на реплике, если она есть: EXPLAIN ANALYZE повторно
+    # выполняет запрос, а изменяющие запросы там все равно не выполняются
+    explain_rate = getattr(config, "SLOW_QUERY_EXPLAIN_RATE", None)
+    query_tracer = QueryTracer(
+        db.read_pool(),
+        slow_threshold=float(getattr(config, "SLOW_QUERY_MS", None) or DEFAULT_SLOW_QUERY_MS) / 1000,
+        explain_sample_rate=DEFAULT_EXPLAIN_SAMPLE_RATE if explain_rate is None else float(explain_rate)
+    )
+    db.pool = InstrumentedPool(db.pool, tracer=query_tracer)
+    if db.replica_pool is not None:
+        db.replica_pool = InstrumentedPool(db.replica_pool, tracer=query_tracer, name="replica")
+    
+    # Настройка хранилища состояний
+    logger.info("⚙️  Настраиваем хранилище...")
+    
+    # Пробуем Redis, если не работает - MemoryStorage
+    storage = None
+    try:
+        # Обращения к FSM за апдейт склеиваются в одно чтение и одну запись
+        storage = CoalescingRedisStorage(RedisStorage(redis=InstrumentedRedis.from_url(config.REDIS_URL)))
+        logger.info("🔴 Используем Redis для хранения состояний")
+    except Exception as e:
+        logger.warning(f"⚠️  Redis недоступен, используем память: {e}")
+        storage = MemoryStorage()
+        logger.info("💾 Используем MemoryStorage (данные будут храниться в памяти)")
+    
+    # TELEGRAM_API_URL - свой сервер Bot API (локальный telegram-bot-api
+    # или заглушка нагрузочного теста benchmarks/booking_flow.py)
+    session = None
+    api_url = getattr(config, "TELEGRAM_API_URL", None)
+    if api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(api_url))
+    
+    # Создаем бота с настройками по умолчанию (правильный способ для aiogram 3.23.0)
+    bot = Bot(
+        token=config.BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode="HTML")
+    )
+    bot.session.middleware(telegram_api_metrics)
+    dp = Dispatcher(storage=storage)
+    
+    # Общий CRUD - для фоновых сервисов и middleware. Обработчики сообщений
+    # и кнопок получают в аргументе crud свой CRUD апдейта (CRUDMiddleware)
+    crud = CRUD(db)
+    dp["crud"] = crud
+    dp["query_tracer"] = query_tracer
+    
+    # Кэш каталога мастеров и услуг, общий для всех обработчиков.
+    # С Redis снимок каталога и его сброс разделяются между процессами
+    redis = storage.redis if isinstance(storage, CoalescingRedisStorage) else None
+    dp["catalog"] = Catalog(crud, redis=redis)
+    
+    # Уведомления отправляются фоновыми воркерами из очереди
+    notifier = NotificationDispatcher(bot)
+    dp["notifier"] = notifier
+    
+    # Кэши мастера (календарь, панель) сбрасываются во всех процессах
+    master_caches = MasterCacheSync(redis)
+    dp["master_caches"] = master_caches
+    
+    # Напоминания и события outbox достаточно обрабатывать в одном процессе
+    if enable_reminders:
+        dp["reminders"] = ReminderScheduler(crud, notifier)
+        dp["outbox"] = OutboxConsumer(crud, notifier, master_caches)
+    
+    # Метрики Prometheus: METRICS_PORT включает эндпоинт /metrics.
+    # Воркеры супервизора слушают METRICS_PORT + номер воркера
+    metrics_port = getattr(config, "METRICS_PORT", None)
+    if metrics_port:
+        host = getattr(config, "METRICS_HOST", None) or DEFAULT_METRICS_HOST
+        dp["metrics_server"] = MetricsServer(host, int(metrics_port) + worker_index)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    
+    # Буфер FSM должен открываться до FSMContextMiddleware,
+    # поэтому переставляем его в конец цепочки outer-middleware
+    if isinstance(storage, CoalescingRedisStorage):
+        dp.update.outer_middleware.unregister(dp.fsm)
+        dp.update.outer_middleware(FSMBufferMiddleware(storage))
+        dp.update.outer_middleware(dp.fsm)
+    
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    
+    # Одно соединение на апдейт: берется при первом запросе (в том числе
+    # при определении роли) и возвращается в пул после обработки апдейта.
+    # Регистрируется до RoleMiddleware, чтобы та читала роль через него
+    crud_middleware = CRUDMiddleware(db)
+    dp.message.outer_middleware(crud_middleware)
+    dp.callback_query.outer_middleware(crud_middleware)
+    
+    # Роль пользователя определяется один раз на апдейт, до фильтров роутеров
+    role_middleware = RoleMiddleware(crud, config.ADMIN_IDS)
+    dp.message.outer_middleware(role_middleware)
+    dp.callback_query.outer_middleware(role_middleware)
+    
+    # Подключаем роутеры (обработчики)
+    dp.include_router(client_handlers.router)
+    dp.include_router(admin_handlers.router)
+    dp.include_router(master_handlers.router)
+    
+    # Все нажатия кнопок разбираются одной таблицей действий
+    dp.include_router(callbacks.router)
+    
+    return bot, dp
+
+async def run_polling(bot: Bot, dp: Dispatcher):
+    """Получение апдейтов через long polling"""
+    
+    # Снимаем вебхук, но не выбрасываем накопившиеся апдейты
+    await bot.delete_webhook(drop_pending_updates=False)
+    logger.info("🔁 Режим long polling")
+    await dp.start_polling(bot)
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config):
+    """Получение апдейтов через webhook на aiohttp.
+    
+    Telegram хранит апдейты, пока webhook недоступен, поэтому рестарт
+    ничего не теряет. Запрос подтверждается сразу, а обработчик
+    выполняется в фоне (handle_in_background).
+    """
+    
+    webhook_path = getattr(config, "WEBHOOK_PATH", None) or DEFAULT_WEBHOOK_PATH
+    webhook_secret = getattr(config, "WEBHOOK_SECRET", None)
+    host = getattr(config, "WEBHOOK_HOST", None) or DEFAULT_WEBHOOK_HOST
+    port = int(getattr(config, "WEBHOOK_PORT", None) or DEFAULT_WEBHOOK_PORT)
+    
+    if not webhook_secret:
+        logger.warning("⚠️  WEBHOOK_SECRET не задан: запросы к webhook не проверяются")
+    
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=webhook_secret,
+        handle_in_background=True
+    ).register(app, path=webhook_path)
+    setup_application(app, dp, bot=bot)
+    
+    await bot.set_webhook(
+        url=config.WEBHOOK_URL.rstrip("/") + webhook_path,
+        secret_token=webhook_secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False
+    )
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logger.info(f"🌐 Режим webhook: {host}:{port}{webhook_path}")
+    
+    try:
+        # Сервер работает, пока процесс не остановят
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
 async def main():
     """Главная функция запуска бота"""
     
@@ -34,35 +265,7 @@ async def main():
     logger.info("🚀 Запускаем бота студии красоты...")
     
     try:
-        # Инициализация базы данных
-        logger.info("📀 Подключаемся к базе данных...")
-        db = Database()
-        await db.connect(config)
-        
-        # Настройка хранилища состояний
-        logger.info("⚙️  Настраиваем хранилище...")
-        
-        # Пробуем Redis, если не работает - MemoryStorage
-        storage = None
-        try:
-            storage = RedisStorage.from_url(config.REDIS_URL)
-            logger.info("🔴 Используем Redis для хранения состояний")
-        except Exception as e:
-            logger.warning(f"⚠️  Redis недоступен, используем память: {e}")
-            storage = MemoryStorage()
-            logger.info("💾 Используем MemoryStorage (данные будут храниться в памяти)")
-        
-        # Создаем бота с настройками по умолчанию (правильный способ для aiogram 3.23.0)
-        bot = Bot(
-            token=config.BOT_TOKEN,
-            default=DefaultBotProperties(parse_mode="HTML")
-        )
-        dp = Dispatcher(storage=storage)
-        
-        # Подключаем роутеры (обработчики)
-        dp.include_router(client_handlers.router)
-        dp.include_router(admin_handlers.router)
-        dp.include_router(master_handlers.router)
+        bot, dp = await create_bot(config)
         
         logger.info("✅ Бот успешно инициализирован!")
         logger.info("📊 Проверяем подключения...")
@@ -71,18 +274,19 @@ async def main():
         bot_info = await bot.get_me()
         logger.info(f"🤖 Бот: @{bot_info.username} ({bot_info.full_name})")
         
-        # Удаляем вебхук если был (для чистого запуска)
-        await bot.delete_webhook(drop_pending_updates=True)
-        
         logger.info("🎯 Бот готов к работе! Ожидаем сообщения...")
         logger.info("👉 Команды для тестирования:")
         logger.info("   • /start - для клиентов")
         logger.info("   • /master - для мастеров (нужен telegram_id в таблице masters)")
         logger.info("   • /admin - для администраторов (ID в ADMIN_IDS)")
         
-        # Запускаем бота
-        await dp.start_polling(bot)
-        
+        # Запускаем бота. Фоновые сервисы стартуют через dp.startup
+        # WEBHOOK_URL в конфиге включает режим webhook вместо polling
+        if getattr(config, "WEBHOOK_URL", None):
+            await run_webhook(bot, dp, config)
+        else:
+            await run_polling(bot, dp)
+    
     except Exception as e:
         logger.error(f"❌ Критическая ошибка при запуске бота: {e}", exc_info=True)
         logger.info("🔄 Перезапустите бота после исправления ошибки")
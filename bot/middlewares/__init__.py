@@ -0,0 +1,7 @@
+# bot/middlewares/__init__.py
+from .auth import RoleMiddleware
+from .db import CRUDMiddleware
+from .fsm import FSMBufferMiddleware
+from .metrics import UpdateMetricsMiddleware, HandlerMetricsMiddleware
+
+__all__ = ['RoleMiddleware', 'CRUDMiddleware', 'FSMBufferMiddleware', 'UpdateMetricsMiddleware', 'HandlerMetricsMiddleware']
\ No newline at end of file
@@ -0,0 +1,96 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from bot.utils.cache import LRUCache
+from bot.utils.callbacks import CallbackDataError, unpack
+
+logger = logging.getLogger(__name__)
+
+ROLE_CLIENT = 'client'
+ROLE_MASTER = 'master'
+ROLE_ADMIN = 'admin'
+
+# Роль пользователя меняется редко: кэшируем на несколько минут
+ROLE_CACHE_SIZE = 10000
+ROLE_CACHE_TTL = 300
+
+
+class RoleMiddleware(BaseMiddleware):
+    """Определяет роль пользователя (клиент/мастер/админ) один раз на апдейт.
+
+    Результат кэшируется в LRU с TTL и передается в обработчики как
+    role и master. Регистрируется как outer-middleware, поэтому чужие
+    кнопки отсекаются еще до проверки фильтров роутеров.
+    """
+
+    def __init__(
+        self,
+        crud,
+        admin_ids: Iterable[int],
+        maxsize: int = ROLE_CACHE_SIZE,
+        ttl: float = ROLE_CACHE_TTL
+    ):
+        self.crud = crud
+        self.admin_ids = set(admin_ids)
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    async def resolve(self, user_id: int, crud=None):
+        """Получить (роль, запись мастера или None) для пользователя.
+
+        crud - CRUD апдейта (CRUDMiddleware), чтобы не занимать второе
+        соединение; без него используется общий.
+        """
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        master = await (crud or self.crud).get_master_by_telegram_id(user_id)
+        if user_id in self.admin_ids:
+            role = ROLE_ADMIN
+        elif master is not None:
+            role = ROLE_MASTER
+        else:
+            role = ROLE_CLIENT
+
+        result = (role, master)
+        self.cache.set(user_id, result)
+        return result
+
+    def invalidate(self, user_id: int):
+        """Сбросить роль пользователя (например, после добавления мастера)"""
+        self.cache.delete(user_id)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        role, master = await self.resolve(user.id, data.get("crud"))
+        data["role"] = role
+        data["master"] = master
+
+        if isinstance(event, CallbackQuery) and event.data:
+            # Права на кнопку объявлены в самом действии (bot/utils/callbacks.py)
+            try:
+                action, _ = unpack(event.data)
+            except CallbackDataError:
+                # Устаревшую кнопку отклонит CallbackDispatcher
+                return await handler(event, data)
+            if action.admin_only and role != ROLE_ADMIN:
+                logger.warning(f"⛔ Пользователь {user.id} нажал админскую кнопку {event.data}")
+                await event.answer("⛔ Нет доступа")
+                return None
+            if action.master_only and master is None:
+                logger.warning(f"⛔ Пользователь {user.id} нажал кнопку мастера {event.data}")
+                await event.answer("❌ Вы не являетесь мастером")
+                return None
+
+        return await handler(event, data)
@@ -0,0 +1,32 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from database.crud import UpdateCRUD
+
+
+class CRUDMiddleware(BaseMiddleware):
+    """Передает в обработчик crud - CRUD апдейта с одним ленивым соединением.
+
+    Регистрируется как outer-middleware перед RoleMiddleware, чтобы роль
+    при промахе кэша читалась тем же соединением. Соединение берется
+    лениво, поэтому апдейт без запросов к БД пул не трогает, и
+    возвращается сразу после обработки апдейта.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        crud = UpdateCRUD(self.db)
+        data["crud"] = crud
+        try:
+            return await handler(event, data)
+        finally:
+            await crud.release()
@@ -0,0 +1,27 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.utils.fsm_storage import CoalescingRedisStorage
+
+
+class FSMBufferMiddleware(BaseMiddleware):
+    """Открывает буфер FSM на время обработки апдейта.
+
+    Регистрируется на dp.update раньше FSMContextMiddleware, чтобы и
+    чтение raw_state попало в буфер: одна пачка чтений в начале апдейта
+    и одна транзакция записи в конце.
+    """
+
+    def __init__(self, storage: CoalescingRedisStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        async with self.storage.buffered():
+            return await handler(event, data)
@@ -0,0 +1,64 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from bot.utils.callbacks import callbacks
+from bot.utils.metrics import HANDLER_DURATION, HANDLER_ERRORS, UPDATE_DURATION, UPDATES_IN_FLIGHT
+from bot.utils.query_tracer import current_handler
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Апдейты в обработке и полное время апдейта (outer-middleware на dp.update)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type or "unknown"
+        # Запросы middleware (роль пользователя и т.п.) относятся к типу апдейта
+        token = current_handler.set(f"update.{update_type}")
+        UPDATES_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started, update_type)
+            UPDATES_IN_FLIGHT.dec()
+            current_handler.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время работы обработчика (inner-middleware: вызывается только для
+    обработчика, чьи фильтры прошли, поэтому известно его имя).
+
+    Нажатия кнопок обслуживает один CallbackDispatcher.dispatch, поэтому
+    для них подставляется обработчик действия из таблицы callbacks.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        callback = data["handler"].callback
+        if isinstance(event, CallbackQuery) and callback == callbacks.dispatch:
+            callback = callbacks.resolve(event.data) or callback
+        module = callback.__module__.rsplit(".", 1)[-1]
+        name = callback.__name__
+
+        # По этой метке трассировщик запросов относит запросы к обработчику
+        token = current_handler.set(f"{module}.{name}")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(module, name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, module, name)
+            current_handler.reset(token)
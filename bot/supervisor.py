@@ -0,0 +1,415 @@
+import sys
+import os
+
+# Добавляем корневую папку проекта в путь Python
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Порт, на котором супервизор отдает статистику воркеров
+DEFAULT_STATS_PORT = 8081
+
+# Как часто писать статистику воркеров в лог (секунды)
+STATS_LOG_INTERVAL = 60
+
+# Таймаут long polling запроса getUpdates
+POLLING_TIMEOUT = 30
+
+# Как часто забирать подтверждения воркеров и проверять, живы ли они
+WORKER_CHECK_INTERVAL = 0.5
+
+# Воркер, упавший при старте (например, БД недоступна), перезапускается
+# не чаще этого интервала (секунды)
+WORKER_RESTART_DELAY = 5
+
+# Апдейт, во время обработки которого воркер падал столько раз,
+# больше не переотправляется
+MAX_UPDATE_CRASHES = 3
+
+# Счетчики воркера в общей памяти: обработано, в работе, ошибки
+STAT_PROCESSED = 0
+STAT_IN_FLIGHT = 1
+STAT_ERRORS = 2
+STATS_PER_WORKER = 3
+
+# Разделы апдейта, в которых есть отправитель
+USER_UPDATE_FIELDS = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "shipping_query", "pre_checkout_query",
+    "my_chat_member", "chat_member", "chat_join_request", "poll_answer",
+    "message_reaction"
+)
+
+
+def update_user_id(update: Dict[str, Any]) -> int:
+    """Найти id пользователя в сыром апдейте (0, если апдейт не от пользователя)"""
+    for field in USER_UPDATE_FIELDS:
+        payload = update.get(field)
+        if not payload:
+            continue
+        sender = payload.get("from") or payload.get("user")
+        if sender:
+            return sender["id"]
+        chat = payload.get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+def shard_for(user_id: int, workers: int) -> int:
+    """Номер воркера для пользователя: все апдейты одного пользователя идут в один воркер"""
+    return user_id % workers
+
+
+class WorkerStats:
+    """Счетчики воркеров в разделяемой памяти (без блокировок: каждый
+    счетчик пишет только свой воркер, супервизор только читает)"""
+
+    def __init__(self, context, workers: int):
+        self.workers = workers
+        self.counters = context.Array('q', workers * STATS_PER_WORKER, lock=False)
+
+    def add(self, worker: int, stat: int, value: int = 1):
+        self.counters[worker * STATS_PER_WORKER + stat] += value
+
+    def get(self, worker: int, stat: int) -> int:
+        return self.counters[worker * STATS_PER_WORKER + stat]
+
+    def reset(self, worker: int, stat: int):
+        self.counters[worker * STATS_PER_WORKER + stat] = 0
+
+
+async def run_worker_loop(
+    index: int,
+    updates: multiprocessing.Queue,
+    acks,
+    stats: WorkerStats
+):
+    """Цикл воркера: апдейты одного пользователя обрабатываются по порядку,
+    апдейты разных пользователей - конкурентно. О начале и конце обработки
+    апдейта воркер сообщает супервизору через acks"""
+
+    from bot.main import create_bot
+
+    config = Config()
+    # Напоминания планирует только первый воркер
+    bot, dp = await create_bot(config, enable_reminders=(index == 0), worker_index=index)
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    logger.info(f"👷 Воркер {index} готов (pid {os.getpid()})")
+
+    # Последняя задача каждого пользователя: новая ждет предыдущую
+    tails: Dict[int, asyncio.Task] = {}
+    loop = asyncio.get_running_loop()
+
+    async def process(user_id: int, update: Dict[str, Any], previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        acks.put((update["update_id"], False))
+        stats.add(index, STAT_IN_FLIGHT)
+        try:
+            await dp.feed_raw_update(bot, update)
+            stats.add(index, STAT_PROCESSED)
+        except Exception as e:
+            stats.add(index, STAT_ERRORS)
+            logger.error(f"❌ Воркер {index}: ошибка обработки апдейта: {e}", exc_info=True)
+        finally:
+            stats.add(index, STAT_IN_FLIGHT, -1)
+            acks.put((update["update_id"], True))
+            if tails.get(user_id) is asyncio.current_task():
+                del tails[user_id]
+
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, updates.get)
+            if raw is None:
+                break
+            update = json.loads(raw)
+            user_id = update_user_id(update)
+            tails[user_id] = asyncio.create_task(process(user_id, update, tails.get(user_id)))
+
+        # Дожидаемся уже принятых апдейтов
+        if tails:
+            await asyncio.wait(list(tails.values()))
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await bot.session.close()
+
+
+def worker_main(index: int, updates: multiprocessing.Queue, acks, stats: WorkerStats):
+    """Точка входа процесса-воркера"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker-{index} - %(levelname)s - %(message)s'
+    )
+    try:
+        asyncio.run(run_worker_loop(index, updates, acks, stats))
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """Запускает N процессов-воркеров и раздает им апдейты по id пользователя.
+
+    Апдейты получает только супервизор (long polling), воркеры разделяют
+    Redis-хранилище FSM и базу данных. Статистика по воркерам доступна
+    в формате JSON на /workers.
+
+    Telegram считает апдейт полученным, как только следующий getUpdates
+    сдвинул offset, поэтому до подтверждения воркером апдейт хранится
+    в памяти супервизора. Упавший воркер перезапускается, и ему заново
+    отправляются неподтвержденные апдейты: доставка "хотя бы один раз",
+    апдейт, обработанный прямо перед падением, может прийти повторно.
+    Теряются только неподтвержденные апдейты, если упал сам супервизор.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.stats = WorkerStats(self.context, workers)
+        self.queues: List[multiprocessing.Queue] = []
+        self.acks = []
+        self.processes = []
+        # Отправленные, но еще не обработанные апдейты воркера:
+        # update_id -> [сырой апдейт, падений на нем, обработка начата]
+        self.pending: List[Dict[int, list]] = [{} for _ in range(workers)]
+        self.restarts = [0] * workers
+        self.worker_started_at = [0.0] * workers
+        self.started_at = time.monotonic()
+
+    def start_workers(self):
+        for index in range(self.workers):
+            self.queues.append(None)
+            self.acks.append(None)
+            self.processes.append(None)
+            self.start_worker(index)
+        logger.info(f"🚀 Запущено воркеров: {self.workers}")
+
+    def start_worker(self, index: int):
+        # Очереди создаются заново: упавший процесс мог оставить их
+        # с захваченной блокировкой. Подтверждения пишутся в SimpleQueue
+        # синхронно, без фонового потока, и не теряются при падении
+        updates = self.context.Queue()
+        acks = self.context.SimpleQueue()
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, updates, acks, self.stats),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.queues[index] = updates
+        self.acks[index] = acks
+        self.processes[index] = process
+        self.worker_started_at[index] = time.monotonic()
+
+    def restart_worker(self, index: int):
+        """Перезапустить упавший воркер и переотправить ему неподтвержденное"""
+        process = self.processes[index]
+        self.collect_acks(index)
+        self.restarts[index] += 1
+        self.stats.reset(index, STAT_IN_FLIGHT)
+        self.start_worker(index)
+
+        pending = self.pending[index]
+        dropped = []
+        for update_id, entry in list(pending.items()):
+            if entry[2]:
+                entry[1] += 1
+                entry[2] = False
+            if entry[1] >= MAX_UPDATE_CRASHES:
+                dropped.append(update_id)
+                del pending[update_id]
+        for entry in pending.values():
+            self.queues[index].put(entry[0])
+
+        logger.error(
+            f"💥 Воркер {index} (pid {process.pid}) завершился с кодом {process.exitcode}, "
+            f"перезапущен; переотправлено апдейтов: {len(pending)}"
+        )
+        if dropped:
+            logger.error(
+                f"❌ Воркер {index}: апдейты {dropped} выброшены, воркер падал "
+                f"на них {MAX_UPDATE_CRASHES} раза"
+            )
+
+    def collect_acks(self, index: int):
+        """Учесть начатые и снять с учета обработанные воркером апдейты"""
+        pending = self.pending[index]
+        acks = self.acks[index]
+        try:
+            while not acks.empty():
+                update_id, done = acks.get()
+                if done:
+                    pending.pop(update_id, None)
+                elif update_id in pending:
+                    pending[update_id][2] = True
+        except (EOFError, OSError):
+            # Процесс упал посреди записи: недочитанное переотправится
+            return
+
+    async def watch_workers(self):
+        """Забирать подтверждения и перезапускать упавшие воркеры"""
+        while True:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            for index, process in enumerate(self.processes):
+                self.collect_acks(index)
+                if process.is_alive():
+                    continue
+                if time.monotonic() - self.worker_started_at[index] >= WORKER_RESTART_DELAY:
+                    self.restart_worker(index)
+
+    def stop_workers(self, timeout: float = 30):
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def dispatch(self, update: Dict[str, Any]):
+        """Запомнить апдейт за воркером, закрепленным за пользователем.
+
+        Возвращает очередь воркера и сырой апдейт: put выполняется отдельно,
+        вне цикла событий.
+        """
+        shard = shard_for(update_user_id(update), self.workers)
+        raw = json.dumps(update)
+        self.pending[shard][update["update_id"]] = [raw, 0, False]
+        return self.queues[shard], raw
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Текущая статистика по воркерам"""
+        uptime = max(time.monotonic() - self.started_at, 1e-9)
+        result = []
+        for index, process in enumerate(self.processes):
+            processed = self.stats.get(index, STAT_PROCESSED)
+            try:
+                depth = self.queues[index].qsize()
+            except NotImplementedError:
+                depth = -1
+            result.append({
+                "worker": index,
+                "pid": process.pid,
+                "alive": process.is_alive(),
+                "restarts": self.restarts[index],
+                "unacked": len(self.pending[index]),
+                "processed": processed,
+                "errors": self.stats.get(index, STAT_ERRORS),
+                "in_flight": self.stats.get(index, STAT_IN_FLIGHT),
+                "queue_depth": depth,
+                "updates_per_sec": round(processed / uptime, 2)
+            })
+        return result
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"workers": self.snapshot()})
+
+    async def log_stats(self):
+        while True:
+            await asyncio.sleep(STATS_LOG_INTERVAL)
+            for item in self.snapshot():
+                logger.info(
+                    f"📊 Воркер {item['worker']}: обработано {item['processed']}, "
+                    f"в очереди {item['queue_depth']}, в работе {item['in_flight']}, "
+                    f"ошибок {item['errors']}"
+                )
+
+    async def poll_updates(self, bot: Bot):
+        """Получать апдейты и раздавать их воркерам.
+
+        Сырые апдейты не разбираются в модели: супервизору нужен только
+        id пользователя, остальное делает воркер.
+        """
+        await bot.delete_webhook(drop_pending_updates=False)
+        offset = None
+        loop = asyncio.get_running_loop()
+        session = bot.session
+        while True:
+            try:
+                params = {"timeout": POLLING_TIMEOUT}
+                if offset is not None:
+                    params["offset"] = offset
+                url = session.api.api_url(token=bot.token, method="getUpdates")
+                http = await session.create_session()
+                async with http.post(url, json=params, timeout=POLLING_TIMEOUT + 10) as response:
+                    payload = await response.json()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️  Ошибка getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if not payload.get("ok"):
+                retry_after = payload.get("parameters", {}).get("retry_after", 1)
+                logger.warning(f"⚠️  getUpdates: {payload.get('description')}")
+                await asyncio.sleep(retry_after)
+                continue
+
+            for update in payload["result"]:
+                # put в multiprocessing.Queue может блокироваться на больших апдейтах.
+                # Если воркер упадет раньше, апдейт переотправит restart_worker
+                updates, raw = self.dispatch(update)
+                await loop.run_in_executor(None, updates.put, raw)
+                offset = update["update_id"] + 1
+
+    async def run(self, config, stats_port: int):
+        self.start_workers()
+
+        app = web.Application()
+        app.router.add_get("/workers", self.handle_stats)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host="127.0.0.1", port=stats_port).start()
+        logger.info(f"📊 Статистика воркеров: http://127.0.0.1:{stats_port}/workers")
+
+        bot = Bot(token=config.BOT_TOKEN)
+        stats_task = asyncio.create_task(self.log_stats())
+        watch_task = asyncio.create_task(self.watch_workers())
+        try:
+            await self.poll_updates(bot)
+        finally:
+            stats_task.cancel()
+            watch_task.cancel()
+            await bot.session.close()
+            await runner.cleanup()
+            self.stop_workers()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запуск бота в нескольких процессах")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="число процессов-воркеров (по умолчанию - число ядер)")
+    parser.add_argument("--stats-port", type=int, default=DEFAULT_STATS_PORT,
+                        help="порт HTTP-статистики воркеров")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    config = Config()
+    if not config.BOT_TOKEN:
+        logger.error("❌ Ошибка: BOT_TOKEN не найден в .env файле")
+        return
+
+    supervisor = Supervisor(args.workers)
+    try:
+        asyncio.run(supervisor.run(config, args.stats_port))
+    except KeyboardInterrupt:
+        logger.info("🛑 Остановка супервизора")
+
+
+if __name__ == "__main__":
+    main()
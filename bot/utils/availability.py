@@ -0,0 +1,175 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bot.utils.cache import TTLCache
+
+# Шаг сетки, по которой клиенту предлагается время начала визита
+SLOT_STEP_MINUTES = 30
+
+# Кэш свободных дней месяца: ключ (мастер, услуга, год, месяц), группа - мастер
+CALENDAR_CACHE_TTL = 300
+# Около 4 тыс. пар мастер/услуга с месяцем, который сейчас смотрят
+CALENDAR_CACHE_MAXSIZE = 4096
+calendar_cache = TTLCache(ttl=CALENDAR_CACHE_TTL, maxsize=CALENDAR_CACHE_MAXSIZE)
+
+# Все вычисления идут в целых минутах от фиксированной точки отсчета:
+# это в разы быстрее арифметики над datetime
+_EPOCH = datetime(2000, 1, 1)
+
+Interval = Tuple[datetime, datetime]
+
+
+def _to_minutes(moment: datetime) -> int:
+    delta = moment - _EPOCH
+    return delta.days * 1440 + delta.seconds // 60
+
+
+def _from_minutes(minutes: int) -> datetime:
+    return _EPOCH + timedelta(minutes=minutes)
+
+
+def _merge_busy(busy: Iterable[Interval]) -> Tuple[List[int], List[int]]:
+    """Слить отсортированные по началу занятые интервалы в непересекающиеся.
+
+    После слияния массивы начал и концов оба отсортированы,
+    что позволяет искать по ним бинарным поиском.
+    """
+    starts: List[int] = []
+    ends: List[int] = []
+    for start, end in busy:
+        s, e = _to_minutes(start), _to_minutes(end)
+        if ends and s <= ends[-1]:
+            if e > ends[-1]:
+                ends[-1] = e
+        else:
+            starts.append(s)
+            ends.append(e)
+    return starts, ends
+
+
+def _free_starts(
+    work_start: int,
+    work_end: int,
+    starts: List[int],
+    ends: List[int],
+    duration: int,
+    step: int,
+    not_before: int
+) -> List[int]:
+    """Свободные начала визитов внутри рабочего интервала (в минутах)"""
+    result: List[int] = []
+    t = work_start
+    if not_before > t:
+        # Выравниваем на сетку от начала рабочего дня
+        t += -(-(not_before - t) // step) * step
+
+    last_start = work_end - duration
+    count = len(ends)
+    # Первый занятый интервал, который заканчивается позже t
+    i = bisect_right(ends, t)
+
+    while t <= last_start:
+        if i < count and starts[i] < t + duration:
+            # Слот пересекается с занятым интервалом: прыгаем сразу за него
+            t += -(-(ends[i] - t) // step) * step
+            i = bisect_right(ends, t, i)
+            continue
+        result.append(t)
+        t += step
+        while i < count and ends[i] <= t:
+            i += 1
+    return result
+
+
+def free_slots(
+    work_start: datetime,
+    work_end: datetime,
+    busy: Sequence[Interval],
+    duration_minutes: int,
+    step_minutes: int = SLOT_STEP_MINUTES,
+    not_before: Optional[datetime] = None
+) -> List[datetime]:
+    """Доступные времена начала визита в рамках одного рабочего интервала.
+
+    busy - занятые интервалы (записи мастера), отсортированные по началу.
+    """
+    starts, ends = _merge_busy(busy)
+    limit = _to_minutes(not_before) if not_before else 0
+    return [
+        _from_minutes(m) for m in _free_starts(
+            _to_minutes(work_start), _to_minutes(work_end),
+            starts, ends, duration_minutes, step_minutes, limit
+        )
+    ]
+
+
+def free_slots_by_day(
+    schedule: Sequence[Interval],
+    busy: Sequence[Interval],
+    duration_minutes: int,
+    step_minutes: int = SLOT_STEP_MINUTES,
+    not_before: Optional[datetime] = None
+) -> Dict[date, List[time]]:
+    """Пакетный расчет свободного времени сразу на несколько дней.
+
+    schedule - рабочие интервалы мастера, busy - его записи за тот же период;
+    оба списка отсортированы по началу. Записи сливаются один раз, а для
+    каждого дня нужный участок находится бинарным поиском.
+    """
+    starts, ends = _merge_busy(busy)
+    limit = _to_minutes(not_before) if not_before else 0
+    result: Dict[date, List[time]] = {}
+
+    for work_start, work_end in schedule:
+        day_start = _to_minutes(work_start)
+        day_end = _to_minutes(work_end)
+        # Только записи, пересекающиеся с рабочим интервалом
+        lo = bisect_right(ends, day_start)
+        hi = bisect_left(starts, day_end, lo)
+        slots = _free_starts(
+            day_start, day_end, starts[lo:hi], ends[lo:hi],
+            duration_minutes, step_minutes, limit
+        )
+        day_slots = result.setdefault(work_start.date(), [])
+        day_slots.extend(_from_minutes(m).time() for m in slots)
+
+    return result
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """Первый и последний день месяца"""
+    first = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return first, next_month - timedelta(days=1)
+
+
+async def get_month_free_days(
+    crud,
+    master_id: int,
+    service_id,
+    duration_minutes: int,
+    year: int,
+    month: int
+) -> Dict[date, int]:
+    """Свободная емкость по дням месяца: {дата: число свободных слотов}.
+
+    Считается одним запросом к БД и кэшируется по (мастер, услуга, месяц).
+    В результат попадают только дни, на которые реально можно записаться.
+    """
+    key = (master_id, str(service_id), year, month)
+    free_days = calendar_cache.get(key)
+    if free_days is None:
+        date_from, date_to = month_bounds(year, month)
+        free_days = await crud.get_month_free_capacity(
+            master_id, duration_minutes, date_from, date_to, SLOT_STEP_MINUTES
+        )
+        calendar_cache.set(key, free_days, group=master_id)
+    # Прошедшие дни не показываем, даже если значение взято из кэша
+    today = date.today()
+    return {day: count for day, count in free_days.items() if day >= today}
+
+
+def invalidate_master_calendar(master_id: int):
+    """Сбросить кэш календаря мастера после создания или отмены записи"""
+    calendar_cache.invalidate_group(master_id)
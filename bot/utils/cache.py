@@ -0,0 +1,115 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+# Предел записей в TTLCache по умолчанию
+DEFAULT_TTL_CACHE_MAXSIZE = 1024
+
+
+class TTLCache:
+    """Простой кэш в памяти процесса с временем жизни записей.
+
+    Записи можно объединять в группы (например, по мастеру),
+    чтобы сбрасывать все связанные ключи одним вызовом.
+
+    Время жизни у всех записей одно, поэтому порядок записи совпадает с
+    порядком устаревания: set убирает устаревшие записи с начала, а при
+    переполнении вытесняет самую старую. Размер кэша не превышает maxsize.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = DEFAULT_TTL_CACHE_MAXSIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # ключ -> (когда устареет, значение, группа)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, Optional[Hashable]]]" = OrderedDict()
+        self._groups: Dict[Hashable, set] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получить значение, если оно еще не устарело"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value, _ = item
+        if expires_at < time.monotonic():
+            self.delete(key)
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, group: Optional[Hashable] = None):
+        """Сохранить значение (опционально - в группу)"""
+        now = time.monotonic()
+        self.delete(key)
+        self._purge(now)
+        while len(self._data) >= self.maxsize:
+            self.delete(next(iter(self._data)))
+        self._data[key] = (now + self.ttl, value, group)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+
+    def _purge(self, now: float):
+        while self._data:
+            key, (expires_at, _, _) = next(iter(self._data.items()))
+            if expires_at >= now:
+                return
+            self.delete(key)
+
+    def delete(self, key: Hashable):
+        """Удалить одно значение"""
+        item = self._data.pop(key, None)
+        if item is None or item[2] is None:
+            return
+        keys = self._groups.get(item[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[item[2]]
+
+    def invalidate_group(self, group: Hashable):
+        """Удалить все значения группы"""
+        for key in self._groups.pop(group, ()):
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Очистить кэш полностью"""
+        self._data.clear()
+        self._groups.clear()
+
+
+class LRUCache:
+    """Ограниченный по размеру LRU-кэш с временем жизни записей"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получить значение и отметить его как недавно использованное"""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Сохранить значение, вытеснив самое старое при переполнении"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Удалить одно значение"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Очистить кэш полностью"""
+        self._data.clear()
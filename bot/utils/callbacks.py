@@ -0,0 +1,186 @@
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+# Версия формата callback_data. Кнопки старых версий (в том числе
+# прежние "master_5", "confirm_12") не разбираются, а вежливо отклоняются
+CALLBACK_VERSION = "1"
+SEPARATOR = ":"
+
+# Telegram ограничивает callback_data 64 байтами
+MAX_CALLBACK_DATA_BYTES = 64
+
+# Кодирование аргументов: (в строку, из строки)
+FIELD_CODECS: Dict[type, Tuple[Callable[[Any], str], Callable[[str], Any]]] = {
+    int: (str, int),
+    date: (lambda value: value.strftime("%Y%m%d"), lambda raw: datetime.strptime(raw, "%Y%m%d").date()),
+    time: (lambda value: value.strftime("%H%M"), lambda raw: datetime.strptime(raw, "%H%M").time()),
+    datetime: (lambda value: value.strftime("%Y%m%d%H%M%S%f"), lambda raw: datetime.strptime(raw, "%Y%m%d%H%M%S%f")),
+    str: (str, str),
+}
+
+
+# Поля курсора страницы: направление и ключ (start_time, id) крайней строки
+PAGE_FIELDS = (("direction", str), ("start_time", datetime), ("appointment_id", int))
+
+
+class CallbackDataError(ValueError):
+    """callback_data не соответствует текущему формату"""
+
+
+# Все объявленные действия по коду: код - единственный ключ разбора,
+# поэтому пересечения префиксов вида master_/master_pending невозможны
+ACTIONS: Dict[str, "CallbackAction"] = {}
+
+
+@dataclass(frozen=True)
+class CallbackAction:
+    """Действие кнопки: короткий код и типизированные аргументы.
+
+    callback_data имеет вид "<версия>:<код>[:<аргумент>...]", например
+    "1:ms:5" для выбора мастера 5. Аргументы передаются в обработчик
+    по именам полей уже приведенными к своим типам.
+    """
+    code: str
+    fields: Tuple[Tuple[str, type], ...] = ()
+    admin_only: bool = False
+    master_only: bool = False
+
+    def __post_init__(self):
+        if SEPARATOR in self.code:
+            raise ValueError(f"Код действия не может содержать '{SEPARATOR}': {self.code}")
+        if self.code in ACTIONS:
+            raise ValueError(f"Код действия уже занят: {self.code}")
+        ACTIONS[self.code] = self
+
+    def pack(self, *values) -> str:
+        """Собрать callback_data для кнопки"""
+        if len(values) != len(self.fields):
+            raise ValueError(f"Действие {self.code} ожидает {len(self.fields)} аргументов")
+
+        parts = [CALLBACK_VERSION, self.code]
+        for (_, kind), value in zip(self.fields, values):
+            parts.append(FIELD_CODECS[kind][0](value))
+        data = SEPARATOR.join(parts)
+
+        if len(data.encode("utf-8")) > MAX_CALLBACK_DATA_BYTES:
+            raise ValueError(f"callback_data длиннее {MAX_CALLBACK_DATA_BYTES} байт: {data}")
+        return data
+
+
+def unpack(data: str) -> Tuple[CallbackAction, Dict[str, Any]]:
+    """Разобрать callback_data в (действие, аргументы по именам)"""
+    parts = (data or "").split(SEPARATOR)
+    if len(parts) < 2 or parts[0] != CALLBACK_VERSION:
+        raise CallbackDataError(f"Неизвестная версия callback_data: {data}")
+
+    action = ACTIONS.get(parts[1])
+    if action is None or len(parts) - 2 != len(action.fields):
+        raise CallbackDataError(f"Неизвестное действие: {data}")
+
+    try:
+        values = {
+            name: FIELD_CODECS[kind][1](raw)
+            for (name, kind), raw in zip(action.fields, parts[2:])
+        }
+    except ValueError as e:
+        raise CallbackDataError(f"Некорректные аргументы {data}: {e}") from e
+    return action, values
+
+
+class CallbackDispatcher:
+    """Маршрутизация нажатий кнопок по таблице действий.
+
+    Вместо цепочки фильтров F.data == ... / F.data.startswith(...) во всех
+    роутерах регистрируется один обработчик, который разбирает
+    callback_data и находит обработчик по коду действия одним обращением
+    к словарю. Обработчики получают те же аргументы, что и обычные
+    (crud, state, master, ...), плюс поля действия.
+    """
+
+    def __init__(self, name: str = "callbacks"):
+        self.router = Router(name=name)
+        self.router.callback_query.register(self.dispatch)
+        self.handlers: Dict[str, CallableObject] = {}
+
+    def __call__(self, action: CallbackAction):
+        """Декоратор: зарегистрировать обработчик действия"""
+        def decorator(handler):
+            if action.code in self.handlers:
+                raise ValueError(f"Обработчик действия {action.code} уже зарегистрирован")
+            self.handlers[action.code] = CallableObject(handler)
+            return handler
+        return decorator
+
+    def resolve(self, data: str) -> Optional[Callable]:
+        """Обработчик, которому достанется callback_data (None, если его нет)"""
+        try:
+            action, _ = unpack(data)
+        except CallbackDataError:
+            return None
+        handler = self.handlers.get(action.code)
+        return handler.callback if handler is not None else None
+
+    async def dispatch(self, callback: CallbackQuery, **data):
+        try:
+            action, values = unpack(callback.data)
+        except CallbackDataError:
+            logger.info(f"🔘 Устаревшая кнопка от {callback.from_user.id}: {callback.data}")
+            await callback.answer("⌛ Кнопка устарела, откройте меню заново: /start")
+            return
+
+        handler = self.handlers.get(action.code)
+        if handler is None:
+            # Раздел еще не реализован
+            await callback.answer("🚧 Раздел в разработке")
+            return
+
+        return await handler.call(callback, **data, **values)
+
+
+callbacks = CallbackDispatcher()
+
+# Клиент
+BOOK_APPOINTMENT = CallbackAction("bk")
+CHOOSE_MASTER = CallbackAction("ms", (("master_id", int),))
+CHOOSE_SERVICE = CallbackAction("sv", (("service_id", int),))
+CHOOSE_MONTH = CallbackAction("mo", (("year", int), ("month", int)))
+CHOOSE_DATE = CallbackAction("dt", (("day", date),))
+CHOOSE_TIME = CallbackAction("tm", (("slot", time),))
+BACK_TO_DATES = CallbackAction("bd")
+BACK_TO_TIMES = CallbackAction("bt")
+CONFIRM_BOOKING = CallbackAction("cb")
+MY_APPOINTMENTS = CallbackAction("my")
+CANCEL_APPOINTMENT = CallbackAction("ca", (("appointment_id", int),))
+MY_APPOINTMENTS_PAGE = CallbackAction("myp", PAGE_FIELDS)
+MAIN_MENU = CallbackAction("mm")
+ABOUT_STUDIO = CallbackAction("in")
+CONTACTS = CallbackAction("ct")
+CANCEL = CallbackAction("cn")
+YES = CallbackAction("y")
+NO = CallbackAction("n")
+
+# Мастер
+MASTER_APPOINTMENTS = CallbackAction("ma", master_only=True)
+MASTER_PENDING = CallbackAction("mp", master_only=True)
+MASTER_APPOINTMENTS_PAGE = CallbackAction("map", PAGE_FIELDS, master_only=True)
+MASTER_PENDING_PAGE = CallbackAction("mpp", PAGE_FIELDS, master_only=True)
+MASTER_SCHEDULE = CallbackAction("msc", master_only=True)
+MASTER_SETTINGS = CallbackAction("mst", master_only=True)
+BACK_TO_MASTER = CallbackAction("bm", master_only=True)
+CONFIRM_APPOINTMENT = CallbackAction("ac", (("appointment_id", int),), master_only=True)
+REJECT_APPOINTMENT = CallbackAction("ar", (("appointment_id", int),), master_only=True)
+
+# Администратор
+ADMIN_MASTERS = CallbackAction("am", admin_only=True)
+ADMIN_STATS = CallbackAction("as", admin_only=True)
+ADMIN_BOOKINGS = CallbackAction("ab", admin_only=True)
+ADMIN_FINANCE = CallbackAction("af", admin_only=True)
+ADMIN_CANCEL = CallbackAction("ax", admin_only=True)
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Каталог меняется несколько раз в неделю, а читается на каждом шаге записи
+CATALOG_TTL = 600
+
+# Ключ снимка каталога в Redis и канал оповещений об изменениях
+REDIS_CATALOG_KEY = "catalog:snapshot"
+REDIS_INVALIDATE_CHANNEL = "catalog:invalidate"
+
+
+def format_duration(minutes: int) -> str:
+    """Длительность услуги для отображения: 90 -> '1 ч 30 мин'"""
+    hours, rest = divmod(minutes, 60)
+    if hours and rest:
+        return f"{hours} ч {rest} мин"
+    if hours:
+        return f"{hours} ч"
+    return f"{rest} мин"
+
+
+class Catalog:
+    """Кэш каталога мастеров и услуг.
+
+    Первый уровень - снимок в памяти процесса с TTL, второй (необязательный) -
+    тот же снимок в Redis, общий для всех процессов бота. При изменении
+    каталога снимок удаляется из Redis, а остальные процессы получают
+    оповещение через pub/sub и сбрасывают свою копию.
+    """
+
+    def __init__(self, crud, redis=None, ttl: float = CATALOG_TTL):
+        self.crud = crud
+        self.redis = redis
+        self.ttl = ttl
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._expires_at = 0.0
+        # Растет при каждом сбросе: снимок, загрузка которого началась
+        # до сброса, не должен попасть в кэш
+        self._generation = 0
+        # Одна загрузка на процесс, даже если за каталогом пришли сразу многие
+        self._lock = asyncio.Lock()
+
+    async def _get_snapshot(self) -> Dict[str, Any]:
+        if self._snapshot is not None and self._expires_at > time.monotonic():
+            return self._snapshot
+
+        async with self._lock:
+            if self._snapshot is not None and self._expires_at > time.monotonic():
+                return self._snapshot
+
+            generation = self._generation
+            raw = await self._load_from_redis()
+            if raw is None:
+                raw = await self._load_from_db()
+                await self._store_in_redis(raw)
+
+            snapshot = self._build_snapshot(raw)
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._expires_at = time.monotonic() + self.ttl
+            return snapshot
+
+    async def _load_from_db(self) -> Dict[str, List[Dict[str, Any]]]:
+        masters, services = await self.crud.get_catalog()
+        return {
+            "masters": [dict(row) for row in masters],
+            "services": [dict(row) for row in services]
+        }
+
+    async def _load_from_redis(self) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        if self.redis is None:
+            return None
+        try:
+            payload = await self.redis.get(REDIS_CATALOG_KEY)
+        except Exception as e:
+            logger.warning(f"⚠️  Кэш каталога в Redis недоступен: {e}")
+            return None
+        return json.loads(payload) if payload else None
+
+    async def _store_in_redis(self, raw: Dict[str, List[Dict[str, Any]]]):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(REDIS_CATALOG_KEY, json.dumps(raw), ex=int(self.ttl))
+        except Exception as e:
+            logger.warning(f"⚠️  Не удалось сохранить каталог в Redis: {e}")
+
+    @staticmethod
+    def _build_snapshot(raw: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Индексы для поиска за O(1) вместо перебора списков"""
+        services_by_master: Dict[int, List[Dict[str, Any]]] = {}
+        for service in raw["services"]:
+            services_by_master.setdefault(service["master_id"], []).append(service)
+        return {
+            "masters": raw["masters"],
+            "masters_by_id": {master["id"]: master for master in raw["masters"]},
+            "services_by_master": services_by_master,
+            "services_by_id": {service["id"]: service for service in raw["services"]}
+        }
+
+    async def get_masters(self) -> List[Dict[str, Any]]:
+        """Активные мастера"""
+        return (await self._get_snapshot())["masters"]
+
+    async def get_master(self, master_id) -> Optional[Dict[str, Any]]:
+        """Мастер по id"""
+        return (await self._get_snapshot())["masters_by_id"].get(int(master_id))
+
+    async def get_master_name(self, master_id) -> str:
+        """Имя мастера по id"""
+        master = await self.get_master(master_id)
+        return master["full_name"] if master else "Неизвестный мастер"
+
+    async def get_services(self, master_id) -> List[Dict[str, Any]]:
+        """Активные услуги мастера"""
+        return (await self._get_snapshot())["services_by_master"].get(int(master_id), [])
+
+    async def get_service(self, service_id) -> Optional[Dict[str, Any]]:
+        """Услуга по id"""
+        return (await self._get_snapshot())["services_by_id"].get(int(service_id))
+
+    def invalidate_local(self):
+        """Сбросить копию каталога в памяти этого процесса"""
+        self._snapshot = None
+        self._expires_at = 0.0
+        self._generation += 1
+
+    async def invalidate(self):
+        """Сбросить каталог во всех процессах (после изменения мастеров или услуг)"""
+        self.invalidate_local()
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(REDIS_CATALOG_KEY)
+            await self.redis.publish(REDIS_INVALIDATE_CHANNEL, "1")
+        except Exception as e:
+            logger.warning(f"⚠️  Не удалось оповестить процессы об изменении каталога: {e}")
+
+    async def listen_invalidations(self):
+        """Слушать оповещения об изменении каталога от других процессов"""
+        if self.redis is None:
+            return
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(REDIS_INVALIDATE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate_local()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Пока подписка потеряна, актуальность держится на TTL
+                logger.warning(f"⚠️  Подписка на изменения каталога прервана: {e}")
+                self.invalidate_local()
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
@@ -0,0 +1,27 @@
+from bot.utils.cache import TTLCache
+
+# Счетчики панели мастера живут недолго: /master нажимают часто,
+# а точность до десятков секунд здесь не важна
+DASHBOARD_CACHE_TTL = 30
+
+dashboard_cache = TTLCache(DASHBOARD_CACHE_TTL)
+
+
+async def get_master_dashboard(crud, master_id: int, use_cache: bool = True):
+    """Счетчики панели мастера (всего записей, ожидают, сегодня).
+
+    Один агрегирующий запрос к БД; результат кэшируется на DASHBOARD_CACHE_TTL.
+    """
+    if use_cache:
+        counters = dashboard_cache.get(master_id)
+        if counters is not None:
+            return counters
+
+    counters = dict(await crud.get_master_dashboard(master_id))
+    dashboard_cache.set(master_id, counters)
+    return counters
+
+
+def invalidate_master_dashboard(master_id: int):
+    """Сбросить счетчики мастера после изменения его записей"""
+    dashboard_cache.delete(master_id)
@@ -0,0 +1,84 @@
+import asyncio
+import csv
+import io
+import tempfile
+from datetime import date
+from typing import AsyncGenerator, Tuple
+
+from aiogram.types.input_file import InputFile
+
+# Сколько строк читать из курсора и записывать в файл за раз
+EXPORT_CHUNK_ROWS = 1000
+
+# До этого размера выгрузка живет в памяти, дальше уходит во временный файл
+EXPORT_SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+EXPORT_COLUMNS = [
+    "ID", "Дата", "Время", "Мастер", "Услуга", "Клиент", "Статус", "Стоимость", "Выручка"
+]
+
+PAID_STATUSES = ('confirmed', 'completed')
+
+
+class SpooledInputFile(InputFile):
+    """Отправка файла в Telegram кусками прямо из SpooledTemporaryFile"""
+
+    def __init__(self, spool, filename: str):
+        super().__init__(filename=filename)
+        self.spool = spool
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        await asyncio.to_thread(self.spool.seek, 0)
+        while chunk := await asyncio.to_thread(self.spool.read, self.chunk_size):
+            yield chunk
+
+
+def _render_rows(rows) -> Tuple[bytes, int]:
+    """Сформировать кусок CSV и посчитать выручку по нему"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    revenue = 0
+    for row in rows:
+        paid = (row['price'] or 0) if row['status'] in PAID_STATUSES else 0
+        revenue += paid
+        writer.writerow([
+            row['id'],
+            row['start_time'].strftime('%d.%m.%Y'),
+            row['start_time'].strftime('%H:%M'),
+            row['master_name'],
+            row['service_name'],
+            row['client_name'] or '',
+            row['status'],
+            row['price'] or 0,
+            paid
+        ])
+    return buffer.getvalue().encode('utf-8'), revenue
+
+
+async def export_appointments_csv(crud, date_from: date, date_to: date):
+    """Выгрузить записи и выручку за период в CSV.
+
+    Строки читаются серверным курсором пачками и сразу дописываются
+    в SpooledTemporaryFile, так что вся выборка никогда не лежит в памяти.
+    Возвращает (файл, число записей, выручка); файл нужно закрыть после отправки.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE, mode='w+b')
+    buffer = io.StringIO()
+    csv.writer(buffer, delimiter=';').writerow(EXPORT_COLUMNS)
+    # BOM, чтобы Excel правильно открыл кириллицу
+    spool.write(b'\xef\xbb\xbf' + buffer.getvalue().encode('utf-8'))
+
+    total_rows = 0
+    total_revenue = 0
+    try:
+        async for rows in crud.iter_appointments_for_export(date_from, date_to, EXPORT_CHUNK_ROWS):
+            data, revenue = _render_rows(rows)
+            # После перехода на диск запись может блокировать - уводим в поток
+            await asyncio.to_thread(spool.write, data)
+            total_rows += len(rows)
+            total_revenue += revenue
+    except BaseException:
+        spool.close()
+        raise
+
+    return spool, total_rows, total_revenue
@@ -0,0 +1,155 @@
+import copy
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _BufferedEntry:
+    """Состояние и данные одного ключа FSM в пределах апдейта"""
+    state: Optional[str]
+    data: Dict[str, Any]
+    state_dirty: bool = False
+    data_dirty: bool = False
+
+
+@dataclass
+class _UpdateBuffer:
+    entries: Dict[StorageKey, _BufferedEntry] = field(default_factory=dict)
+
+
+# Буфер текущего апдейта. Каждый апдейт обрабатывается в своей задаче
+# со своим контекстом, поэтому буферы разных апдейтов не пересекаются
+_current_buffer: ContextVar[Optional[_UpdateBuffer]] = ContextVar("fsm_update_buffer", default=None)
+
+
+class CoalescingRedisStorage(BaseStorage):
+    """Обертка над RedisStorage, которая склеивает обращения к Redis за апдейт.
+
+    Внутри buffered() состояние и данные ключа читаются один раз одним
+    pipeline-запросом, все set_state/set_data/update_data меняют копию
+    в памяти, а в конце апдейта изменения пишутся одной транзакцией
+    MULTI/EXEC. Вне buffered() (фоновые задачи) все идет напрямую в Redis.
+    """
+
+    def __init__(self, storage: RedisStorage):
+        self.storage = storage
+        # Каталог и другие сервисы используют то же подключение
+        self.redis = storage.redis
+
+    @asynccontextmanager
+    async def buffered(self):
+        """Буферизовать обращения к FSM до выхода из блока"""
+        if _current_buffer.get() is not None:
+            # Вложенный вызов: изменения запишет внешний блок
+            yield
+            return
+
+        buffer = _UpdateBuffer()
+        token = _current_buffer.set(buffer)
+        try:
+            yield
+        finally:
+            _current_buffer.reset(token)
+            # Пишем и при ошибке в обработчике: без буфера эти изменения
+            # уже были бы в Redis
+            await self._flush(buffer)
+
+    async def _load(self, buffer: _UpdateBuffer, key: StorageKey) -> _BufferedEntry:
+        entry = buffer.entries.get(key)
+        if entry is not None:
+            return entry
+
+        key_builder = self.storage.key_builder
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key_builder.build(key, "state"))
+            pipe.get(key_builder.build(key, "data"))
+            state, data = await pipe.execute()
+
+        if isinstance(state, bytes):
+            state = state.decode("utf-8")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        entry = _BufferedEntry(state=state, data=self.storage.json_loads(data) if data else {})
+        buffer.entries[key] = entry
+        return entry
+
+    async def _flush(self, buffer: _UpdateBuffer):
+        dirty = [(key, entry) for key, entry in buffer.entries.items()
+                 if entry.state_dirty or entry.data_dirty]
+        if not dirty:
+            return
+
+        key_builder = self.storage.key_builder
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key, entry in dirty:
+                if entry.state_dirty:
+                    state_key = key_builder.build(key, "state")
+                    if entry.state is None:
+                        pipe.delete(state_key)
+                    else:
+                        pipe.set(state_key, entry.state, ex=self.storage.state_ttl)
+                if entry.data_dirty:
+                    data_key = key_builder.build(key, "data")
+                    if not entry.data:
+                        pipe.delete(data_key)
+                    else:
+                        pipe.set(data_key, self.storage.json_dumps(entry.data), ex=self.storage.data_ttl)
+            await pipe.execute()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        buffer = _current_buffer.get()
+        if buffer is None:
+            return await self.storage.set_state(key, state)
+
+        entry = await self._load(buffer, key)
+        entry.state = state.state if isinstance(state, State) else state
+        entry.state_dirty = True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        buffer = _current_buffer.get()
+        if buffer is None:
+            return await self.storage.get_state(key)
+        return (await self._load(buffer, key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+
+        buffer = _current_buffer.get()
+        if buffer is None:
+            return await self.storage.set_data(key, data)
+
+        entry = await self._load(buffer, key)
+        entry.data = copy.deepcopy(data)
+        entry.data_dirty = True
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        buffer = _current_buffer.get()
+        if buffer is None:
+            return await self.storage.get_data(key)
+        # Копия, как после чтения из Redis: изменения словаря без set_data не сохраняются
+        return copy.deepcopy((await self._load(buffer, key)).data)
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        buffer = _current_buffer.get()
+        if buffer is None:
+            return await self.storage.update_data(key, data)
+
+        entry = await self._load(buffer, key)
+        entry.data.update(copy.deepcopy(dict(data)))
+        entry.data_dirty = True
+        return copy.deepcopy(entry.data)
+
+    async def close(self) -> None:
+        await self.storage.close()
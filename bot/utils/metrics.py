@@ -0,0 +1,332 @@
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек (секунды)
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+METRICS_PATH = "/metrics"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Метрика в формате Prometheus.
+
+    Блокировок нет: бот работает в одном потоке event loop, а запись
+    метрики - несколько операций со словарем без await, которые другие
+    задачи прервать не могут. Воркеры супервизора - отдельные процессы
+    со своими метриками.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    """Текущее значение: задается явно или читается функцией при сборе метрик"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def inc(self, *labels: str, value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def dec(self, *labels: str, value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - value
+
+    def set_function(self, function: Callable[[], float], *labels: str):
+        self.functions[labels] = function
+
+    def samples(self) -> List[str]:
+        values = dict(self.values)
+        values.update((labels, function()) for labels, function in self.functions.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in values.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждой серии: счетчики корзин (последняя - +Inf), сумма, количество
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Метрика уже зарегистрирована: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+# Апдейты и обработчики
+UPDATE_DURATION = REGISTRY.register(Histogram(
+    "bot_update_duration_seconds", "Время обработки апдейта целиком", ("update_type",)
+))
+UPDATES_IN_FLIGHT = REGISTRY.register(Gauge(
+    "bot_updates_in_flight", "Апдейтов в обработке"
+))
+UPDATES_IN_FLIGHT.set(0)
+HANDLER_DURATION = REGISTRY.register(Histogram(
+    "bot_handler_duration_seconds", "Время работы обработчика", ("module", "handler")
+))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("module", "handler")
+))
+
+# Пулы соединений PostgreSQL: primary и replica (если настроена)
+DB_POOL_ACQUIRE_WAIT = REGISTRY.register(Histogram(
+    "db_pool_acquire_wait_seconds", "Ожидание свободного соединения пула", ("pool",)
+))
+DB_POOL_SIZE = REGISTRY.register(Gauge("db_pool_size", "Открытых соединений пула", ("pool",)))
+DB_POOL_IN_USE = REGISTRY.register(Gauge("db_pool_in_use", "Соединений пула, занятых запросами", ("pool",)))
+DB_POOL_MAX_SIZE = REGISTRY.register(Gauge("db_pool_max_size", "Максимальный размер пула", ("pool",)))
+
+# Redis
+REDIS_COMMAND_DURATION = REGISTRY.register(Histogram(
+    "redis_command_duration_seconds", "Время команды Redis (pipeline - одна команда)", ("command",)
+))
+REDIS_ERRORS = REGISTRY.register(Counter(
+    "redis_errors_total", "Ошибки команд Redis", ("command",)
+))
+
+# Bot API
+TELEGRAM_API_DURATION = REGISTRY.register(Histogram(
+    "telegram_api_duration_seconds", "Время запроса к Bot API", ("method",)
+))
+TELEGRAM_API_ERRORS = REGISTRY.register(Counter(
+    "telegram_api_errors_total", "Ошибки Bot API", ("method", "error")
+))
+TELEGRAM_API_RETRY_AFTER = REGISTRY.register(Counter(
+    "telegram_api_retry_after_total", "Ответы 429 (Too Many Requests) от Bot API", ("method",)
+))
+
+# Outbox (bot/utils/outbox.py)
+OUTBOX_EVENT_LAG = REGISTRY.register(Histogram(
+    "outbox_event_lag_seconds", "От записи события outbox до его обработки",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+))
+OUTBOX_HANDLER_ERRORS = REGISTRY.register(Counter(
+    "outbox_handler_errors_total", "Ошибки обработчиков outbox", ("handler",)
+))
+
+
+class _TimedAcquire:
+    """pool.acquire(), который замеряет ожидание соединения"""
+
+    def __init__(self, context, name: str, tracer=None):
+        self.context = context
+        self.name = name
+        self.tracer = tracer
+
+    def _acquired(self, conn, started: float):
+        DB_POOL_ACQUIRE_WAIT.observe(time.perf_counter() - started, self.name)
+        if self.tracer is not None:
+            self.tracer.attach(conn)
+        return conn
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        return self._acquired(await self.context.__aenter__(), started)
+
+    async def __aexit__(self, *exc_info):
+        return await self.context.__aexit__(*exc_info)
+
+    def __await__(self):
+        started = time.perf_counter()
+        conn = yield from self.context.__await__()
+        return self._acquired(conn, started)
+
+
+class InstrumentedPool:
+    """Обертка над asyncpg.Pool: время ожидания acquire и заполненность пула,
+    а с tracer (bot/utils/query_tracer.py) - время каждого запроса.
+
+    Остальные методы и атрибуты передаются пулу как есть.
+    """
+
+    def __init__(self, pool, tracer=None, name: str = "primary"):
+        self.pool = pool
+        self.tracer = tracer
+        self.name = name
+        DB_POOL_SIZE.set_function(pool.get_size, name)
+        DB_POOL_IN_USE.set_function(lambda: pool.get_size() - pool.get_idle_size(), name)
+        DB_POOL_MAX_SIZE.set_function(pool.get_max_size, name)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _TimedAcquire:
+        return _TimedAcquire(self.pool.acquire(timeout=timeout), self.name, self.tracer)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        command = "MULTI" if self.is_transaction else "PIPELINE"
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            REDIS_ERRORS.inc(command)
+            raise
+        finally:
+            REDIS_COMMAND_DURATION.observe(time.perf_counter() - started, command)
+
+
+class InstrumentedRedis(Redis):
+    """Клиент Redis с замером времени каждой команды и pipeline"""
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).upper() if args else "UNKNOWN"
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            REDIS_ERRORS.inc(command)
+            raise
+        finally:
+            REDIS_COMMAND_DURATION.observe(time.perf_counter() - started, command)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+async def telegram_api_metrics(make_request, bot, method):
+    """Middleware сессии бота: время запросов к Bot API и ответы 429"""
+    name = getattr(method, "__api_method__", type(method).__name__)
+    started = time.perf_counter()
+    try:
+        return await make_request(bot, method)
+    except TelegramRetryAfter:
+        TELEGRAM_API_RETRY_AFTER.inc(name)
+        TELEGRAM_API_ERRORS.inc(name, "TelegramRetryAfter")
+        raise
+    except TelegramAPIError as e:
+        TELEGRAM_API_ERRORS.inc(name, type(e).__name__)
+        raise
+    finally:
+        TELEGRAM_API_DURATION.observe(time.perf_counter() - started, name)
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics в формате Prometheus на aiohttp"""
+
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.registry.render().encode("utf-8"),
+            headers={"Content-Type": PROMETHEUS_CONTENT_TYPE}
+        )
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(METRICS_PATH, self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host=self.host, port=self.port).start()
+        logger.info(f"📈 Метрики: http://{self.host}:{self.port}{METRICS_PATH}")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
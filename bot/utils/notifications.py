@@ -0,0 +1,244 @@
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Чем меньше число, тем раньше уходит сообщение
+PRIORITY_TRANSACTIONAL = 0  # подтверждения, отмены, новые записи
+PRIORITY_REMINDER = 10  # напоминания о визитах
+
+# Лимиты Telegram: около 30 сообщений в секунду на бота
+# и не чаще одного сообщения в секунду в один чат
+GLOBAL_RATE = 25
+PER_CHAT_INTERVAL = 1.0
+
+SEND_WORKERS = 8
+MAX_RETRIES = 5
+
+
+class DispatcherStopped(Exception):
+    """Диспетчер остановлен, а сообщение так и не отправлено"""
+
+
+@dataclass
+class Notification:
+    chat_id: int
+    text: str
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+    # Слот в чате уже зарезервирован, повторно ждать не нужно
+    reserved: bool = False
+    # Результат отправки для deliver(): True - доставлено, False - отклонено
+    done: Optional[asyncio.Future] = None
+
+    def resolve(self, delivered: bool):
+        if self.done is not None and not self.done.done():
+            self.done.set_result(delivered)
+
+    def fail(self, error: BaseException):
+        if self.done is not None and not self.done.done():
+            self.done.set_exception(error)
+
+
+class RateLimiter:
+    """Token bucket: не больше rate отправок в секунду в среднем"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        # Пауза для всего бота после ответа 429
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        # asyncio.Lock выдает очередь ожидающим по порядку (FIFO),
+        # так что сообщения не обгоняют друг друга во время пауз
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self.paused_until > now:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NotificationDispatcher:
+    """Очередь исходящих уведомлений с приоритетами.
+
+    Обработчики вызывают enqueue() и сразу возвращаются, а отправкой
+    занимается пул воркеров с учетом общего лимита бота и лимита на чат.
+    На 429 сообщение возвращается в очередь через retry_after.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = SEND_WORKERS,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_interval: float = PER_CHAT_INTERVAL,
+        max_retries: int = MAX_RETRIES
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(global_rate)
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        # Порядковый номер сохраняет порядок сообщений одного приоритета
+        self._seq = itertools.count()
+        # Когда в чат снова можно писать (по time.monotonic)
+        self._chat_ready_at: Dict[int, float] = {}
+        # Отложенные сообщения (остывание чата, 429, повтор после ошибки
+        # сети): их нет в очереди, пока не сработает таймер
+        self._deferred: Dict[int, Tuple[asyncio.TimerHandle, Notification]] = {}
+        self._tasks = []
+        self._stopped = False
+
+    def enqueue(self, chat_id: int, text: str, priority: int = PRIORITY_TRANSACTIONAL, **kwargs):
+        """Поставить сообщение в очередь (не ждет отправки)"""
+        self._put(priority, Notification(chat_id=chat_id, text=text, kwargs=kwargs))
+
+    async def deliver(self, chat_id: int, text: str, priority: int = PRIORITY_TRANSACTIONAL, **kwargs) -> bool:
+        """Отправить сообщение через очередь и дождаться результата.
+
+        True - доставлено, False - Telegram отклонил его окончательно (бот
+        заблокирован и т.п.). Если повторы исчерпаны, выбрасывает ошибку сети.
+        """
+        if self._stopped:
+            raise DispatcherStopped("Диспетчер уведомлений остановлен")
+        notification = Notification(chat_id=chat_id, text=text, kwargs=kwargs)
+        notification.done = asyncio.get_running_loop().create_future()
+        self._put(priority, notification)
+        return await notification.done
+
+    def _put(self, priority: int, notification: Notification):
+        self.queue.put_nowait((priority, next(self._seq), notification))
+
+    def _put_later(self, delay: float, priority: int, notification: Notification):
+        key = next(self._seq)
+        handle = asyncio.get_running_loop().call_later(delay, self._put_deferred, key, priority, notification)
+        self._deferred[key] = (handle, notification)
+
+    def _put_deferred(self, key: int, priority: int, notification: Notification):
+        del self._deferred[key]
+        self._put(priority, notification)
+
+    async def start(self):
+        """Запустить воркеры отправки"""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"📨 Диспетчер уведомлений запущен ({self.workers} воркеров)")
+
+    async def stop(self, timeout: float = 10):
+        """Дослать то, что в очереди и отложено, и остановить воркеры.
+
+        Что не успело уйти за timeout, выбрасывается, а deliver() по этим
+        сообщениям получает DispatcherStopped.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                await asyncio.wait_for(self.queue.join(), max(deadline - loop.time(), 0))
+                if not self._deferred:
+                    break
+                # Отложенные вернутся в очередь по таймеру
+                await asyncio.sleep(min(0.1, max(deadline - loop.time(), 0)))
+                if loop.time() >= deadline:
+                    raise asyncio.TimeoutError
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️  Не отправлено уведомлений: {self.queue.qsize() + len(self._deferred)}")
+
+        self._stopped = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        error = DispatcherStopped("Диспетчер уведомлений остановлен")
+        for handle, notification in self._deferred.values():
+            handle.cancel()
+            notification.fail(error)
+        self._deferred.clear()
+        while not self.queue.empty():
+            _, _, notification = self.queue.get_nowait()
+            self.queue.task_done()
+            notification.fail(error)
+
+    def _reserve_chat_slot(self, notification: Notification) -> float:
+        """Зарезервировать время отправки в чат, вернуть сколько ждать"""
+        now = time.monotonic()
+        if notification.reserved:
+            return 0.0
+
+        ready_at = self._chat_ready_at.get(notification.chat_id, 0.0)
+        send_at = max(now, ready_at)
+        self._chat_ready_at[notification.chat_id] = send_at + self.per_chat_interval
+        notification.reserved = True
+
+        # Не даем словарю расти бесконечно
+        if len(self._chat_ready_at) > 10000:
+            self._chat_ready_at = {
+                chat_id: at for chat_id, at in self._chat_ready_at.items() if at > now
+            }
+        return send_at - now
+
+    async def _worker(self):
+        while True:
+            priority, _, notification = await self.queue.get()
+            try:
+                delay = self._reserve_chat_slot(notification)
+                if delay > 0:
+                    # Чат еще "остывает": возвращаем сообщение в очередь позже,
+                    # не занимая воркер ожиданием
+                    self._put_later(delay, priority, notification)
+                    continue
+
+                await self.limiter.acquire()
+                await self._send(priority, notification)
+            except asyncio.CancelledError:
+                notification.fail(DispatcherStopped("Диспетчер уведомлений остановлен"))
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка диспетчера уведомлений: {e}", exc_info=True)
+                notification.fail(e)
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, priority: int, notification: Notification):
+        try:
+            await self.bot.send_message(notification.chat_id, notification.text, **notification.kwargs)
+            notification.resolve(True)
+        except TelegramRetryAfter as e:
+            # Лимит превышен: ставим на паузу всю отправку и повторяем
+            logger.warning(f"⏳ 429 от Telegram, повтор через {e.retry_after} с")
+            self.limiter.pause(e.retry_after)
+            notification.reserved = False
+            self._put_later(e.retry_after, priority, notification)
+        except TelegramNetworkError as e:
+            notification.attempts += 1
+            if notification.attempts >= self.max_retries:
+                logger.error(f"❌ Уведомление в чат {notification.chat_id} не доставлено: {e}")
+                notification.fail(e)
+                return
+            notification.reserved = False
+            self._put_later(2 ** notification.attempts, priority, notification)
+        except TelegramAPIError as e:
+            # Бот заблокирован, чат не найден и т.п. - повтор не поможет
+            logger.warning(f"⚠️  Уведомление в чат {notification.chat_id} отклонено: {e}")
+            notification.resolve(False)
@@ -0,0 +1,367 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bot.utils.availability import invalidate_master_calendar
+from bot.utils.dashboard import invalidate_master_dashboard
+from bot.utils.metrics import OUTBOX_EVENT_LAG, OUTBOX_HANDLER_ERRORS
+from database.crud import EVENT_APPOINTMENT_CREATED, OUTBOX_HANDLER_STATS, booking_stats_delta
+
+logger = logging.getLogger(__name__)
+
+# Сколько событий забирать за раз и как часто проверять очередь, если она пуста
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 1.0
+
+# Уведомления одного чата уходят не чаще раза в секунду, и пачка ждет
+# самого медленного из них. Чтобы она не держала очередь, в работе
+# может быть несколько пачек сразу
+OUTBOX_MAX_BATCHES_IN_FLIGHT = 4
+
+# Аренда забранных событий: если процесс упал, через это время
+# события снова попадут в очередь (доставка "хотя бы один раз").
+# Пока пачка обрабатывается, аренда продлевается: уведомления в один
+# чат и паузы после 429 могут занять больше времени аренды
+OUTBOX_LEASE = timedelta(minutes=2)
+OUTBOX_LEASE_RENEW_INTERVAL = OUTBOX_LEASE.total_seconds() / 4
+
+# После стольких попыток событие остается в таблице с last_error
+# и больше не забирается
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_MAX_RETRY_DELAY = 300
+
+# Обработанные события хранятся неделю, чистка - раз в час
+OUTBOX_RETENTION = timedelta(days=7)
+OUTBOX_PURGE_INTERVAL = 3600
+
+HANDLER_CACHES = 'caches'
+HANDLER_NOTIFICATIONS = 'notifications'
+
+REDIS_MASTER_INVALIDATE_CHANNEL = "masters:invalidate"
+
+
+@dataclass
+class OutboxEvent:
+    id: int
+    event_type: str
+    payload: Dict[str, Any]
+    handled: set
+    attempts: int
+    created_at: datetime
+
+    @classmethod
+    def from_record(cls, record) -> "OutboxEvent":
+        return cls(
+            id=record['id'],
+            event_type=record['event_type'],
+            payload=json.loads(record['payload']),
+            handled=set(record['handled']),
+            attempts=record['attempts'],
+            created_at=record['created_at']
+        )
+
+    @property
+    def appointment_id(self) -> int:
+        return self.payload['appointment_id']
+
+    @property
+    def master_id(self) -> int:
+        return self.payload['master_id']
+
+    @property
+    def old_status(self) -> Optional[str]:
+        return self.payload['old_status']
+
+    @property
+    def new_status(self) -> str:
+        return self.payload['new_status']
+
+    @property
+    def start_time(self) -> datetime:
+        return datetime.fromisoformat(self.payload['start_time'])
+
+
+def notification_for(event: OutboxEvent, appointment) -> Optional[Tuple[int, str]]:
+    """Кому и что отправить по событию (None - никому)"""
+    start = appointment['start_time'].strftime('%d.%m.%Y %H:%M')
+
+    if event.event_type == EVENT_APPOINTMENT_CREATED:
+        return appointment['master_telegram_id'], (
+            f"📅 Новая запись #{appointment['id']}\n\n"
+            f"👤 {appointment['client_name']}\n"
+            f"💆 {appointment['service_name']}\n"
+            f"📅 {start}\n\n"
+            "Подтвердите запись в панели мастера: /master"
+        )
+
+    changed_by = event.payload.get('changed_by')
+    if changed_by == 'client' and event.new_status == 'cancelled':
+        return appointment['master_telegram_id'], (
+            f"❌ Клиент отменил запись #{appointment['id']}\n\n"
+            f"💆 {appointment['service_name']}\n"
+            f"📅 {start}"
+        )
+
+    if changed_by != 'master' or not appointment['client_telegram_id']:
+        return None
+    if event.new_status == 'confirmed':
+        return appointment['client_telegram_id'], (
+            f"✅ Ваша запись #{appointment['id']} подтверждена!\n\n"
+            f"💆 {appointment['service_name']}\n"
+            f"📅 {start}\n"
+            f"👩‍🔧 {appointment['master_name']}"
+        )
+    if event.new_status == 'cancelled':
+        return appointment['client_telegram_id'], (
+            f"😔 Мастер не может принять вас по записи #{appointment['id']} ({start}).\n"
+            "Пожалуйста, выберите другое время: /start"
+        )
+    return None
+
+
+class MasterCacheSync:
+    """Сброс кэшей мастера (свободное время и счетчики панели) во всех
+    процессах: в своем сразу, в остальных - через Redis pub/sub.
+
+    Без Redis бот работает одним процессом, и хватает локального сброса.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis
+
+    @staticmethod
+    def invalidate_local(master_id: int):
+        invalidate_master_calendar(master_id)
+        invalidate_master_dashboard(master_id)
+
+    async def invalidate(self, master_ids: Iterable[int]):
+        master_ids = sorted(set(master_ids))
+        for master_id in master_ids:
+            self.invalidate_local(master_id)
+        if self.redis is None or not master_ids:
+            return
+        try:
+            await self.redis.publish(REDIS_MASTER_INVALIDATE_CHANNEL, ",".join(map(str, master_ids)))
+        except Exception as e:
+            logger.warning(f"⚠️  Не удалось оповестить процессы об изменении записей: {e}")
+
+    async def listen(self):
+        """Слушать сбросы кэшей мастеров от других процессов"""
+        if self.redis is None:
+            return
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(REDIS_MASTER_INVALIDATE_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = message["data"]
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    for master_id in data.split(","):
+                        self.invalidate_local(int(master_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Пока подписка потеряна, актуальность держится на TTL кэшей
+                logger.warning(f"⚠️  Подписка на изменения записей прервана: {e}")
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.aclose()
+
+
+class OutboxConsumer:
+    """Фоновая обработка событий outbox пачками.
+
+    Событие пишется тем же запросом, что и изменение записи, поэтому
+    побочные эффекты не теряются при падении и не задерживают нажатие
+    кнопки. Доставка "хотя бы один раз": событие забирается в аренду и
+    отмечается обработанным только после всех обработчиков. Повтор
+    безопасен - каждый обработчик идемпотентен:
+    - статистика: отметка на событии и агрегаты в одной транзакции;
+    - кэши: повторный сброс ничего не ломает;
+    - уведомления: ждут ответа Telegram, при частичной ошибке отправленное
+      запоминается в handled и не повторяется.
+    """
+
+    def __init__(
+        self,
+        crud,
+        notifier,
+        master_caches: MasterCacheSync,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        interval: float = OUTBOX_POLL_INTERVAL
+    ):
+        self.crud = crud
+        self.notifier = notifier
+        self.master_caches = master_caches
+        self.batch_size = batch_size
+        self.interval = interval
+        # Порядок важен только для наглядности: обработчики независимы
+        self.handlers = (
+            (OUTBOX_HANDLER_STATS, self.handle_stats),
+            (HANDLER_CACHES, self.handle_caches),
+            (HANDLER_NOTIFICATIONS, self.handle_notifications),
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._batches: set = set()
+
+    def start(self):
+        """Запустить обработку в фоне"""
+        self._task = asyncio.create_task(self._run())
+        logger.info("📤 Обработчик outbox запущен")
+
+    async def stop(self):
+        """Остановить обработку. Незавершенные события вернутся после аренды"""
+        if self._task is None:
+            return
+        tasks = [self._task, *self._batches]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        purge_at = 0.0
+        while True:
+            claimed = 0
+            try:
+                if len(self._batches) < OUTBOX_MAX_BATCHES_IN_FLIGHT:
+                    events = await self.claim()
+                    claimed = len(events)
+                    if events:
+                        batch = asyncio.create_task(self.handle(events))
+                        self._batches.add(batch)
+                        batch.add_done_callback(self._batch_done)
+                if time.monotonic() >= purge_at:
+                    purged = await self.crud.purge_outbox(OUTBOX_RETENTION)
+                    if purged:
+                        logger.info(f"🧹 Удалено обработанных событий outbox: {purged}")
+                    purge_at = time.monotonic() + OUTBOX_PURGE_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработки outbox: {e}", exc_info=True)
+            # Полная пачка - в очереди, вероятно, есть еще
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    def _batch_done(self, batch: asyncio.Task):
+        self._batches.discard(batch)
+        if not batch.cancelled() and batch.exception() is not None:
+            # События пачки вернутся в очередь после аренды
+            logger.error(f"❌ Ошибка обработки outbox: {batch.exception()}", exc_info=batch.exception())
+
+    async def claim(self) -> List[OutboxEvent]:
+        """Забрать в аренду пачку событий"""
+        records = await self.crud.claim_outbox_events(self.batch_size, OUTBOX_LEASE, OUTBOX_MAX_ATTEMPTS)
+        return sorted((OutboxEvent.from_record(record) for record in records), key=lambda event: event.id)
+
+    async def process_batch(self) -> int:
+        """Забрать и обработать одну пачку событий, вернуть ее размер"""
+        events = await self.claim()
+        if events:
+            await self.handle(events)
+        return len(events)
+
+    async def handle(self, events: List[OutboxEvent]):
+        """Прогнать пачку через обработчики и отметить результат"""
+        heartbeat = asyncio.create_task(self._renew_lease([event.id for event in events]))
+        try:
+            errors = await self._run_handlers(events)
+        finally:
+            # Продление останавливается до отметки результата, чтобы не
+            # перезаписать время повтора
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        completed = [event.id for event in events if event.id not in errors]
+        if completed:
+            for lag in await self.crud.complete_outbox_events(completed):
+                OUTBOX_EVENT_LAG.observe(lag)
+
+        for event in events:
+            if event.id not in errors:
+                continue
+            delay = timedelta(seconds=min(2 ** event.attempts, OUTBOX_MAX_RETRY_DELAY))
+            await self.crud.retry_outbox_event(event.id, sorted(event.handled), errors[event.id], delay)
+            if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error(
+                    f"☠️ Событие outbox {event.id} не обработано за {event.attempts} попыток: {errors[event.id]}"
+                )
+
+    async def _run_handlers(self, events: List[OutboxEvent]) -> Dict[int, str]:
+        """Вызвать обработчики, вернуть ошибки по id события"""
+        appointments = await self.crud.get_outbox_appointments(
+            list({event.appointment_id for event in events})
+        )
+
+        errors: Dict[int, str] = {}
+        for name, handler in self.handlers:
+            pending = [event for event in events if name not in event.handled]
+            if not pending:
+                continue
+            try:
+                failures = await handler(pending, appointments)
+            except Exception as e:
+                logger.error(f"❌ Обработчик outbox {name}: {e}", exc_info=True)
+                failures = {event.id: str(e) for event in pending}
+            if failures:
+                OUTBOX_HANDLER_ERRORS.inc(name, value=len(failures))
+            for event in pending:
+                if event.id in failures:
+                    errors.setdefault(event.id, f"{name}: {failures[event.id]}")
+                else:
+                    event.handled.add(name)
+        return errors
+
+    async def _renew_lease(self, event_ids: List[int]):
+        while True:
+            await asyncio.sleep(OUTBOX_LEASE_RENEW_INTERVAL)
+            try:
+                await self.crud.extend_outbox_lease(event_ids, OUTBOX_LEASE)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️  Не удалось продлить аренду событий outbox: {e}")
+
+    async def handle_stats(self, events: List[OutboxEvent], appointments) -> Dict[int, str]:
+        booking_deltas = {}
+        new_clients = {}
+        for event in events:
+            appointment = {
+                'start_time': event.start_time,
+                'master_id': event.master_id,
+                'service_id': event.payload['service_id'],
+                'price': event.payload['price']
+            }
+            booking_deltas[event.id] = booking_stats_delta(appointment, event.old_status, event.new_status)
+            if event.payload.get('is_new_client'):
+                new_clients[event.id] = event.created_at.date()
+        await self.crud.apply_outbox_stats(booking_deltas, new_clients)
+        return {}
+
+    async def handle_caches(self, events: List[OutboxEvent], appointments) -> Dict[int, str]:
+        await self.master_caches.invalidate(event.master_id for event in events)
+        return {}
+
+    async def handle_notifications(self, events: List[OutboxEvent], appointments) -> Dict[int, str]:
+        sending = []
+        for event in events:
+            appointment = appointments.get(event.appointment_id)
+            message = notification_for(event, appointment) if appointment else None
+            if message is not None and message[0]:
+                sending.append((event.id, self.notifier.deliver(*message)))
+
+        results = await asyncio.gather(*(delivery for _, delivery in sending), return_exceptions=True)
+        # Отклоненное Telegram (бот заблокирован) не повторяем: результат не изменится
+        return {
+            event_id: str(result)
+            for (event_id, _), result in zip(sending, results)
+            if isinstance(result, BaseException)
+        }
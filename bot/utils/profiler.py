@@ -0,0 +1,172 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Частота выборок: 100 в секунду дают детальную картину при накладных
+# расходах в доли процента (замер выводится в отчете)
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+# Глубже этого стек обрезается
+MAX_STACK_DEPTH = 128
+
+# Одновременно идет только одно профилирование
+_profile_lock = asyncio.Lock()
+
+
+def _frame_name(code) -> str:
+    # ";" разделяет кадры в формате folded, пробелы допустимы
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _thread_stack(frame) -> List[str]:
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _task_stack(task: asyncio.Task) -> List[str]:
+    """Цепочка await задачи: от корневой корутины до того, чего она ждет"""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(stack) < MAX_STACK_DEPTH:
+        code = getattr(awaitable, "cr_code", None) or getattr(awaitable, "gi_code", None)
+        if code is None:
+            # Future, sleep и прочие не-корутины - лист цепочки
+            stack.append(type(awaitable).__name__)
+            break
+        stack.append(_frame_name(code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+@dataclass
+class ProfileResult:
+    duration: float
+    interval: float
+    loop_samples: Counter = field(default_factory=Counter)
+    task_samples: Counter = field(default_factory=Counter)
+    lags: List[float] = field(default_factory=list)
+    overhead: float = 0.0
+
+    def folded(self) -> str:
+        """Стеки в формате folded (flamegraph.pl, speedscope, inferno).
+
+        Ветка loop - где поток event loop проводил время (в том числе
+        блокирующий код), ветка tasks - чего ждали корутины задач.
+        """
+        lines = [f"loop;{stack} {count}" for stack, count in self.loop_samples.most_common()]
+        lines += [f"tasks;{stack} {count}" for stack, count in self.task_samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        total = sum(self.loop_samples.values())
+        # Сэмплы, где поток ждал событий в select/epoll - простой цикла
+        idle = sum(count for stack, count in self.loop_samples.items() if "select (selectors.py" in stack)
+        busy = 100 * (total - idle) / total if total else 0.0
+        return (
+            f"⏱ {self.duration:.0f} с, выборок: {total} (шаг {self.interval * 1000:.0f} мс)\n"
+            f"🔥 Цикл занят: {busy:.1f}% времени\n"
+            f"🐌 Задержка цикла: p50 {_percentile(self.lags, 50) * 1000:.1f} мс, "
+            f"p99 {_percentile(self.lags, 99) * 1000:.1f} мс, "
+            f"макс. {max(self.lags, default=0) * 1000:.1f} мс\n"
+            f"⚙️ Накладные расходы профилировщика: {self.overhead * 100:.2f}%\n"
+            f"🧵 pid {os.getpid()}"
+        )
+
+
+class SamplingProfiler:
+    """Выборочный профилировщик работающего процесса без внешних сервисов.
+
+    Поток-сэмплер с шагом interval снимает стек потока event loop через
+    sys._current_frames(): видно и блокирующий код, который не отдает
+    управление циклу. Проба внутри цикла с тем же шагом меряет задержку
+    цикла (насколько позже назначенного она просыпается) и снимает цепочки
+    await всех задач - суммарное время ожидания по корутинам.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._sampler_time = 0.0
+        self._probe_time = 0.0
+
+    def _sample_thread(self, thread_id: int, result: ProfileResult):
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                result.loop_samples[";".join(_thread_stack(frame))] += 1
+            del frame
+            self._sampler_time += time.perf_counter() - started
+
+    async def _probe(self, result: ProfileResult, owner: asyncio.Task):
+        loop = asyncio.get_running_loop()
+        # Сам профилировщик (проба и ожидающая задача) в профиль не попадает
+        skip = {asyncio.current_task(), owner}
+        while not self._stop.is_set():
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            result.lags.append(max(loop.time() - expected, 0.0))
+
+            started = time.perf_counter()
+            for task in asyncio.all_tasks():
+                if task in skip or task.done():
+                    continue
+                stack = _task_stack(task)
+                if stack:
+                    result.task_samples[";".join(stack)] += 1
+            self._probe_time += time.perf_counter() - started
+
+    async def run(self, duration: float) -> ProfileResult:
+        result = ProfileResult(duration=duration, interval=self.interval)
+        self._stop.clear()
+        sampler = threading.Thread(
+            target=self._sample_thread,
+            args=(threading.get_ident(), result),
+            name="sampling-profiler",
+            daemon=True
+        )
+        probe = asyncio.create_task(
+            self._probe(result, asyncio.current_task()), name="sampling-profiler-probe"
+        )
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            self._stop.set()
+            await probe
+            await asyncio.to_thread(sampler.join)
+
+        result.duration = time.perf_counter() - started
+        result.overhead = (self._sampler_time + self._probe_time) / result.duration
+        return result
+
+
+def is_profiling() -> bool:
+    return _profile_lock.locked()
+
+
+async def profile(duration: float, interval: float = DEFAULT_SAMPLE_INTERVAL) -> Optional[ProfileResult]:
+    """Профилировать процесс duration секунд (None, если профиль уже снимается)"""
+    if _profile_lock.locked():
+        return None
+    async with _profile_lock:
+        return await SamplingProfiler(interval).run(duration)
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import logging
+import random
+import re
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Порог медленного запроса и доля медленных выполнений, для которых снимается план
+DEFAULT_SLOW_QUERY_MS = 200
+DEFAULT_EXPLAIN_SAMPLE_RATE = 0.1
+
+# Одновременно снимается не больше одного плана: EXPLAIN ANALYZE повторно
+# выполняет запрос и занимает соединение пула
+MAX_CONCURRENT_EXPLAINS = 1
+
+# Сколько последних планов хранить на запрос
+PLANS_PER_STATEMENT = 3
+
+# Предел числа разных запросов в статистике (защита от динамического SQL)
+MAX_STATEMENTS = 500
+
+# Кто выполняет текущий запрос: тип апдейта (middleware до обработчика)
+# или обработчик. Ставят UpdateMetricsMiddleware и HandlerMetricsMiddleware
+current_handler: ContextVar[str] = ContextVar("current_handler", default="background")
+
+# Запросы самого трассировщика (EXPLAIN) в статистику не попадают
+_explaining: ContextVar[bool] = ContextVar("query_tracer_explaining", default=False)
+
+# Планы снимаются только для запросов, которые принимает EXPLAIN (не для
+# BEGIN/COMMIT и служебного сброса соединения при возврате в пул)
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|VALUES|TABLE)\b", re.IGNORECASE)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"(?<![\w$.])\d+(?:\.\d+)?\b")
+
+
+def is_explainable(query: str) -> bool:
+    """Один оператор, который можно передать в EXPLAIN"""
+    return bool(_EXPLAINABLE_RE.match(query)) and ";" not in query.strip().rstrip(";")
+
+
+def normalize_query(query: str) -> str:
+    """Текст запроса без литералов и лишних пробелов: ключ статистики.
+
+    Запросы бота параметризованы ($1, $2...), так что обычно
+    нормализация сводится к схлопыванию пробелов.
+    """
+    query = _STRING_LITERAL_RE.sub("?", query)
+    query = _NUMBER_LITERAL_RE.sub("?", query)
+    return _WHITESPACE_RE.sub(" ", query).strip()
+
+
+@dataclass
+class CapturedPlan:
+    captured_at: datetime
+    elapsed: float
+    handler: str
+    plan: str
+
+
+@dataclass
+class StatementStats:
+    statement_id: str
+    query: str
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    slow_calls: int = 0
+    handlers: Counter = field(default_factory=Counter)
+    plans: Deque[CapturedPlan] = field(default_factory=lambda: deque(maxlen=PLANS_PER_STATEMENT))
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class QueryTracer:
+    """Статистика запросов по нормализованному тексту и планы медленных.
+
+    Время берется из логгеров запросов asyncpg (add_query_logger), которые
+    InstrumentedPool вешает на соединение при выдаче из пула. Логгер
+    вызывается в контексте задачи, выполнившей запрос, поэтому известен
+    обработчик. Запись статистики - операции со словарем без блокировок.
+    """
+
+    def __init__(
+        self,
+        pool,
+        slow_threshold: float = DEFAULT_SLOW_QUERY_MS / 1000,
+        explain_sample_rate: float = DEFAULT_EXPLAIN_SAMPLE_RATE
+    ):
+        self.pool = pool
+        self.slow_threshold = slow_threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.statements: Dict[str, StatementStats] = {}
+        # Нормализованный текст по исходному: запросы бота - константы
+        self._normalized: Dict[str, str] = {}
+        self._explains: set = set()
+        self._random = random.Random()
+        self.started_at = datetime.now()
+        self.dropped = 0
+
+    def attach(self, conn):
+        """Подписаться на запросы соединения (повторный вызов ничего не меняет)"""
+        conn.add_query_logger(self.on_query)
+
+    def _statement(self, query: str) -> Optional[StatementStats]:
+        normalized = self._normalized.get(query)
+        if normalized is None:
+            normalized = normalize_query(query)
+            if len(self._normalized) < MAX_STATEMENTS * 4:
+                self._normalized[query] = normalized
+
+        stats = self.statements.get(normalized)
+        if stats is None:
+            if len(self.statements) >= MAX_STATEMENTS:
+                self.dropped += 1
+                return None
+            statement_id = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:8]
+            stats = self.statements[normalized] = StatementStats(statement_id, normalized)
+        return stats
+
+    def on_query(self, record):
+        if _explaining.get():
+            return
+
+        stats = self._statement(record.query)
+        if stats is None:
+            return
+
+        handler = current_handler.get()
+        stats.calls += 1
+        stats.total_time += record.elapsed
+        stats.max_time = max(stats.max_time, record.elapsed)
+        stats.handlers[handler] += 1
+        if record.exception is not None:
+            stats.errors += 1
+            return
+
+        if record.elapsed < self.slow_threshold:
+            return
+        stats.slow_calls += 1
+
+        if (len(self._explains) < MAX_CONCURRENT_EXPLAINS
+                and self._random.random() < self.explain_sample_rate
+                and is_explainable(record.query)):
+            task = asyncio.create_task(
+                self.capture_plan(stats, record.query, record.args, record.elapsed, handler)
+            )
+            self._explains.add(task)
+            task.add_done_callback(self._explains.discard)
+
+    async def _explain(self, conn, query: str, args, analyze: bool) -> str:
+        options = "ANALYZE, BUFFERS" if analyze else "VERBOSE"
+        # Только чтение и откат: EXPLAIN ANALYZE выполняет запрос по-настоящему
+        transaction = conn.transaction(readonly=analyze)
+        await transaction.start()
+        try:
+            rows = await conn.fetch(f"EXPLAIN ({options}) {query}", *(args or ()))
+        finally:
+            await transaction.rollback()
+        return "\n".join(row[0] for row in rows)
+
+    async def capture_plan(self, stats: StatementStats, query: str, args, elapsed: float, handler: str):
+        """Снять план медленного запроса с теми же параметрами"""
+        _explaining.set(True)
+        try:
+            async with self.pool.acquire() as conn:
+                try:
+                    plan = await self._explain(conn, query, args, analyze=True)
+                except asyncpg.ReadOnlySQLTransactionError:
+                    # Запрос меняет данные: только план без выполнения
+                    plan = await self._explain(conn, query, args, analyze=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось снять план запроса {stats.statement_id}: {e}")
+            return
+
+        stats.plans.append(CapturedPlan(datetime.now(), elapsed, handler, plan))
+        logger.warning(
+            f"🐢 Медленный запрос {stats.statement_id} ({handler}): {elapsed * 1000:.0f} мс, план сохранен"
+        )
+
+    def top(self, limit: int = 10) -> List[StatementStats]:
+        """Самые тяжелые запросы по суммарному времени"""
+        return sorted(self.statements.values(), key=lambda stats: stats.total_time, reverse=True)[:limit]
+
+    def find(self, statement_id: str) -> Optional[StatementStats]:
+        for stats in self.statements.values():
+            if stats.statement_id == statement_id:
+                return stats
+        return None
+
+    def reset(self):
+        self.statements.clear()
+        self.started_at = datetime.now()
+        self.dropped = 0
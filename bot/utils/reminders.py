@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from bot.utils.notifications import PRIORITY_REMINDER
+
+logger = logging.getLogger(__name__)
+
+# За сколько до визита напоминать клиенту
+REMINDER_LEAD = timedelta(hours=24)
+
+# Как часто искать визиты, по которым пора напомнить
+REMINDER_SCAN_INTERVAL = 60
+
+# Сколько напоминаний забирать из БД за один запрос
+REMINDER_BATCH_SIZE = 500
+
+# Аренда забранных напоминаний: если ответ Telegram так и не пришел
+# (рестарт, сетевая ошибка), через это время визит снова попадет в скан.
+# С запасом больше времени отправки пачки при глобальном лимите Telegram
+REMINDER_LEASE = timedelta(minutes=10)
+
+
+class ReminderScheduler:
+    """Напоминания клиентам за 24 часа до визита.
+
+    Вместо отдельной задачи APScheduler на каждую запись используется одна
+    периодическая задача, которая забирает подошедшие напоминания из
+    appointments по частичному индексу на start_time. Состояние хранится в
+    самой таблице: визит забирается в аренду (reminder_leased_until), а
+    reminder_sent_at ставится только после ответа Telegram. Напоминание,
+    застрявшее в очереди уведомлений при рестарте, не теряется - после
+    аренды его заберет следующий скан. Повтор возможен, только если процесс
+    упал между отправкой и отметкой. Отмена убирает запись из индекса, а
+    перенос (с обнулением reminder_sent_at) просто сдвигает ее в индексе -
+    это O(log n) и не требует трогать планировщик.
+    """
+
+    def __init__(self, crud, notifier, interval: int = REMINDER_SCAN_INTERVAL):
+        self.crud = crud
+        self.notifier = notifier
+        self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_job(
+            self.send_due_reminders,
+            'interval',
+            seconds=interval,
+            id='send_due_reminders',
+            next_run_time=datetime.now(),
+            # Если скан затянулся, не запускаем второй параллельно
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+
+    def start(self):
+        """Запустить планировщик"""
+        self.scheduler.start()
+        logger.info("⏰ Планировщик напоминаний запущен")
+
+    def shutdown(self):
+        """Остановить планировщик"""
+        self.scheduler.shutdown(wait=False)
+
+    async def send_due_reminders(self):
+        """Отправить все подошедшие напоминания и отметить доставленные"""
+        sent = rejected = failed = 0
+        while True:
+            due = await self.crud.claim_due_reminders(REMINDER_LEAD, REMINDER_BATCH_SIZE, REMINDER_LEASE)
+            results = await asyncio.gather(
+                *(self._deliver(appointment) for appointment in due),
+                return_exceptions=True
+            )
+            # Отклоненное Telegram (бот заблокирован) тоже отмечаем: повтор
+            # ничего не изменит. Ошибки сети повторит скан после аренды
+            done = [
+                appointment['id']
+                for appointment, result in zip(due, results)
+                if not isinstance(result, BaseException)
+            ]
+            if done:
+                await self.crud.mark_reminders_sent(done)
+            sent += sum(1 for result in results if result is True)
+            rejected += sum(1 for result in results if result is False)
+            failed += len(due) - len(done)
+            if len(due) < REMINDER_BATCH_SIZE:
+                break
+
+        if sent:
+            logger.info(f"⏰ Отправлено напоминаний: {sent}")
+        if rejected:
+            logger.info(f"⏰ Напоминаний отклонено Telegram: {rejected}")
+        if failed:
+            logger.warning(f"⚠️  Не удалось отправить напоминаний: {failed}, повтор через {REMINDER_LEASE}")
+
+    def _deliver(self, appointment):
+        return self.notifier.deliver(
+            appointment['client_telegram_id'],
+            f"⏰ Напоминание о записи #{appointment['id']}\n\n"
+            f"📅 {appointment['start_time'].strftime('%d.%m.%Y %H:%M')}\n"
+            f"👩‍🔧 {appointment['master_name']}\n"
+            f"💆 {appointment['service_name']}\n\n"
+            "Ждем вас! Если планы изменились, отмените запись в разделе «Мои записи».",
+            priority=PRIORITY_REMINDER
+        )
@@ -16,4 +16,5 @@ class MasterStates(StatesGroup):
 class AdminStates(StatesGroup):
     """Состояния администратора"""
     adding_master = State()
-    viewing_stats = State()
\ No newline at end of file
+    viewing_stats = State()
+    entering_export_period = State()
\ No newline at end of file
@@ -0,0 +1,1001 @@
+import asyncio
+import asyncpg
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass
+from typing import AsyncIterator, Hashable, Optional, List, Tuple, Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Все SQL-запросы горячего пути вынесены в константы модуля.
+# asyncpg подготавливает запрос один раз на соединение и дальше берет его
+# из кэша подготовленных выражений по тексту запроса, поэтому текст должен
+# быть неизменным (никаких f-строк и склейки условий на лету).
+
+SQL_MASTER_BY_TELEGRAM_ID = """
+    SELECT id, telegram_id, full_name, experience, percentage, is_active
+    FROM masters
+    WHERE telegram_id = $1 AND is_active
+"""
+
+SQL_MASTER_APPOINTMENTS = """
+    SELECT a.id, a.start_time, a.end_time, a.status, a.price,
+           c.full_name AS client_name, s.name AS service_name
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.master_id = $1
+    ORDER BY a.start_time DESC, a.id DESC
+    LIMIT $2
+"""
+
+SQL_MASTER_APPOINTMENTS_BY_STATUS = """
+    SELECT a.id, a.start_time, a.end_time, a.status, a.price,
+           c.full_name AS client_name, s.name AS service_name
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.master_id = $1 AND a.status = $2
+    ORDER BY a.start_time, a.id
+    LIMIT $3
+"""
+
+# Постраничный вывод по ключу (start_time, id): страница начинается сразу
+# за последней показанной записью, поэтому стоит одинаково на любой глубине.
+# "Назад" читает в обратном порядке, строки разворачиваются в CRUD
+SQL_MASTER_APPOINTMENTS_OLDER = """
+    SELECT a.id, a.start_time, a.end_time, a.status, a.price,
+           c.full_name AS client_name, s.name AS service_name
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.master_id = $1 AND (a.start_time, a.id) < ($2, $3)
+    ORDER BY a.start_time DESC, a.id DESC
+    LIMIT $4
+"""
+
+SQL_MASTER_APPOINTMENTS_NEWER = """
+    SELECT a.id, a.start_time, a.end_time, a.status, a.price,
+           c.full_name AS client_name, s.name AS service_name
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.master_id = $1 AND (a.start_time, a.id) > ($2, $3)
+    ORDER BY a.start_time, a.id
+    LIMIT $4
+"""
+
+SQL_MASTER_STATUS_LATER = """
+    SELECT a.id, a.start_time, a.end_time, a.status, a.price,
+           c.full_name AS client_name, s.name AS service_name
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.master_id = $1 AND a.status = $2 AND (a.start_time, a.id) > ($3, $4)
+    ORDER BY a.start_time, a.id
+    LIMIT $5
+"""
+
+SQL_MASTER_STATUS_EARLIER = """
+    SELECT a.id, a.start_time, a.end_time, a.status, a.price,
+           c.full_name AS client_name, s.name AS service_name
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.master_id = $1 AND a.status = $2 AND (a.start_time, a.id) < ($3, $4)
+    ORDER BY a.start_time DESC, a.id DESC
+    LIMIT $5
+"""
+
+# Счетчики панели мастера одним проходом. Все нужные поля есть в покрывающем
+# индексе idx_appointments_master_page, поэтому таблица не читается (index-only scan)
+SQL_MASTER_DASHBOARD = """
+    SELECT COUNT(*) AS total,
+           COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+           COUNT(*) FILTER (
+               WHERE start_time >= CURRENT_DATE::timestamp
+                 AND start_time < (CURRENT_DATE + 1)::timestamp
+           ) AS today
+    FROM appointments
+    WHERE master_id = $1
+"""
+
+# Обновление статуса и выборка деталей записи за один запрос
+# Менять можно только активную запись; прежний статус нужен для статистики
+SQL_UPDATE_APPOINTMENT_STATUS = """
+    WITH old AS (
+        SELECT id, status
+        FROM appointments
+        WHERE id = $1 AND master_id = $2
+          AND status IN ('pending', 'confirmed') AND status <> $3
+        FOR UPDATE
+    ),
+    updated AS (
+        UPDATE appointments a
+        SET status = $3
+        FROM old
+        WHERE a.id = old.id
+        RETURNING a.id, a.client_id, a.master_id, a.service_id, a.start_time, a.end_time,
+                  a.status, a.price, old.status AS old_status
+    ),
+    event AS (
+        INSERT INTO outbox (event_type, payload)
+        SELECT 'appointment.status_changed', jsonb_build_object(
+            'appointment_id', u.id, 'master_id', u.master_id, 'service_id', u.service_id,
+            'start_time', u.start_time, 'price', u.price,
+            'old_status', u.old_status, 'new_status', u.status, 'changed_by', 'master'
+        )
+        FROM updated u
+    )
+    SELECT u.id, u.master_id, u.service_id, u.start_time, u.end_time, u.status, u.old_status, u.price,
+           c.telegram_id AS client_telegram_id, c.full_name AS client_name,
+           s.name AS service_name
+    FROM updated u
+    JOIN services s ON s.id = u.service_id
+    LEFT JOIN clients c ON c.id = u.client_id
+"""
+
+SQL_APPOINTMENT_DETAILS = """
+    SELECT a.id, a.master_id, a.start_time, a.end_time, a.status, a.price,
+           c.telegram_id AS client_telegram_id, c.full_name AS client_name,
+           s.name AS service_name,
+           m.full_name AS master_name, m.telegram_id AS master_telegram_id
+    FROM appointments a
+    JOIN services s ON s.id = a.service_id
+    JOIN masters m ON m.id = a.master_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.id = $1
+"""
+
+# Рабочие интервалы мастера и занятые интервалы за период одним запросом,
+# отсортированные по началу (kind: 's' - расписание, 'a' - запись)
+SQL_MASTER_AVAILABILITY_DATA = """
+    SELECT 's' AS kind, date + start_time AS starts_at, date + end_time AS ends_at
+    FROM master_schedule
+    WHERE master_id = $1 AND date BETWEEN $2 AND $3
+    UNION ALL
+    SELECT 'a' AS kind, start_time AS starts_at, end_time AS ends_at
+    FROM appointments
+    WHERE master_id = $1
+      AND status IN ('pending', 'confirmed')
+      AND start_time < ($3::date + 1)::timestamp
+      AND end_time > $2::date::timestamp
+    ORDER BY starts_at
+"""
+
+# Свободная емкость мастера по дням за период одним запросом: сетка
+# возможных начал визита строится generate_series по расписанию, слоты,
+# пересекающиеся с активными записями, отбрасываются
+SQL_MONTH_FREE_CAPACITY = """
+    WITH slots AS (
+        SELECT ms.date, gs AS slot_start
+        FROM master_schedule ms,
+             generate_series(
+                 ms.date + ms.start_time,
+                 ms.date + ms.end_time - make_interval(mins => $2),
+                 make_interval(mins => $5)
+             ) AS gs
+        WHERE ms.master_id = $1 AND ms.date BETWEEN $3 AND $4
+    )
+    SELECT sl.date, COUNT(*) AS free_slots
+    FROM slots sl
+    WHERE sl.slot_start >= LOCALTIMESTAMP
+      AND NOT EXISTS (
+          SELECT 1
+          FROM appointments a
+          WHERE a.master_id = $1
+            AND a.status IN ('pending', 'confirmed')
+            AND a.start_time < sl.slot_start + make_interval(mins => $2)
+            AND a.end_time > sl.slot_start
+      )
+    GROUP BY sl.date
+    ORDER BY sl.date
+"""
+
+# Создание записи одним выражением: клиент создается или обновляется,
+# запись вставляется без блокировок. Пересечение с другой активной записью
+# мастера отсекает ограничение appointments_no_overlap
+SQL_CREATE_APPOINTMENT = """
+    WITH client AS (
+        INSERT INTO clients (telegram_id, full_name)
+        VALUES ($1, $2)
+        ON CONFLICT (telegram_id) DO UPDATE SET full_name = EXCLUDED.full_name
+        RETURNING id, (xmax = 0) AS is_new
+    ),
+    created AS (
+        INSERT INTO appointments (client_id, master_id, service_id, start_time, end_time, price)
+        SELECT client.id, $3, $4, $5::timestamp, $5::timestamp + make_interval(mins => $6), $7
+        FROM client
+        RETURNING id, master_id, service_id, start_time, price
+    ),
+    event AS (
+        INSERT INTO outbox (event_type, payload)
+        SELECT 'appointment.created', jsonb_build_object(
+            'appointment_id', a.id, 'master_id', a.master_id, 'service_id', a.service_id,
+            'start_time', a.start_time, 'price', a.price,
+            'old_status', NULL, 'new_status', 'pending', 'changed_by', 'client',
+            'is_new_client', client.is_new
+        )
+        FROM created a, client
+    )
+    SELECT id FROM created
+"""
+
+SQL_CLIENT_APPOINTMENTS = """
+    SELECT a.id, a.master_id, a.start_time, a.end_time, a.status, a.price,
+           s.name AS service_name, m.full_name AS master_name
+    FROM clients c
+    JOIN appointments a ON a.client_id = c.id
+    JOIN services s ON s.id = a.service_id
+    JOIN masters m ON m.id = a.master_id
+    WHERE c.telegram_id = $1
+    ORDER BY a.start_time DESC, a.id DESC
+    LIMIT $2
+"""
+
+SQL_CLIENT_APPOINTMENTS_OLDER = """
+    SELECT a.id, a.master_id, a.start_time, a.end_time, a.status, a.price,
+           s.name AS service_name, m.full_name AS master_name
+    FROM clients c
+    JOIN appointments a ON a.client_id = c.id
+    JOIN services s ON s.id = a.service_id
+    JOIN masters m ON m.id = a.master_id
+    WHERE c.telegram_id = $1 AND (a.start_time, a.id) < ($2, $3)
+    ORDER BY a.start_time DESC, a.id DESC
+    LIMIT $4
+"""
+
+SQL_CLIENT_APPOINTMENTS_NEWER = """
+    SELECT a.id, a.master_id, a.start_time, a.end_time, a.status, a.price,
+           s.name AS service_name, m.full_name AS master_name
+    FROM clients c
+    JOIN appointments a ON a.client_id = c.id
+    JOIN services s ON s.id = a.service_id
+    JOIN masters m ON m.id = a.master_id
+    WHERE c.telegram_id = $1 AND (a.start_time, a.id) > ($2, $3)
+    ORDER BY a.start_time, a.id
+    LIMIT $4
+"""
+
+# Клиент может отменить только свою запись, ожидающую подтверждения
+SQL_CANCEL_CLIENT_APPOINTMENT = """
+    WITH cancelled AS (
+        UPDATE appointments a
+        SET status = 'cancelled'
+        FROM clients c
+        WHERE a.id = $1
+          AND a.client_id = c.id
+          AND c.telegram_id = $2
+          AND a.status = 'pending'
+        RETURNING a.id, a.master_id, a.service_id, a.start_time, a.price
+    ),
+    event AS (
+        INSERT INTO outbox (event_type, payload)
+        SELECT 'appointment.status_changed', jsonb_build_object(
+            'appointment_id', x.id, 'master_id', x.master_id, 'service_id', x.service_id,
+            'start_time', x.start_time, 'price', x.price,
+            'old_status', 'pending', 'new_status', 'cancelled', 'changed_by', 'client'
+        )
+        FROM cancelled x
+    )
+    SELECT x.id, x.master_id, x.service_id, x.start_time, x.price,
+           s.name AS service_name,
+           m.full_name AS master_name, m.telegram_id AS master_telegram_id
+    FROM cancelled x
+    JOIN services s ON s.id = x.service_id
+    JOIN masters m ON m.id = x.master_id
+"""
+
+SQL_CATALOG_MASTERS = """
+    SELECT id, telegram_id, full_name, experience
+    FROM masters
+    WHERE is_active
+    ORDER BY id
+"""
+
+SQL_CATALOG_SERVICES = """
+    SELECT s.id, s.master_id, s.name, s.description, s.duration_minutes, s.price
+    FROM services s
+    JOIN masters m ON m.id = s.master_id
+    WHERE s.is_active AND m.is_active
+    ORDER BY s.master_id, s.id
+"""
+
+# Забрать в аренду пачку визитов, по которым пора напомнить. SKIP LOCKED
+# и аренда позволяют нескольким процессам сканировать параллельно без
+# дублей; отправленным визит отмечает SQL_MARK_REMINDERS_SENT. Записи,
+# созданные меньше чем за lead до визита, попадают в ближайший скан
+SQL_CLAIM_DUE_REMINDERS = """
+    WITH due AS (
+        SELECT id
+        FROM appointments
+        WHERE reminder_sent_at IS NULL
+          AND status IN ('pending', 'confirmed')
+          AND start_time > LOCALTIMESTAMP
+          AND start_time <= LOCALTIMESTAMP + $1::interval
+          AND (reminder_leased_until IS NULL OR reminder_leased_until <= LOCALTIMESTAMP)
+        ORDER BY start_time
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    ),
+    claimed AS (
+        UPDATE appointments a
+        SET reminder_leased_until = LOCALTIMESTAMP + $3::interval
+        FROM due
+        WHERE a.id = due.id
+        RETURNING a.id, a.client_id, a.master_id, a.service_id, a.start_time
+    )
+    SELECT x.id, x.start_time,
+           c.telegram_id AS client_telegram_id,
+           s.name AS service_name,
+           m.full_name AS master_name
+    FROM claimed x
+    JOIN clients c ON c.id = x.client_id
+    JOIN services s ON s.id = x.service_id
+    JOIN masters m ON m.id = x.master_id
+"""
+
+SQL_MARK_REMINDERS_SENT = """
+    UPDATE appointments
+    SET reminder_sent_at = LOCALTIMESTAMP,
+        reminder_leased_until = NULL
+    WHERE id = ANY($1::int[])
+"""
+
+# Инкрементальное обновление дневных агрегатов статистики: одна строка дня
+# и счетчики мастера и услуги за день обновляются одним запросом.
+# Применяется обработчиком outbox (bot/utils/outbox.py) пачками
+SQL_APPLY_BOOKING_STATS = """
+    WITH day_stats AS (
+        INSERT INTO daily_stats AS d (
+            day, bookings_total, bookings_pending, bookings_confirmed,
+            bookings_completed, bookings_cancelled, revenue, paid_bookings
+        )
+        VALUES ($1, $4, $5, $6, $7, $8, $9, $10)
+        ON CONFLICT (day) DO UPDATE SET
+            bookings_total = d.bookings_total + EXCLUDED.bookings_total,
+            bookings_pending = d.bookings_pending + EXCLUDED.bookings_pending,
+            bookings_confirmed = d.bookings_confirmed + EXCLUDED.bookings_confirmed,
+            bookings_completed = d.bookings_completed + EXCLUDED.bookings_completed,
+            bookings_cancelled = d.bookings_cancelled + EXCLUDED.bookings_cancelled,
+            revenue = d.revenue + EXCLUDED.revenue,
+            paid_bookings = d.paid_bookings + EXCLUDED.paid_bookings
+    ),
+    master_stats AS (
+        INSERT INTO daily_master_stats AS d (day, master_id, bookings)
+        VALUES ($1, $2, $11)
+        ON CONFLICT (day, master_id) DO UPDATE SET bookings = d.bookings + EXCLUDED.bookings
+    )
+    INSERT INTO daily_service_stats AS d (day, service_id, bookings)
+    VALUES ($1, $3, $11)
+    ON CONFLICT (day, service_id) DO UPDATE SET bookings = d.bookings + EXCLUDED.bookings
+"""
+
+SQL_APPLY_NEW_CLIENT_STATS = """
+    WITH day_stats AS (
+        INSERT INTO daily_stats AS d (day, new_clients)
+        VALUES ($1, $2)
+        ON CONFLICT (day) DO UPDATE SET new_clients = d.new_clients + EXCLUDED.new_clients
+    )
+    UPDATE stats_totals SET clients_total = clients_total + $2 WHERE id = 1
+"""
+
+# Статистика дня: чтение строки агрегата по ключу и лучших мастера
+# и услуги дня по индексу (day, bookings DESC), без сканирования appointments
+SQL_DAILY_STATS = """
+    SELECT p.day,
+           COALESCE(d.new_clients, 0) AS new_clients,
+           (SELECT clients_total FROM stats_totals WHERE id = 1) AS clients_total,
+           COALESCE(d.bookings_total, 0) AS bookings_total,
+           COALESCE(d.bookings_pending, 0) AS bookings_pending,
+           COALESCE(d.bookings_confirmed, 0) AS bookings_confirmed,
+           COALESCE(d.bookings_completed, 0) AS bookings_completed,
+           COALESCE(d.bookings_cancelled, 0) AS bookings_cancelled,
+           COALESCE(d.revenue, 0) AS revenue,
+           COALESCE(d.paid_bookings, 0) AS paid_bookings,
+           tm.full_name AS top_master_name, tm.bookings AS top_master_bookings,
+           ts.name AS top_service_name, ts.bookings AS top_service_bookings
+    FROM (SELECT $1::date AS day) p
+    LEFT JOIN daily_stats d ON d.day = p.day
+    LEFT JOIN LATERAL (
+        SELECT m.full_name, x.bookings
+        FROM daily_master_stats x
+        JOIN masters m ON m.id = x.master_id
+        WHERE x.day = p.day AND x.bookings > 0
+        ORDER BY x.bookings DESC
+        LIMIT 1
+    ) tm ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT s.name, x.bookings
+        FROM daily_service_stats x
+        JOIN services s ON s.id = x.service_id
+        WHERE x.day = p.day AND x.bookings > 0
+        ORDER BY x.bookings DESC
+        LIMIT 1
+    ) ts ON TRUE
+"""
+
+SQL_EXPORT_APPOINTMENTS = """
+    SELECT a.id, a.start_time, a.status, a.price,
+           m.full_name AS master_name, s.name AS service_name, c.full_name AS client_name
+    FROM appointments a
+    JOIN masters m ON m.id = a.master_id
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.start_time >= $1::date::timestamp
+      AND a.start_time < ($2::date + 1)::timestamp
+    ORDER BY a.start_time, a.id
+"""
+
+# Outbox: события забираются в аренду (available_at сдвигается на lease),
+# так что после падения обработчика они вернутся в очередь сами.
+# SKIP LOCKED не дает двум процессам забрать одно событие
+SQL_CLAIM_OUTBOX_EVENTS = """
+    WITH due AS (
+        SELECT id
+        FROM outbox
+        WHERE processed_at IS NULL
+          AND available_at <= LOCALTIMESTAMP
+          AND attempts < $3
+        ORDER BY available_at, id
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE outbox o
+    SET attempts = o.attempts + 1,
+        available_at = LOCALTIMESTAMP + $2::interval
+    FROM due
+    WHERE o.id = due.id
+    RETURNING o.id, o.event_type, o.payload, o.handled, o.attempts, o.created_at
+"""
+
+SQL_OUTBOX_APPOINTMENTS = """
+    SELECT a.id, a.start_time,
+           c.telegram_id AS client_telegram_id, c.full_name AS client_name,
+           m.telegram_id AS master_telegram_id, m.full_name AS master_name,
+           s.name AS service_name
+    FROM appointments a
+    JOIN masters m ON m.id = a.master_id
+    JOIN services s ON s.id = a.service_id
+    LEFT JOIN clients c ON c.id = a.client_id
+    WHERE a.id = ANY($1::int[])
+"""
+
+# Отметка обработчика на событиях. Возвращает только события, которые
+# этот обработчик еще не видел: повтор события их не применит второй раз
+SQL_MARK_OUTBOX_HANDLED = """
+    UPDATE outbox
+    SET handled = array_append(handled, $2)
+    WHERE id = ANY($1::bigint[]) AND NOT ($2 = ANY(handled))
+    RETURNING id
+"""
+
+SQL_EXTEND_OUTBOX_LEASE = """
+    UPDATE outbox
+    SET available_at = LOCALTIMESTAMP + $2::interval
+    WHERE id = ANY($1::bigint[])
+      AND processed_at IS NULL
+"""
+
+SQL_COMPLETE_OUTBOX_EVENTS = """
+    UPDATE outbox
+    SET processed_at = LOCALTIMESTAMP, last_error = NULL
+    WHERE id = ANY($1::bigint[])
+    RETURNING EXTRACT(EPOCH FROM LOCALTIMESTAMP - created_at)::float8 AS lag
+"""
+
+SQL_RETRY_OUTBOX_EVENT = """
+    UPDATE outbox
+    SET handled = ARRAY(SELECT DISTINCT unnest(handled || $2::text[])),
+        last_error = $3,
+        available_at = LOCALTIMESTAMP + $4::interval
+    WHERE id = $1
+"""
+
+SQL_PURGE_OUTBOX = """
+    DELETE FROM outbox
+    WHERE processed_at < LOCALTIMESTAMP - $1::interval
+"""
+
+# Лимит по умолчанию, чтобы не тянуть всю историю мастера по сети
+DEFAULT_APPOINTMENTS_LIMIT = 50
+
+# Размер страницы в списках записей по умолчанию
+DEFAULT_PAGE_SIZE = 10
+
+# Направление листания: дальше по списку или обратно
+PAGE_NEXT = 'next'
+PAGE_PREV = 'prev'
+
+# Имя ограничения, запрещающего пересечение записей мастера
+NO_OVERLAP_CONSTRAINT = 'appointments_no_overlap'
+
+
+# Типы событий outbox (event_type в SQL выше)
+EVENT_APPOINTMENT_CREATED = 'appointment.created'
+EVENT_APPOINTMENT_STATUS_CHANGED = 'appointment.status_changed'
+
+# Обработчик outbox, который применяет события к статистике
+OUTBOX_HANDLER_STATS = 'stats'
+
+
+# Статусы, которые учитываются в выручке
+PAID_STATUSES = ('confirmed', 'completed')
+APPOINTMENT_STATUSES = ('pending', 'confirmed', 'completed', 'cancelled')
+
+
+def booking_stats_delta(appointment, old_status: Optional[str], new_status: str) -> tuple:
+    """Аргументы SQL_APPLY_BOOKING_STATS для перехода записи old_status -> new_status.
+
+    old_status=None означает новую запись.
+    """
+    by_status = dict.fromkeys(APPOINTMENT_STATUSES, 0)
+    if old_status is not None:
+        by_status[old_status] -= 1
+    by_status[new_status] += 1
+
+    paid = (new_status in PAID_STATUSES) - (old_status in PAID_STATUSES)
+    # Мастер и услуга дня ранжируются по неотмененным записям
+    active = (new_status != 'cancelled') - (old_status not in (None, 'cancelled'))
+
+    return (
+        appointment['start_time'].date(),
+        appointment['master_id'],
+        appointment['service_id'],
+        0 if old_status is not None else 1,
+        by_status['pending'],
+        by_status['confirmed'],
+        by_status['completed'],
+        by_status['cancelled'],
+        paid * (appointment['price'] or 0),
+        paid,
+        active
+    )
+
+
+class SlotTakenError(Exception):
+    """Выбранное время уже занято другой записью"""
+
+
+@dataclass
+class AppointmentsPage:
+    """Страница списка записей.
+
+    Курсор следующей страницы - (start_time, id) последней строки,
+    предыдущей - первой строки.
+    """
+    rows: List[asyncpg.Record]
+    has_prev: bool
+    has_next: bool
+
+    @property
+    def first_key(self) -> Tuple[datetime, int]:
+        return self.rows[0]['start_time'], self.rows[0]['id']
+
+    @property
+    def last_key(self) -> Tuple[datetime, int]:
+        return self.rows[-1]['start_time'], self.rows[-1]['id']
+
+
+def client_key(client_telegram_id: int) -> Tuple[str, int]:
+    """Ключ read-your-writes для данных клиента"""
+    return ('client', client_telegram_id)
+
+
+def master_key(master_id: int) -> Tuple[str, int]:
+    """Ключ read-your-writes для записей и расписания мастера"""
+    return ('master', master_id)
+
+
+class CRUD:
+    """Асинхронный слой доступа к данным поверх пулов Database.
+
+    Запись и чтения, от которых зависит следующая запись, идут в основной
+    пул. Просмотр (каталог, свободное время, списки записей, статистика) -
+    в реплику, кроме ключей с только что записанными данными.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def _pool(self, readonly: bool, fresh_for: Tuple[Hashable, ...]):
+        """Основной пул или, для чтения, реплика"""
+        return self.db.read_pool(*fresh_for) if readonly else self.db.pool
+
+    @asynccontextmanager
+    async def _acquire(self, readonly: bool = False, fresh_for: Tuple[Hashable, ...] = ()):
+        """Взять соединение из пула на один запрос"""
+        async with self._pool(readonly, fresh_for).acquire() as conn:
+            yield conn
+
+    async def get_master_by_telegram_id(self, telegram_id: int) -> Optional[asyncpg.Record]:
+        """Получить активного мастера по telegram_id"""
+        async with self._acquire(readonly=True) as conn:
+            return await conn.fetchrow(SQL_MASTER_BY_TELEGRAM_ID, telegram_id)
+
+    async def get_master_appointments(
+        self,
+        master_id: int,
+        status: Optional[str] = None,
+        limit: Optional[int] = DEFAULT_APPOINTMENTS_LIMIT
+    ) -> List[asyncpg.Record]:
+        """Получить записи мастера (фильтр и лимит выполняются в БД).
+
+        limit=None снимает ограничение (LIMIT NULL в PostgreSQL).
+        """
+        async with self._acquire(readonly=True, fresh_for=(master_key(master_id),)) as conn:
+            if status is None:
+                return await conn.fetch(SQL_MASTER_APPOINTMENTS, master_id, limit)
+            return await conn.fetch(SQL_MASTER_APPOINTMENTS_BY_STATUS, master_id, status, limit)
+
+    async def _fetch_page(
+        self,
+        forward_sql: str,
+        backward_sql: str,
+        args: tuple,
+        origin: Tuple[datetime, int],
+        cursor: Optional[Tuple[datetime, int]],
+        direction: str,
+        page_size: int,
+        fresh_for: Hashable
+    ) -> AppointmentsPage:
+        """Прочитать страницу по ключу (start_time, id).
+
+        Читается на одну строку больше страницы: так без COUNT(*)
+        видно, есть ли что-то дальше в этом направлении.
+        """
+        if cursor is None:
+            cursor, direction = origin, PAGE_NEXT
+            has_before = False
+        else:
+            has_before = True
+
+        sql = forward_sql if direction == PAGE_NEXT else backward_sql
+        async with self._acquire(readonly=True, fresh_for=(fresh_for,)) as conn:
+            rows = await conn.fetch(sql, *args, cursor[0], cursor[1], page_size + 1)
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == PAGE_NEXT:
+            return AppointmentsPage(rows, has_prev=has_before, has_next=has_more)
+        rows.reverse()
+        return AppointmentsPage(rows, has_prev=has_more, has_next=True)
+
+    async def get_master_appointments_page(
+        self,
+        master_id: int,
+        status: Optional[str] = None,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        direction: str = PAGE_NEXT,
+        page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AppointmentsPage:
+        """Страница записей мастера.
+
+        Без статуса - от новых к старым, со статусом - по времени визита.
+        cursor=None - первая страница.
+        """
+        if status is None:
+            return await self._fetch_page(
+                SQL_MASTER_APPOINTMENTS_OLDER, SQL_MASTER_APPOINTMENTS_NEWER,
+                (master_id,), (datetime.max, 0), cursor, direction, page_size, master_key(master_id)
+            )
+        return await self._fetch_page(
+            SQL_MASTER_STATUS_LATER, SQL_MASTER_STATUS_EARLIER,
+            (master_id, status), (datetime.min, 0), cursor, direction, page_size, master_key(master_id)
+        )
+
+    async def get_master_dashboard(self, master_id: int) -> asyncpg.Record:
+        """Счетчики панели мастера: total, pending, today"""
+        async with self._acquire(readonly=True, fresh_for=(master_key(master_id),)) as conn:
+            return await conn.fetchrow(SQL_MASTER_DASHBOARD, master_id)
+
+    async def update_appointment_status(
+        self,
+        appointment_id: int,
+        master_id: int,
+        status: str
+    ) -> Optional[asyncpg.Record]:
+        """Изменить статус записи мастера.
+
+        Возвращает детали обновленной записи или None, если запись
+        не найдена, принадлежит другому мастеру или уже не активна.
+        Событие outbox пишется тем же запросом.
+        """
+        async with self._acquire() as conn:
+            appointment = await conn.fetchrow(
+                SQL_UPDATE_APPOINTMENT_STATUS, appointment_id, master_id, status
+            )
+        if appointment:
+            self.db.mark_written(master_key(master_id), client_key(appointment['client_telegram_id']))
+        return appointment
+
+    async def get_appointment_details(self, appointment_id: int) -> Optional[asyncpg.Record]:
+        """Получить детали записи вместе с клиентом, мастером и услугой"""
+        async with self._acquire() as conn:
+            return await conn.fetchrow(SQL_APPOINTMENT_DETAILS, appointment_id)
+
+    async def get_master_availability_data(
+        self,
+        master_id: int,
+        date_from: date,
+        date_to: date
+    ) -> Tuple[List[Tuple[datetime, datetime]], List[Tuple[datetime, datetime]]]:
+        """Получить расписание и занятые интервалы мастера за период.
+
+        Возвращает два отсортированных по началу списка:
+        рабочие интервалы и интервалы существующих записей.
+        """
+        async with self._acquire(readonly=True, fresh_for=(master_key(master_id),)) as conn:
+            rows = await conn.fetch(SQL_MASTER_AVAILABILITY_DATA, master_id, date_from, date_to)
+
+        schedule = []
+        busy = []
+        for row in rows:
+            interval = (row['starts_at'], row['ends_at'])
+            if row['kind'] == 's':
+                schedule.append(interval)
+            else:
+                busy.append(interval)
+        return schedule, busy
+
+    async def get_month_free_capacity(
+        self,
+        master_id: int,
+        duration_minutes: int,
+        date_from: date,
+        date_to: date,
+        step_minutes: int
+    ) -> Dict[date, int]:
+        """Получить число свободных слотов по дням (только дни, где они есть)"""
+        async with self._acquire(readonly=True, fresh_for=(master_key(master_id),)) as conn:
+            rows = await conn.fetch(
+                SQL_MONTH_FREE_CAPACITY, master_id, duration_minutes, date_from, date_to, step_minutes
+            )
+        return {row['date']: row['free_slots'] for row in rows}
+
+    async def create_appointment(
+        self,
+        client_telegram_id: int,
+        client_name: Optional[str],
+        master_id: int,
+        service_id: int,
+        start_time: datetime,
+        duration_minutes: int,
+        price: Optional[int]
+    ) -> int:
+        """Создать запись и вернуть ее id.
+
+        Без явных блокировок: одновременные попытки занять разные слоты
+        не мешают друг другу, а при пересечении со свежей записью мастера
+        выбрасывается SlotTakenError. Событие outbox пишется тем же
+        запросом, поэтому отдельная транзакция не нужна.
+        """
+        async with self._acquire() as conn:
+            try:
+                created = await conn.fetchrow(
+                    SQL_CREATE_APPOINTMENT,
+                    client_telegram_id, client_name, master_id, service_id,
+                    start_time, duration_minutes, price
+                )
+            except asyncpg.ExclusionViolationError as e:
+                if e.constraint_name != NO_OVERLAP_CONSTRAINT:
+                    raise
+                # Альтернативные слоты читаются после этого: реплика может
+                # еще не знать о записи, которая заняла слот
+                self.db.mark_written(master_key(master_id))
+                raise SlotTakenError(f"Слот {start_time} у мастера {master_id} уже занят") from e
+        self.db.mark_written(master_key(master_id), client_key(client_telegram_id))
+        return created['id']
+
+    async def get_client_appointments(
+        self,
+        client_telegram_id: int,
+        limit: int = DEFAULT_APPOINTMENTS_LIMIT
+    ) -> List[asyncpg.Record]:
+        """Получить записи клиента (последние сначала)"""
+        async with self._acquire(readonly=True, fresh_for=(client_key(client_telegram_id),)) as conn:
+            return await conn.fetch(SQL_CLIENT_APPOINTMENTS, client_telegram_id, limit)
+
+    async def get_client_appointments_page(
+        self,
+        client_telegram_id: int,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        direction: str = PAGE_NEXT,
+        page_size: int = DEFAULT_PAGE_SIZE
+    ) -> AppointmentsPage:
+        """Страница записей клиента (последние сначала)"""
+        return await self._fetch_page(
+            SQL_CLIENT_APPOINTMENTS_OLDER, SQL_CLIENT_APPOINTMENTS_NEWER,
+            (client_telegram_id,), (datetime.max, 0), cursor, direction, page_size,
+            client_key(client_telegram_id)
+        )
+
+    async def cancel_client_appointment(
+        self,
+        appointment_id: int,
+        client_telegram_id: int
+    ) -> Optional[asyncpg.Record]:
+        """Отменить запись клиента.
+
+        Возвращает детали отмененной записи или None, если запись не найдена,
+        чужая или уже не ожидает подтверждения. Событие outbox пишется
+        тем же запросом.
+        """
+        async with self._acquire() as conn:
+            cancelled = await conn.fetchrow(
+                SQL_CANCEL_CLIENT_APPOINTMENT, appointment_id, client_telegram_id
+            )
+        if cancelled:
+            self.db.mark_written(master_key(cancelled['master_id']), client_key(client_telegram_id))
+        return cancelled
+
+    async def get_catalog(self) -> Tuple[List[asyncpg.Record], List[asyncpg.Record]]:
+        """Получить активных мастеров и их услуги (для кэша каталога)"""
+        async with self._acquire(readonly=True) as conn:
+            masters = await conn.fetch(SQL_CATALOG_MASTERS)
+            services = await conn.fetch(SQL_CATALOG_SERVICES)
+        return masters, services
+
+    async def claim_due_reminders(self, lead: timedelta, limit: int, lease: timedelta) -> List[asyncpg.Record]:
+        """Забрать в аренду визиты в ближайшие lead, по которым еще не было напоминания.
+
+        Пока аренда не истекла, другие сканеры эти записи не берут.
+        """
+        async with self._acquire() as conn:
+            return await conn.fetch(SQL_CLAIM_DUE_REMINDERS, lead, limit, lease)
+
+    async def mark_reminders_sent(self, appointment_ids: List[int]):
+        """Отметить напоминания по записям отправленными"""
+        async with self._acquire() as conn:
+            await conn.execute(SQL_MARK_REMINDERS_SENT, appointment_ids)
+
+    async def get_daily_stats(self, day: date) -> asyncpg.Record:
+        """Получить статистику за день из инкрементальных агрегатов"""
+        async with self._acquire(readonly=True) as conn:
+            return await conn.fetchrow(SQL_DAILY_STATS, day)
+
+    async def iter_appointments_for_export(
+        self,
+        date_from: date,
+        date_to: date,
+        chunk_size: int
+    ) -> AsyncIterator[List[asyncpg.Record]]:
+        """Записи за период пачками через серверный курсор"""
+        async with self._acquire(readonly=True) as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(SQL_EXPORT_APPOINTMENTS, date_from, date_to)
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    async def claim_outbox_events(self, limit: int, lease: timedelta, max_attempts: int) -> List[asyncpg.Record]:
+        """Забрать в аренду до limit необработанных событий outbox"""
+        async with self._acquire() as conn:
+            return await conn.fetch(SQL_CLAIM_OUTBOX_EVENTS, limit, lease, max_attempts)
+
+    async def get_outbox_appointments(self, appointment_ids: List[int]) -> Dict[int, asyncpg.Record]:
+        """Записи событий с клиентом, мастером и услугой (для уведомлений)"""
+        async with self._acquire() as conn:
+            rows = await conn.fetch(SQL_OUTBOX_APPOINTMENTS, appointment_ids)
+        return {row['id']: row for row in rows}
+
+    async def apply_outbox_stats(self, booking_deltas: Dict[int, tuple], new_clients: Dict[int, date]):
+        """Применить события к дневной статистике ровно один раз.
+
+        booking_deltas - аргументы SQL_APPLY_BOOKING_STATS по id события,
+        new_clients - день появления нового клиента по id события.
+        Отметка на событии и агрегаты меняются в одной транзакции, а
+        дельты пачки складываются по ключу (день, мастер, услуга).
+        """
+        event_ids = list(booking_deltas.keys() | new_clients.keys())
+        async with self._acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(SQL_MARK_OUTBOX_HANDLED, event_ids, OUTBOX_HANDLER_STATS)
+                fresh = {row['id'] for row in rows}
+
+                totals: Dict[tuple, list] = {}
+                for event_id, delta in booking_deltas.items():
+                    if event_id not in fresh:
+                        continue
+                    key = delta[:3]
+                    counters = totals.setdefault(key, [0] * (len(delta) - 3))
+                    for i, value in enumerate(delta[3:]):
+                        counters[i] += value
+                # Строки агрегатов блокируются в одном порядке во всех
+                # пачках: параллельные пачки не попадут в deadlock
+                if totals:
+                    await conn.executemany(
+                        SQL_APPLY_BOOKING_STATS, [key + tuple(counters) for key, counters in sorted(totals.items())]
+                    )
+
+                clients_by_day: Dict[date, int] = {}
+                for event_id, day in new_clients.items():
+                    if event_id in fresh:
+                        clients_by_day[day] = clients_by_day.get(day, 0) + 1
+                if clients_by_day:
+                    await conn.executemany(SQL_APPLY_NEW_CLIENT_STATS, sorted(clients_by_day.items()))
+
+    async def extend_outbox_lease(self, event_ids: List[int], lease: timedelta):
+        """Продлить аренду событий, которые еще обрабатываются"""
+        async with self._acquire() as conn:
+            await conn.execute(SQL_EXTEND_OUTBOX_LEASE, event_ids, lease)
+
+    async def complete_outbox_events(self, event_ids: List[int]) -> List[float]:
+        """Отметить события обработанными, вернуть их задержку в секундах"""
+        async with self._acquire() as conn:
+            rows = await conn.fetch(SQL_COMPLETE_OUTBOX_EVENTS, event_ids)
+        return [row['lag'] for row in rows]
+
+    async def retry_outbox_event(self, event_id: int, handled: List[str], error: str, delay: timedelta):
+        """Вернуть событие в очередь через delay, запомнив отработавшие обработчики"""
+        async with self._acquire() as conn:
+            await conn.execute(SQL_RETRY_OUTBOX_EVENT, event_id, handled, error, delay)
+
+    async def purge_outbox(self, older_than: timedelta) -> int:
+        """Удалить события, обработанные раньше older_than"""
+        async with self._acquire() as conn:
+            result = await conn.execute(SQL_PURGE_OUTBOX, older_than)
+        return int(result.split()[-1])
+
+
+class _SharedConnection:
+    """Соединение апдейта из одного пула: берется при первом запросе"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+        # Запросы апдейта идут по соединению по очереди
+        self.lock = asyncio.Lock()
+
+
+class UpdateCRUD(CRUD):
+    """CRUD одного апдейта (см. bot/middlewares/db.py).
+
+    Соединение берется из пула при первом запросе и обслуживает все
+    запросы апдейта до release(): обработчик с несколькими запросами
+    платит за acquire один раз, а статичные экраны пул не трогают.
+    Чтения с реплики получают свое соединение из пула реплики.
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._shared: Dict[object, _SharedConnection] = {}
+        self._released = False
+
+    @asynccontextmanager
+    async def _acquire(self, readonly: bool = False, fresh_for: Tuple[Hashable, ...] = ()):
+        pool = self._pool(readonly, fresh_for)
+        shared = self._shared.get(pool)
+        if self._released or (shared is not None and shared.lock.locked()):
+            # Апдейт уже обработан (запрос из фоновой задачи) или соединение
+            # занято параллельным запросом - отдельное соединение из пула
+            async with pool.acquire() as conn:
+                yield conn
+            return
+
+        if shared is None:
+            shared = self._shared[pool] = _SharedConnection(pool)
+        async with shared.lock:
+            if shared.conn is None:
+                shared.conn = await pool.acquire()
+            try:
+                yield shared.conn
+            finally:
+                # release() прошел, пока шел запрос: вернуть соединение здесь
+                if self._released and shared.conn is not None:
+                    conn, shared.conn = shared.conn, None
+                    await pool.release(conn)
+
+    async def release(self):
+        """Вернуть соединения апдейта в пулы.
+
+        Соединение, по которому еще идет запрос, вернет сам запрос.
+        """
+        self._released = True
+        for shared in self._shared.values():
+            if shared.conn is not None and not shared.lock.locked():
+                conn, shared.conn = shared.conn, None
+                await shared.pool.release(conn)
@@ -0,0 +1,48 @@
+-- Индексы под запросы панели мастера. Списки листаются по ключу
+-- (start_time, id), а INCLUDE покрывает остальные поля строки
+DROP INDEX IF EXISTS idx_appointments_master_start;
+
+CREATE INDEX IF NOT EXISTS idx_appointments_master_page
+    ON appointments (master_id, start_time, id)
+    INCLUDE (status, price, end_time, client_id, service_id);
+
+CREATE INDEX IF NOT EXISTS idx_appointments_master_status_start
+    ON appointments (master_id, status, start_time, id);
+
+-- Запрет пересечения активных записей одного мастера.
+-- int4range вместо master_id позволяет обойтись без btree_gist:
+-- GiST умеет и равенство, и пересечение диапазонов из коробки
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'appointments_no_overlap'
+    ) THEN
+        ALTER TABLE appointments
+            ADD CONSTRAINT appointments_no_overlap
+            EXCLUDE USING gist (
+                int4range(master_id, master_id, '[]') WITH =,
+                tsrange(start_time, end_time) WITH &&
+            )
+            WHERE (status IN ('pending', 'confirmed'));
+    END IF;
+END
+$$;
+
+-- Записи клиента, постранично
+DROP INDEX IF EXISTS idx_appointments_client_start;
+
+CREATE INDEX IF NOT EXISTS idx_appointments_client_page
+    ON appointments (client_id, start_time, id)
+    INCLUDE (status, price, end_time, master_id, service_id);
+
+-- Напоминания: отметка об отправке хранится в самой записи, а частичный
+-- индекс содержит только визиты, по которым напоминание еще впереди
+ALTER TABLE appointments ADD COLUMN IF NOT EXISTS reminder_sent_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_appointments_reminder_due
+    ON appointments (start_time)
+    WHERE reminder_sent_at IS NULL AND status IN ('pending', 'confirmed');
+
+-- Выгрузка за период идет по порядку start_time
+CREATE INDEX IF NOT EXISTS idx_appointments_start
+    ON appointments (start_time, id);
@@ -0,0 +1,81 @@
+-- Таблицы дневных агрегатов для статистики администратора.
+-- Агрегаты обновляются при каждом изменении записи (см. database/crud.py)
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day DATE PRIMARY KEY,
+    new_clients INTEGER NOT NULL DEFAULT 0,
+    bookings_total INTEGER NOT NULL DEFAULT 0,
+    bookings_pending INTEGER NOT NULL DEFAULT 0,
+    bookings_confirmed INTEGER NOT NULL DEFAULT 0,
+    bookings_completed INTEGER NOT NULL DEFAULT 0,
+    bookings_cancelled INTEGER NOT NULL DEFAULT 0,
+    revenue BIGINT NOT NULL DEFAULT 0,
+    paid_bookings INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS daily_master_stats (
+    day DATE NOT NULL,
+    master_id INTEGER NOT NULL REFERENCES masters(id) ON DELETE CASCADE,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, master_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_daily_master_stats_top
+    ON daily_master_stats (day, bookings DESC);
+
+CREATE TABLE IF NOT EXISTS daily_service_stats (
+    day DATE NOT NULL,
+    service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, service_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_daily_service_stats_top
+    ON daily_service_stats (day, bookings DESC);
+
+CREATE TABLE IF NOT EXISTS stats_totals (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    clients_total INTEGER NOT NULL DEFAULT 0
+);
+
+-- Заполнение по уже существующим данным. Если агрегаты уже велись
+-- (база создана до миграций), записи не задваиваются
+INSERT INTO stats_totals (id, clients_total)
+SELECT 1, COUNT(*) FROM clients
+ON CONFLICT (id) DO UPDATE SET clients_total = EXCLUDED.clients_total;
+
+INSERT INTO daily_stats (
+    day, bookings_total, bookings_pending, bookings_confirmed,
+    bookings_completed, bookings_cancelled, revenue, paid_bookings
+)
+SELECT start_time::date,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE status = 'pending'),
+       COUNT(*) FILTER (WHERE status = 'confirmed'),
+       COUNT(*) FILTER (WHERE status = 'completed'),
+       COUNT(*) FILTER (WHERE status = 'cancelled'),
+       COALESCE(SUM(price) FILTER (WHERE status IN ('confirmed', 'completed')), 0),
+       COUNT(*) FILTER (WHERE status IN ('confirmed', 'completed'))
+FROM appointments
+WHERE NOT EXISTS (SELECT 1 FROM daily_stats)
+GROUP BY start_time::date;
+
+INSERT INTO daily_stats AS d (day, new_clients)
+SELECT created_at::date, COUNT(*)
+FROM clients
+GROUP BY created_at::date
+ON CONFLICT (day) DO UPDATE SET new_clients = EXCLUDED.new_clients;
+
+INSERT INTO daily_master_stats (day, master_id, bookings)
+SELECT start_time::date, master_id, COUNT(*)
+FROM appointments
+WHERE status <> 'cancelled'
+  AND NOT EXISTS (SELECT 1 FROM daily_master_stats)
+GROUP BY start_time::date, master_id;
+
+INSERT INTO daily_service_stats (day, service_id, bookings)
+SELECT start_time::date, service_id, COUNT(*)
+FROM appointments
+WHERE status <> 'cancelled'
+  AND NOT EXISTS (SELECT 1 FROM daily_service_stats)
+GROUP BY start_time::date, service_id;
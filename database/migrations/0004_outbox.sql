@@ -0,0 +1,22 @@
+-- Transactional outbox: событие об изменении записи пишется тем же
+-- запросом, что и само изменение, а побочные эффекты (уведомления,
+-- статистика, кэши) выполняет bot/utils/outbox.py
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(50) NOT NULL,
+    payload JSONB NOT NULL,
+    -- Обработчики, уже отработавшие событие: при повторе они пропускаются
+    handled TEXT[] NOT NULL DEFAULT '{}',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    -- Раньше этого времени событие не забирается (аренда и повтор после ошибки)
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+-- Очередь необработанных событий: обработанные в индекс не попадают
+CREATE INDEX IF NOT EXISTS idx_outbox_pending
+    ON outbox (available_at, id)
+    WHERE processed_at IS NULL;
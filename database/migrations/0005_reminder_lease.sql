@@ -0,0 +1,4 @@
+-- Аренда напоминаний: сканер помечает визит на время отправки, а
+-- reminder_sent_at ставится только после ответа Telegram. Если процесс
+-- упал, не дождавшись ответа, аренда истекает и напоминание уходит снова
+ALTER TABLE appointments ADD COLUMN IF NOT EXISTS reminder_leased_until TIMESTAMP;
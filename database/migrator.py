@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Имя файла миграции: "0001_initial_schema.sql"
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Ключ advisory-блокировки: несколько процессов бота, стартующих
+# одновременно, применяют миграции по очереди
+MIGRATION_LOCK_ID = 7_210_001
+
+SQL_APPLIED_VERSIONS = "SELECT version, checksum FROM schema_version ORDER BY version"
+
+SQL_CREATE_SCHEMA_VERSION = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(200) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+SQL_RECORD_VERSION = '''
+    INSERT INTO schema_version (version, name, checksum)
+    VALUES ($1, $2, $3)
+'''
+
+
+class MigrationError(RuntimeError):
+    """Схема базы не согласуется с файлами миграций"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+    checksum: str
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Прочитать файлы миграций по порядку версий"""
+    migrations: Dict[int, Migration] = {}
+
+    for path in sorted(directory.glob("*.sql")):
+        match = MIGRATION_FILE_RE.match(path.name)
+        if not match:
+            raise MigrationError(f"Некорректное имя файла миграции: {path.name}")
+
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Повторяется версия миграции {version}: {path.name}")
+
+        sql = path.read_text(encoding="utf-8")
+        migrations[version] = Migration(
+            version=version,
+            name=match.group(2),
+            sql=sql,
+            checksum=hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        )
+
+    return [migrations[version] for version in sorted(migrations)]
+
+
+async def _applied_versions(conn) -> Dict[int, str]:
+    try:
+        rows = await conn.fetch(SQL_APPLIED_VERSIONS)
+    except asyncpg.UndefinedTableError:
+        # База еще не знает о миграциях
+        return {}
+    return {row['version']: row['checksum'].strip() for row in rows}
+
+
+def _pending(migrations: List[Migration], applied: Dict[int, str]) -> List[Migration]:
+    """Сверить примененные миграции с файлами и вернуть ожидающие"""
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is not None and checksum != migration.checksum:
+            raise MigrationError(
+                f"Миграция {migration.version:04d}_{migration.name} изменена после применения"
+            )
+
+    known = {migration.version for migration in migrations}
+    unknown = sorted(set(applied) - known)
+    if unknown:
+        # База новее кода (например, откат релиза): работаем, но предупреждаем
+        logger.warning(f"⚠️ В базе применены неизвестные миграции: {unknown}")
+
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+async def _apply_pending(conn, migrations: List[Migration]) -> List[Migration]:
+    await conn.execute(SQL_CREATE_SCHEMA_VERSION)
+    # Пока ждали блокировку, миграции мог применить другой процесс
+    pending = _pending(migrations, await _applied_versions(conn))
+
+    for migration in pending:
+        logger.info(f"🛠 Применяем миграцию {migration.version:04d}_{migration.name}...")
+        async with conn.transaction():
+            await conn.execute(migration.sql)
+            await conn.execute(
+                SQL_RECORD_VERSION,
+                migration.version, migration.name, migration.checksum
+            )
+    return pending
+
+
+async def migrate(pool, migrations: List[Migration] = None, transaction_lock: bool = False) -> int:
+    """Привести схему к последней версии, вернуть число примененных миграций.
+
+    Если схема актуальна, стоит одного запроса к schema_version. Иначе
+    миграции применяются под advisory-блокировкой, каждая в своей
+    транзакции вместе с записью о версии.
+
+    transaction_lock=True - для pgbouncer в режиме transaction, где
+    сессионная блокировка может остаться на чужом серверном соединении:
+    все миграции идут одной транзакцией под pg_advisory_xact_lock.
+    """
+    if migrations is None:
+        migrations = load_migrations()
+
+    async with pool.acquire() as conn:
+        if not _pending(migrations, await _applied_versions(conn)):
+            logger.info("✅ Схема базы актуальна")
+            return 0
+
+        if transaction_lock:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK_ID)
+                pending = await _apply_pending(conn, migrations)
+        else:
+            await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+            try:
+                pending = await _apply_pending(conn, migrations)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    if pending:
+        logger.info(f"✅ Применено миграций: {len(pending)}")
+    return len(pending)
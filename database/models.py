@@ -1,13 +1,98 @@
 import asyncpg
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Hashable
 from datetime import datetime, date, time
 import logging
+from time import monotonic
+
+from database.migrator import migrate
 
 logger = logging.getLogger(__name__)
 
+# Размер кэша подготовленных выражений asyncpg на одно соединение
+STATEMENT_CACHE_SIZE = 256
+
+# Размер пула по умолчанию (DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE).
+# Под супервизором пул у каждого воркера свой
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 10
+
+# Сколько секунд после записи чтения по тем же ключам идут в основную базу
+DEFAULT_READ_YOUR_WRITES_SECONDS = 5
+
+# Выше этого числа отметок о записях истекшие вычищаются
+MAX_WRITE_MARKS = 10_000
+
+
+def _flag(value) -> bool:
+    return str(value or "").lower() in ("1", "true", "yes")
+
+
 class Database:
+    """Пулы соединений: основной (запись и свежие чтения) и реплика.
+
+    Без DB_REPLICA_HOST реплики нет и все запросы идут в основной пул.
+    Реплику можно направить и на основной сервер: тогда просмотр каталога
+    и расписаний получает свой пул и не занимает соединения подтверждений.
+    """
+
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        self.replica_pool: Optional[asyncpg.Pool] = None
+        self.read_your_writes_seconds: float = DEFAULT_READ_YOUR_WRITES_SECONDS
+        # Ключ (например, ("client", telegram_id)) -> до какого момента
+        # его чтения идут в основной пул
+        self._write_marks: Dict[Hashable, float] = {}
+
+    def mark_written(self, *keys: Hashable):
+        """Запомнить запись по ключам: их чтения какое-то время идут в основной пул"""
+        if self.replica_pool is None:
+            return
+        now = monotonic()
+        if len(self._write_marks) >= MAX_WRITE_MARKS:
+            self._write_marks = {
+                key: until for key, until in self._write_marks.items() if until > now
+            }
+        until = now + self.read_your_writes_seconds
+        for key in keys:
+            self._write_marks[key] = until
+
+    def read_pool(self, *keys: Hashable):
+        """Пул для чтения: реплика, если по ключам не было свежих записей.
+
+        Реплика отстает от основной базы, поэтому пользователь, который
+        только что записался или отменил запись, читает из основной.
+        """
+        if self.replica_pool is None:
+            return self.pool
+        if keys:
+            now = monotonic()
+            for key in keys:
+                until = self._write_marks.get(key)
+                if until is not None and until > now:
+                    return self.pool
+        return self.replica_pool
+
+    @staticmethod
+    def _pool_options(config, prefix: str, defaults: Dict[str, int]) -> Dict[str, Any]:
+        min_size = int(getattr(config, f"{prefix}_MIN_SIZE", None) or defaults["min_size"])
+        max_size = int(getattr(config, f"{prefix}_MAX_SIZE", None) or defaults["max_size"])
+        return {"min_size": min(min_size, max_size), "max_size": max_size}
+
+    async def _create_pool(self, config, host: str, port, sizes: Dict[str, Any], pgbouncer: bool) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            database=config.DB_NAME,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            host=host,
+            port=port,
+            **sizes,
+            # Кэш подготовленных выражений на каждое соединение:
+            # запросы из database/crud.py парсятся и планируются один раз.
+            # За pgbouncer в режиме transaction соединение с сервером меняется
+            # между транзакциями, и именованные выражения там не работают
+            statement_cache_size=0 if pgbouncer else STATEMENT_CACHE_SIZE,
+            max_cached_statement_lifetime=0
+        )
 
     async def add_test_data(self, conn):
         """Добавить тестовые данные для разработки"""
@@ -80,23 +165,44 @@ class Database:
         else:
             logger.info("📊 В базе уже есть данные")
     
-    async def connect(self, config):
+    async def connect(self, config, with_test_data: bool = True):
         """Подключаемся к PostgreSQL"""
         logger.info(f"🔗 Подключаемся к PostgreSQL: {config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}")
         
+        # DB_PGBOUNCER - подключение через pgbouncer в режиме transaction
+        pgbouncer = _flag(getattr(config, "DB_PGBOUNCER", None))
+        
         try:
-            self.pool = await asyncpg.create_pool(
-                database=config.DB_NAME,
-                user=config.DB_USER,
-                password=config.DB_PASSWORD,
-                host=config.DB_HOST,
-                port=config.DB_PORT,
-                min_size=1,
-                max_size=10
+            primary_sizes = self._pool_options(
+                config, "DB_POOL", {"min_size": DEFAULT_POOL_MIN_SIZE, "max_size": DEFAULT_POOL_MAX_SIZE}
             )
+            self.pool = await self._create_pool(config, config.DB_HOST, config.DB_PORT, primary_sizes, pgbouncer)
+            
+            replica_host = getattr(config, "DB_REPLICA_HOST", None)
+            if replica_host:
+                replica_port = getattr(config, "DB_REPLICA_PORT", None) or config.DB_PORT
+                logger.info(f"🔗 Подключаемся к реплике PostgreSQL: {replica_host}:{replica_port}")
+                self.replica_pool = await self._create_pool(
+                    config, replica_host, replica_port,
+                    self._pool_options(config, "DB_REPLICA_POOL", primary_sizes), pgbouncer
+                )
+                self.read_your_writes_seconds = float(
+                    getattr(config, "DB_READ_YOUR_WRITES_SECONDS", None) or DEFAULT_READ_YOUR_WRITES_SECONDS
+                )
             
             logger.info("✅ Подключение к PostgreSQL установлено")
-            await self.create_tables()
+            
+            # Схема ведется миграциями из database/migrations: при актуальной
+            # схеме это один запрос к schema_version вместо всего DDL.
+            # За pgbouncer сессионная advisory-блокировка не держится,
+            # поэтому миграции идут одной транзакцией
+            applied = await migrate(self.pool, transaction_lock=pgbouncer)
+            
+            # Тестовые данные - только в новую базу или по явному флагу
+            load_test_data = _flag(getattr(config, "LOAD_TEST_DATA", None))
+            if with_test_data and (applied or load_test_data):
+                async with self.pool.acquire() as conn:
+                    await self.add_test_data(conn)
             
         except asyncpg.InvalidPasswordError:
             logger.error("❌ Неверный пароль PostgreSQL. Проверьте .env файл")
@@ -108,36 +214,9 @@ class Database:
             logger.error(f"❌ Ошибка подключения к PostgreSQL: {e}")
             raise
     
-    async def create_tables(self):
-        """Создаем все необходимые таблицы"""
-        
-        # Используем контекстный менеджер для подключения
-        async with self.pool.acquire() as conn:
-            # Создаем таблицы...
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS masters (
-                    id SERIAL PRIMARY KEY,
-                    telegram_id BIGINT UNIQUE NOT NULL,
-                    full_name VARCHAR(200) NOT NULL,
-                    experience TEXT,
-                    percentage INTEGER DEFAULT 40,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            # ... остальные таблицы
-            
-            logger.info("✅ Все таблицы успешно созданы")
-            
-            # Проверяем таблицы
-            tables = await conn.fetch('''
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            ''')
-            
-            logger.info(f"📊 Создано таблиц: {len(tables)}")
-            
-            # Добавляем тестовые данные
-            await self.add_test_data(conn)
\ No newline at end of file
+    async def close(self):
+        """Закрыть пулы соединений"""
+        if self.replica_pool is not None:
+            await self.replica_pool.close()
+        if self.pool is not None:
+            await self.pool.close()
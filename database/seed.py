@@ -0,0 +1,335 @@
+"""Генератор синтетических данных для нагрузочного тестирования.
+
+Запуск: python -m database.seed --masters 300 --clients 100000 --days 365 --seed 42
+
+Данные генерируются детерминированно: при одинаковых --seed, --start и
+объемах получается та же база. Загрузка идет через COPY
+(copy_records_to_table), после нее пересчитываются агрегаты статистики
+и выполняется ANALYZE, чтобы планировщик видел реальные объемы.
+"""
+import argparse
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, List, Tuple
+
+from database.models import Database
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, которые заполняет генератор, в порядке загрузки
+SEED_TABLES = ("masters", "services", "master_schedule", "clients", "appointments")
+
+STATS_TABLES = ("daily_stats", "daily_master_stats", "daily_service_stats", "stats_totals")
+
+# События outbox о старых записях после перезаливки не нужны: статистика
+# пересчитывается заново (SQL_REBUILD_STATS)
+EVENT_TABLES = ("outbox",)
+
+# Диапазоны telegram_id синтетических пользователей, чтобы не пересекаться с настоящими
+MASTER_TELEGRAM_ID_BASE = 9_000_000_000
+CLIENT_TELEGRAM_ID_BASE = 9_100_000_000
+
+# Рабочие дни мастеров: шаблоны начала и конца смены
+SHIFTS = ((time(9, 0), time(17, 0)), (time(10, 0), time(18, 0)), (time(12, 0), time(20, 0)))
+
+SLOT_STEP_MINUTES = 30
+
+FIRST_NAMES = (
+    "Анна", "Мария", "Елена", "Ольга", "Наталья", "Ирина", "Светлана", "Татьяна",
+    "Юлия", "Екатерина", "Дарья", "Алина", "Виктория", "Ксения", "Полина", "София",
+)
+
+LAST_NAMES = (
+    "Иванова", "Петрова", "Сидорова", "Смирнова", "Кузнецова", "Попова", "Волкова",
+    "Соколова", "Лебедева", "Козлова", "Новикова", "Морозова", "Егорова", "Павлова",
+)
+
+# (название, описание, длительность в минутах, базовая цена)
+SERVICE_TEMPLATES = (
+    ("Наращивание ресниц", "Полный объем", 120, 2500),
+    ("Наращивание ресниц 2D", "Двойной объем", 150, 3000),
+    ("Ламинирование ресниц", "Ламинирование с окрашиванием", 90, 2000),
+    ("Коррекция бровей", "Коррекция с окрашиванием", 60, 1500),
+    ("Архитектура бровей", "Моделирование формы", 45, 1200),
+    ("Долговременная укладка бровей", "Укладка и уход", 60, 1800),
+    ("SPA для ресниц", "Комплексный уход", 120, 3000),
+    ("Снятие наращивания", "Бережное снятие", 30, 500),
+    ("Окрашивание ресниц", "Стойкий краситель", 30, 700),
+    ("Ботокс для ресниц", "Восстановление и питание", 75, 2200),
+)
+
+
+@dataclass(frozen=True)
+class SeedOptions:
+    masters: int = 300
+    services_per_master: int = 10
+    clients: int = 100_000
+    days: int = 365
+    start: date = None
+    seed: int = 42
+    # Доля рабочих слотов, занятых записями
+    occupancy: float = 0.6
+    working_days_per_week: int = 5
+
+
+class SeedGenerator:
+    """Детерминированная генерация строк для COPY.
+
+    Идентификаторы назначаются явно (1..N), поэтому строки разных таблиц
+    ссылаются друг на друга без обращений к базе. Каждая таблица
+    генерируется своим Random от общего seed: изменение объема одной
+    таблицы не сдвигает данные остальных.
+    """
+
+    def __init__(self, options: SeedOptions):
+        self.options = options
+        self.start = options.start or date.today() - timedelta(days=options.days // 2)
+        self.created_at = datetime.combine(self.start, time(9, 0)) - timedelta(days=30)
+        # Граница прошлого и будущего считается от --start, а не от часов,
+        # иначе статусы записей зависели бы от времени запуска
+        self.now = datetime.combine(self.start + timedelta(days=options.days // 2), time(0, 0))
+        self.services: List[Tuple[int, int, int, int]] = []
+        self.schedule: List[Tuple[int, date, time, time]] = []
+
+    def _random(self, table: str) -> random.Random:
+        return random.Random(f"{self.options.seed}:{table}")
+
+    def masters(self) -> Iterator[tuple]:
+        rnd = self._random("masters")
+        for master_id in range(1, self.options.masters + 1):
+            full_name = f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+            years = rnd.randint(1, 15)
+            yield (
+                master_id, MASTER_TELEGRAM_ID_BASE + master_id, full_name,
+                f"Опыт {years} лет", rnd.choice((30, 35, 40, 45, 50)), True, self.created_at
+            )
+
+    def services_rows(self) -> Iterator[tuple]:
+        rnd = self._random("services")
+        per_master = min(self.options.services_per_master, len(SERVICE_TEMPLATES))
+        service_id = 0
+        self.services = []
+        for master_id in range(1, self.options.masters + 1):
+            for name, description, duration, price in rnd.sample(SERVICE_TEMPLATES, per_master):
+                service_id += 1
+                # Цена мастера отличается от базовой на ±20% с шагом 50
+                price = int(price * rnd.uniform(0.8, 1.2)) // 50 * 50
+                self.services.append((service_id, master_id, duration, price))
+                yield (
+                    service_id, master_id, name, description, duration, price, True, self.created_at
+                )
+
+    def schedule_rows(self) -> Iterator[tuple]:
+        rnd = self._random("schedule")
+        self.schedule = []
+        schedule_id = 0
+        for master_id in range(1, self.options.masters + 1):
+            days_off = set(rnd.sample(range(7), 7 - self.options.working_days_per_week))
+            shift_start, shift_end = rnd.choice(SHIFTS)
+            for offset in range(self.options.days):
+                day = self.start + timedelta(days=offset)
+                if day.weekday() in days_off:
+                    continue
+                schedule_id += 1
+                self.schedule.append((master_id, day, shift_start, shift_end))
+                yield schedule_id, master_id, day, shift_start, shift_end
+
+    def clients(self) -> Iterator[tuple]:
+        rnd = self._random("clients")
+        span = max(self.options.days, 1) * 86400
+        for client_id in range(1, self.options.clients + 1):
+            full_name = f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+            registered = self.created_at + timedelta(seconds=rnd.randrange(span))
+            yield client_id, CLIENT_TELEGRAM_ID_BASE + client_id, full_name, registered
+
+    def appointments(self) -> Iterator[tuple]:
+        """Записи по расписанию: визиты одного мастера не пересекаются"""
+        rnd = self._random("appointments")
+        services_by_master = {}
+        for service_id, master_id, duration, price in self.services:
+            services_by_master.setdefault(master_id, []).append((service_id, duration, price))
+
+        step = timedelta(minutes=SLOT_STEP_MINUTES)
+        appointment_id = 0
+
+        for master_id, day, shift_start, shift_end in self.schedule:
+            master_services = services_by_master.get(master_id)
+            if not master_services or not self.options.clients:
+                continue
+
+            cursor = datetime.combine(day, shift_start)
+            day_end = datetime.combine(day, shift_end)
+            while cursor < day_end:
+                if rnd.random() >= self.options.occupancy:
+                    cursor += step
+                    continue
+
+                service_id, duration, price = rnd.choice(master_services)
+                end_time = cursor + timedelta(minutes=duration)
+                if end_time > day_end:
+                    break
+
+                appointment_id += 1
+                if cursor < self.now:
+                    status = "cancelled" if rnd.random() < 0.1 else "completed"
+                    reminder_sent_at = cursor - timedelta(days=1)
+                else:
+                    status = rnd.choices(("pending", "confirmed", "cancelled"), (0.3, 0.6, 0.1))[0]
+                    reminder_sent_at = None
+                created_at = cursor - timedelta(days=rnd.randint(1, 30))
+
+                yield (
+                    appointment_id, rnd.randint(1, self.options.clients), master_id, service_id,
+                    cursor, end_time, price, status, created_at, reminder_sent_at
+                )
+                cursor = end_time
+
+
+# Колонки COPY для каждой таблицы в порядке полей кортежей генератора
+COPY_COLUMNS = {
+    "masters": ("id", "telegram_id", "full_name", "experience", "percentage", "is_active", "created_at"),
+    "services": (
+        "id", "master_id", "name", "description", "duration_minutes", "price", "is_active", "created_at"
+    ),
+    "master_schedule": ("id", "master_id", "date", "start_time", "end_time"),
+    "clients": ("id", "telegram_id", "full_name", "created_at"),
+    "appointments": (
+        "id", "client_id", "master_id", "service_id", "start_time", "end_time",
+        "price", "status", "created_at", "reminder_sent_at"
+    ),
+}
+
+# Пересчет агрегатов статистики по загруженным данным, как при их первом создании
+SQL_REBUILD_STATS = (
+    """
+    INSERT INTO stats_totals (id, clients_total)
+    SELECT 1, COUNT(*) FROM clients
+    """,
+    """
+    INSERT INTO daily_stats (
+        day, bookings_total, bookings_pending, bookings_confirmed,
+        bookings_completed, bookings_cancelled, revenue, paid_bookings
+    )
+    SELECT start_time::date,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE status = 'pending'),
+           COUNT(*) FILTER (WHERE status = 'confirmed'),
+           COUNT(*) FILTER (WHERE status = 'completed'),
+           COUNT(*) FILTER (WHERE status = 'cancelled'),
+           COALESCE(SUM(price) FILTER (WHERE status IN ('confirmed', 'completed')), 0),
+           COUNT(*) FILTER (WHERE status IN ('confirmed', 'completed'))
+    FROM appointments
+    GROUP BY start_time::date
+    """,
+    """
+    INSERT INTO daily_stats AS d (day, new_clients)
+    SELECT created_at::date, COUNT(*)
+    FROM clients
+    GROUP BY created_at::date
+    ON CONFLICT (day) DO UPDATE SET new_clients = EXCLUDED.new_clients
+    """,
+    """
+    INSERT INTO daily_master_stats (day, master_id, bookings)
+    SELECT start_time::date, master_id, COUNT(*)
+    FROM appointments
+    WHERE status <> 'cancelled'
+    GROUP BY start_time::date, master_id
+    """,
+    """
+    INSERT INTO daily_service_stats (day, service_id, bookings)
+    SELECT start_time::date, service_id, COUNT(*)
+    FROM appointments
+    WHERE status <> 'cancelled'
+    GROUP BY start_time::date, service_id
+    """,
+)
+
+
+async def seed(pool, options: SeedOptions, truncate: bool = False):
+    """Загрузить синтетические данные в пустую базу"""
+    generator = SeedGenerator(options)
+
+    async with pool.acquire() as conn:
+        existing = await conn.fetchval("SELECT EXISTS (SELECT 1 FROM masters)")
+        if existing and not truncate:
+            raise RuntimeError("В базе уже есть данные. Запустите с --truncate, чтобы заменить их")
+
+        async with conn.transaction():
+            await conn.execute(
+                f"TRUNCATE {', '.join(SEED_TABLES + STATS_TABLES + EVENT_TABLES)} RESTART IDENTITY CASCADE"
+            )
+
+            sources = {
+                "masters": generator.masters,
+                "services": generator.services_rows,
+                "master_schedule": generator.schedule_rows,
+                "clients": generator.clients,
+                "appointments": generator.appointments,
+            }
+            for table in SEED_TABLES:
+                started = datetime.now()
+                result = await conn.copy_records_to_table(
+                    table, records=sources[table](), columns=COPY_COLUMNS[table]
+                )
+                elapsed = (datetime.now() - started).total_seconds()
+                logger.info(f"📥 {table}: {result.split()[-1]} строк за {elapsed:.1f} с")
+
+                # Идентификаторы заданы явно, сдвигаем последовательность
+                await conn.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+                )
+
+            for sql in SQL_REBUILD_STATS:
+                await conn.execute(sql)
+
+        logger.info("📊 Обновляем статистику планировщика...")
+        await conn.execute(f"ANALYZE {', '.join(SEED_TABLES + STATS_TABLES)}")
+
+
+def parse_args(argv=None):
+    defaults = SeedOptions()
+    parser = argparse.ArgumentParser(description="Синтетические данные для нагрузочного тестирования")
+    parser.add_argument("--masters", type=int, default=defaults.masters)
+    parser.add_argument("--services-per-master", type=int, default=defaults.services_per_master)
+    parser.add_argument("--clients", type=int, default=defaults.clients)
+    parser.add_argument("--days", type=int, default=defaults.days, help="Длина расписания в днях")
+    parser.add_argument("--start", type=date.fromisoformat, default=None,
+                        help="Первый день расписания, ГГГГ-ММ-ДД (по умолчанию полпериода назад)")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--occupancy", type=float, default=defaults.occupancy)
+    parser.add_argument("--truncate", action="store_true",
+                        help="Очистить таблицы, даже если в них уже есть данные")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    from config import Config
+
+    args = parse_args(argv)
+    options = SeedOptions(
+        masters=args.masters,
+        services_per_master=args.services_per_master,
+        clients=args.clients,
+        days=args.days,
+        start=args.start,
+        seed=args.seed,
+        occupancy=args.occupancy,
+    )
+
+    db = Database()
+    await db.connect(Config(), with_test_data=False)
+    try:
+        started = datetime.now()
+        await seed(db.pool, options, truncate=args.truncate)
+        logger.info(f"✅ Данные загружены за {(datetime.now() - started).total_seconds():.1f} с")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    asyncio.run(main())